@@ -1,10 +1,18 @@
 import logging
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from typing import List, Optional
+import numpy as np
 import pandas as pd
 from google.cloud import bigquery
 from google.oauth2 import service_account
 import os
 
+from NormalizadorFechas import NormalizadorFechas
+
 # Crear logger específico
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
@@ -30,70 +38,211 @@ if not logger.handlers:
 
     logger.propagate = False
 
+# Cargas particionadas: formato del decorador por tipo de partición, jobs en paralelo y
+# filas aproximadas por job (cada job lleva particiones completas). Cada tabla admite
+# 1,500 load jobs por día, así que no conviene un job por partición salvo al reemplazarlas.
+FORMATOS_PARTICION = {"DAY": "%Y%m%d", "MONTH": "%Y%m", "YEAR": "%Y"}
+MAX_WORKERS_CARGA = 4
+FILAS_POR_CARGA = 500_000
+# Carga completa particionada: los bloques van a esta tabla auxiliar y un solo copy job
+# WRITE_TRUNCATE reemplaza el destino (la tabla en uso nunca queda vacía ni a medias)
+SUFIJO_STAGING = "__carga"
+
+# Reintentos por load job ante errores transitorios, con espera exponencial. Solo se envía un job
+# nuevo cuando BigQuery confirma que el anterior terminó con error (un job fallido no escribe
+# filas); si falla el envío o la espera, se sigue el mismo job (job_id fijo, 409 = ya existe).
+# Cargas en segundo plano simultáneas por BQLoad
+REINTENTOS_CARGA = 2
+ESPERA_REINTENTO = 5.0
+RAZONES_REINTENTABLES = {"backendError", "internalError", "rateLimitExceeded"}
+MAX_CARGAS_ASINCRONAS = 2
+
+# CSV por bloques: filas por bloque (un load job cada uno) y dtype de lectura por tipo del esquema.
+# Las fechas se leen como texto y se normalizan en cada bloque con standardize_date_columns
+# (los formatos se detectan en el primer bloque y se reutilizan en los siguientes).
+FILAS_POR_BLOQUE_CSV = 200_000
+DTYPES_CSV = {
+    "STRING": "string",
+    "INTEGER": "Int64",
+    "INT64": "Int64",
+    "FLOAT": "float64",
+    "FLOAT64": "float64",
+    "NUMERIC": "float64",
+    "BOOLEAN": "boolean",
+    "BOOL": "boolean",
+    "DATE": "string",
+    "DATETIME": "string",
+    "TIMESTAMP": "string",
+}
 
-def standardize_date_columns(df: pd.DataFrame, date_columns: List[str]) -> pd.DataFrame:
+
+def standardize_date_columns(
+    df: pd.DataFrame,
+    date_columns: List[str],
+    normalizer: Optional[NormalizadorFechas] = None,
+    source: str = ""
+) -> pd.DataFrame:
     """
-    Función reutilizable para convertir columnas de fecha usando múltiples formatos.
-    
+    Función reutilizable para convertir columnas de fecha en texto con varios formatos mezclados.
+
+    Cada columna se convierte en una pasada con NormalizadorFechas (formatos detectados con una
+    muestra y cacheados por (source, columna)); se registran las filas por formato y las que no
+    se pudieron convertir, que quedan como NaT. Si ningún valor se puede convertir, la columna
+    se deja como estaba.
+
     Args:
-        df: DataFrame con las columnas a convertir
+        df: DataFrame con las columnas a convertir (no se modifica)
         date_columns: Lista de nombres de columnas que contienen fechas
-    
+        normalizer: NormalizadorFechas a reutilizar (p. ej. entre bloques del mismo archivo)
+        source: Origen de los datos (p. ej. ruta del CSV) para la caché de formatos
+
     Returns:
         DataFrame con las columnas de fecha convertidas a datetime
     """
-    # Formatos de fecha identificados en el proyecto
-    DATE_FORMATS = [
-        '%Y-%m-%d',              # 2024-12-01
-        '%d/%m/%Y',              # 01/12/2024  
-        '%Y-%m-%d %H:%M:%S',     # 2024-12-01 15:30:45
-        '%d/%m/%Y %H:%M',        # 11/05/2023 09:45
-        'mixed'                  # Múltiples formatos mezclados (respaldo)
-    ]
-    
-    df_copy = df.copy()
-    
+    normalizer = normalizer or NormalizadorFechas(respaldo_mixto=True)
+    df_copy = df.copy(deep=False)
+
     for col in date_columns:
         if col not in df_copy.columns:
             logger.warning(f"⚠️ Columna {col} no encontrada en el DataFrame")
             continue
-        
-        converted = False
-        original_values = df_copy[col].copy()
-        original_na_count = df_copy[col].isna().sum()
-        
-        # Intentar cada formato hasta que uno funcione completamente
-        for date_format in DATE_FORMATS:
-            try:
-                df_copy[col] = pd.to_datetime(df_copy[col], format=date_format)
-                
-                # Verificar que la conversión fue exitosa (no aumentaron mucho los NaN)
-                new_na_count = df_copy[col].isna().sum()
-                if new_na_count <= original_na_count + 1:  # Tolerancia mínima
-                    logger.info(f"✅ Columna {col} convertida con formato {date_format}")
-                    converted = True
-                    break
-                else:
-                    # La conversión falló, restaurar valores originales para siguiente intento
-                    df_copy[col] = original_values.copy()
-                    
-            except:
-                # Si hay error, restaurar valores originales para siguiente intento
-                df_copy[col] = original_values.copy()
-                continue
-        
-        if not converted:
-            logger.error(f"❌ No se pudo convertir la columna {col} con ningún formato disponible")
-    
+
+        fechas, report = normalizer.normalizar(df_copy[col], col, source)
+        if report.convertidas == 0 and report.nulos < len(fechas):
+            logger.error(f"❌ No se pudo convertir la columna {col} con ningún formato disponible ({report})")
+            continue
+        df_copy[col] = fechas
+        if len(report.no_convertidas):
+            logger.warning(f"⚠️ Columna {report}")
+        else:
+            logger.info(f"✅ Columna {report}")
+
     return df_copy
 
+def partition_keys(values: pd.Series, partition_type: str = "DAY") -> pd.Series:
+    """
+    Decorador de partición de cada fila ("20250131", "202501", "2025"; "__NULL__" si no hay fecha).
+
+    Args:
+        values: Columna DATE / DATETIME / TIMESTAMP (los TIMESTAMP se parten por fecha UTC, como BigQuery)
+        partition_type: "DAY", "MONTH" o "YEAR"
+    """
+    fechas = pd.to_datetime(values)
+    if fechas.dt.tz is not None:
+        fechas = fechas.dt.tz_convert("UTC").dt.tz_localize(None)
+    # strftime solo sobre los días distintos, no sobre cada fila
+    codigos, dias = pd.factorize(fechas.dt.normalize())
+    claves = np.append(pd.DatetimeIndex(dias).strftime(FORMATOS_PARTICION[partition_type]).to_numpy(dtype=object),
+                       "__NULL__")
+    return pd.Series(claves[codigos], index=values.index)
+
+
+def partition_chunks(keys: pd.Series, rows_per_chunk: int) -> list:
+    """
+    Agrupa las filas en bloques de particiones completas de ~rows_per_chunk filas.
+
+    Returns:
+        Lista de (particiones, posiciones de fila) en orden de partición
+    """
+    codigos, unicas = pd.factorize(keys, sort=True)
+    orden = np.argsort(codigos, kind="stable")
+    limites = np.searchsorted(codigos[orden], np.arange(len(unicas) + 1))
+    bloques = []
+    primero = 0
+    for i in range(len(unicas)):
+        if limites[i + 1] - limites[primero] >= rows_per_chunk or i == len(unicas) - 1:
+            bloques.append((list(unicas[primero:i + 1]), orden[limites[primero]:limites[i + 1]]))
+            primero = i + 1
+    return bloques
+
+
+def is_retryable(error: Exception) -> bool:
+    """Errores transitorios: conexión, HTTP 429 / 5xx o razones backendError / rateLimitExceeded del job."""
+    if isinstance(error, ConnectionError):
+        return True
+    code = getattr(error, "code", None)
+    if isinstance(code, int) and (code == 429 or code >= 500):
+        return True
+    reasons = {e.get("reason") for e in (getattr(error, "errors", None) or []) if isinstance(e, dict)}
+    return bool(reasons & RAZONES_REINTENTABLES)
+
+
+class LoadHandle:
+    """
+    Carga en segundo plano devuelta por BQLoad.load_table_async.
+
+    `progress()` se puede consultar en cualquier momento; `result()` espera y relanza el
+    error de la carga si lo hubo; `wait()` espera registrando el avance periódicamente.
+    """
+
+    def __init__(self, destination: str, total_rows: int):
+        self.destination = destination
+        self.total_rows = total_rows
+        self.jobs_total = 0
+        self.jobs_done = 0
+        self.rows_loaded = 0
+        self.future: Optional[Future] = None
+        self._t0 = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _start(self, jobs_total: int) -> None:
+        with self._lock:
+            self.jobs_total = jobs_total
+
+    def _advance(self, rows: int) -> None:
+        with self._lock:
+            self.jobs_done += 1
+            self.rows_loaded += rows
+
+    def done(self) -> bool:
+        return self.future is not None and self.future.done()
+
+    def progress(self) -> dict:
+        with self._lock:
+            return {
+                "destination": self.destination,
+                "jobs_done": self.jobs_done,
+                "jobs_total": self.jobs_total,
+                "rows_loaded": self.rows_loaded,
+                "total_rows": self.total_rows,
+                "seconds": time.perf_counter() - self._t0,
+                "done": self.done(),
+            }
+
+    def result(self, timeout: Optional[float] = None) -> None:
+        """Espera la carga (TimeoutError si pasan `timeout` segundos) y relanza su error, si hubo."""
+        self.future.result(timeout=timeout)
+
+    def wait(self, log_every: float = 30.0) -> None:
+        """Espera la carga registrando el avance cada `log_every` segundos."""
+        while True:
+            try:
+                self.result(timeout=log_every)
+                return
+            except FutureTimeoutError:
+                p = self.progress()
+                logger.info(
+                    f"⏳ {self.destination}: {p['jobs_done']}/{p['jobs_total']} jobs, "
+                    f"{p['rows_loaded']}/{p['total_rows']} filas ({p['seconds']:.0f}s)"
+                )
+
+
 class BQLoad:
     def __init__(
         self,
         credentials_path: Optional[str] = None,
         credentials: Optional[service_account.Credentials] = None,
-        project: Optional[str] = None
+        project: Optional[str] = None,
+        client: Optional[bigquery.Client] = None
     ):
+        """`client`: cliente ya creado (p. ej. benchmarks.ClienteFalso); entonces no se requieren credenciales."""
+        self._background: Optional[ThreadPoolExecutor] = None
+        # Formatos de fecha detectados por (archivo, columna), compartidos entre bloques y cargas
+        self.date_normalizer = NormalizadorFechas(respaldo_mixto=True)
+        if client is not None:
+            self.credentials = credentials
+            self.client = client
+            return
         if credentials is None and credentials_path is None:
             raise ValueError("Debes proporcionar credenciales o ruta a credenciales")
         self.credentials = (
@@ -115,41 +264,297 @@ class BQLoad:
             except Exception as e:
                 logger.warning(f"⚠️ No se pudo eliminar o no existe la tabla {table}: {e}")
 
+    def is_partitioned_by(self, table: str, partition_field: str, partition_type: str = "DAY") -> bool:
+        """True si `table` existe y está particionada por `partition_field` con `partition_type`."""
+        try:
+            tp = self.client.get_table(table).time_partitioning
+        except Exception:
+            return False
+        return tp is not None and tp.field == partition_field and tp.type_ == partition_type
+
     def load_table(
         self,
         df: pd.DataFrame,
         destination: str,
         schema: List[bigquery.SchemaField],
-        write_disposition: str = "WRITE_TRUNCATE"
+        write_disposition: str = "WRITE_TRUNCATE",
+        partition_field: Optional[str] = None,
+        partition_type: str = "DAY",
+        clustering_fields: Optional[List[str]] = None,
+        partitions: Optional[list] = None,
+        max_workers: int = MAX_WORKERS_CARGA,
+        rows_per_chunk: int = FILAS_POR_CARGA,
+        retries: int = REINTENTOS_CARGA,
+        timeout: Optional[float] = None,
+        handle: Optional[LoadHandle] = None
     ) -> None:
-        job_config = bigquery.LoadJobConfig(
-            schema=schema,
-            write_disposition=write_disposition
-        )
-        logger.info(f"🔄 Cargando {destination} ({len(df)} filas)…")
-        job = self.client.load_table_from_dataframe(
-            df, destination, job_config=job_config
+        """
+        Carga un DataFrame a BigQuery (Parquet).
+
+        Sin `partition_field` es un solo load job, como siempre. Con `partition_field`:
+          - WRITE_TRUNCATE: se carga en bloques de particiones completas, con hasta `max_workers`
+            jobs en paralelo, a una tabla auxiliar particionada (y clusterizada) `destino__carga`;
+            al terminar, un copy job WRITE_TRUNCATE reemplaza el destino de una sola vez. Si falla
+            algún bloque el destino queda intacto (la auxiliar se recrea en la siguiente carga).
+          - WRITE_APPEND: en bloques, directo sobre la tabla existente (se crea si no existe)
+          - `partitions`: solo se reemplazan esas particiones, un job WRITE_TRUNCATE por partición
+            con decorador (`tabla$20250131`); las que no traen filas se eliminan y las filas de
+            otras particiones se agregan. Un `None` en `partitions` reemplaza igual la partición
+            de nulos (`tabla$__NULL__`); sin él, las filas sin fecha se descartan, porque
+            agregarlas las duplicaría en cada recarga. Requiere la tabla ya particionada
+            (ver is_partitioned_by).
+
+        Args:
+            partition_field: Columna DATE / DATETIME / TIMESTAMP de la partición
+            partition_type: "DAY", "MONTH" o "YEAR"
+            clustering_fields: Hasta 4 columnas de clustering
+            partitions: Fechas (date, str o Timestamp; None = partición de nulos) a reemplazar
+            retries: Reintentos por job ante errores transitorios (ver is_retryable)
+            timeout: Segundos máximos por job; al excederse se cancela el job y se lanza TimeoutError
+            handle: LoadHandle que recibe el avance (lo usa load_table_async)
+        """
+        if partition_field is None:
+            if partitions is not None:
+                raise ValueError("partitions requiere partition_field")
+            job_config = bigquery.LoadJobConfig(
+                schema=schema,
+                write_disposition=write_disposition,
+                clustering_fields=clustering_fields
+            )
+            logger.info(f"🔄 Cargando {destination} ({len(df)} filas)…")
+            self._load_jobs(df, [(None, destination, job_config)], 1, retries, timeout, handle)
+            logger.info(f"✅ Carga completada: {destination}")
+            return
+
+        time_partitioning = bigquery.TimePartitioning(type_=partition_type, field=partition_field)
+        target = destination
+        if partitions is not None:
+            if not self.is_partitioned_by(destination, partition_field, partition_type):
+                raise ValueError(
+                    f"{destination} no existe o no está particionada por {partition_field} ({partition_type}); "
+                    f"se necesita una carga completa para recrearla"
+                )
+        elif write_disposition == "WRITE_TRUNCATE":
+            target = f"{destination}{SUFIJO_STAGING}"
+            self.client.delete_table(target, not_found_ok=True)
+
+        table = bigquery.Table(target, schema=schema)
+        table.time_partitioning = time_partitioning
+        table.clustering_fields = clustering_fields
+        table = self.client.create_table(table, exists_ok=True)
+        if table.time_partitioning is None or table.time_partitioning.field != partition_field:
+            # Tabla previa sin particionar: se agrega sin cambiar su definición
+            logger.warning(f"⚠️ {destination} existe sin particionar por {partition_field}; se carga sin particiones")
+            time_partitioning, clustering_fields = None, None
+
+        def config(disposition):
+            return bigquery.LoadJobConfig(
+                schema=schema,
+                write_disposition=disposition,
+                source_format=bigquery.SourceFormat.PARQUET,
+                time_partitioning=time_partitioning,
+                clustering_fields=clustering_fields
+            )
+
+        keys = partition_keys(df[partition_field], partition_type)
+        jobs = []
+        if partitions is None:
+            for _, posiciones in partition_chunks(keys, rows_per_chunk):
+                jobs.append((posiciones, target, config("WRITE_APPEND")))
+        else:
+            reemplazar = set(partition_keys(pd.Series(list(partitions), dtype=object), partition_type))
+            for particiones, posiciones in partition_chunks(keys, 1):
+                particion = particiones[0]
+                if particion in reemplazar:
+                    jobs.append((posiciones, f"{destination}${particion}", config("WRITE_TRUNCATE")))
+                elif particion == "__NULL__":
+                    logger.warning(
+                        f"⚠️ {len(posiciones)} filas sin {partition_field} no se cargan "
+                        f"(la partición de nulos no está entre las que se reemplazan)"
+                    )
+                else:
+                    logger.warning(f"⚠️ Partición {particion} fuera de las que se reemplazan; se agrega")
+                    jobs.append((posiciones, destination, config("WRITE_APPEND")))
+            for particion in sorted(reemplazar - set(keys.unique())):
+                self.delete_tables(f"{destination}${particion}")
+
+        logger.info(
+            f"🔄 Cargando {destination} ({len(df)} filas) en {len(jobs)} jobs "
+            f"(hasta {max_workers} en paralelo)…"
         )
-        job.result()  # Espera a que termine
+        self._load_jobs(df, jobs, max_workers, retries, timeout, handle)
+        if target != destination:
+            self._replace_from_staging(target, destination, partition_field, partition_type, clustering_fields)
         logger.info(f"✅ Carga completada: {destination}")
 
+    def load_table_async(self, df: pd.DataFrame, destination: str, schema: List[bigquery.SchemaField],
+                         **kwargs) -> LoadHandle:
+        """
+        Igual que load_table (mismos argumentos) pero en segundo plano: regresa de inmediato un
+        LoadHandle y la serialización, subida y espera de los jobs corren en otro hilo.
+        `df` no debe modificarse hasta que termine la carga.
+        """
+        if self._background is None:
+            self._background = ThreadPoolExecutor(max_workers=MAX_CARGAS_ASINCRONAS, thread_name_prefix="bqload-async")
+        handle = LoadHandle(destination, len(df))
+        handle.future = self._background.submit(self.load_table, df, destination, schema, handle=handle, **kwargs)
+        return handle
+
+    def _replace_from_staging(self, staging: str, destination: str, partition_field: str,
+                              partition_type: str, clustering_fields: Optional[List[str]]) -> None:
+        """Reemplaza `destination` con `staging` en un solo copy job WRITE_TRUNCATE y elimina `staging`."""
+        try:
+            actual = self.client.get_table(destination)
+        except Exception:
+            actual = None
+        if actual is not None and (
+            actual.time_partitioning is None
+            or actual.time_partitioning.field != partition_field
+            or actual.time_partitioning.type_ != partition_type
+            or list(actual.clustering_fields or []) != list(clustering_fields or [])
+        ):
+            # Un copy job no cambia la partición/clustering del destino: solo en ese caso se elimina antes
+            logger.warning(f"⚠️ {destination} tiene otra partición o clustering; se elimina antes de reemplazarla")
+            self.delete_tables(destination)
+        job = self.client.copy_table(
+            staging, destination, job_config=bigquery.CopyJobConfig(write_disposition="WRITE_TRUNCATE")
+        )
+        job.result()
+        self.client.delete_table(staging, not_found_ok=True)
+        logger.info(f"✅ {destination} reemplazada desde {staging}")
+
+    def _load_chunk(self, df: pd.DataFrame, positions: Optional[np.ndarray], destination: str,
+                    job_config: bigquery.LoadJobConfig, retries: int, timeout: Optional[float]) -> int:
+        # El bloque se copia dentro del hilo: solo hay max_workers bloques en memoria a la vez
+        chunk = df if positions is None else df.iloc[positions]
+        # WRITE_APPEND no es idempotente: un error al enviar o al esperar no dice si el job cargó.
+        # El job_id solo cambia cuando el job anterior terminó con error confirmado
+        base_id = f"bqload_{uuid.uuid4().hex}"
+        job_number = 0
+        job = None
+        for attempt in range(retries + 1):
+            try:
+                if job is None:
+                    job = self._submit_load(chunk, destination, job_config, f"{base_id}_{job_number}")
+            except Exception as e:
+                error = e
+            else:
+                try:
+                    job.result(timeout=timeout)
+                    return len(chunk)
+                except FutureTimeoutError:
+                    job.cancel()
+                    raise TimeoutError(f"La carga de {destination} excedió {timeout}s; se pidió cancelar el job")
+                except Exception as e:
+                    error = e
+                if self._job_failed(job):
+                    job, job_number = None, job_number + 1
+            if attempt == retries or not is_retryable(error):
+                raise error
+            wait = ESPERA_REINTENTO * 2 ** attempt
+            logger.warning(f"⚠️ Error transitorio en {destination} ({error}); reintento {attempt + 1}/{retries} en {wait:.0f}s")
+            time.sleep(wait)
+
+    def _submit_load(self, chunk: pd.DataFrame, destination: str, job_config: bigquery.LoadJobConfig,
+                     job_id: str):
+        """Envía el load job con `job_id`; si ya existe (409: un envío anterior sí llegó), regresa ese job."""
+        try:
+            return self.client.load_table_from_dataframe(chunk, destination, job_config=job_config, job_id=job_id)
+        except Exception as e:
+            if getattr(e, "code", None) != 409:
+                raise
+            logger.warning(f"⚠️ El job {job_id} ya existe (el envío anterior sí llegó); se espera ese job")
+            return self.client.get_job(job_id, location=getattr(self.client, "location", None))
+
+    def _job_failed(self, job) -> bool:
+        """True solo si BigQuery confirma que `job` terminó con error; si no se puede consultar, False."""
+        try:
+            job.reload()
+        except Exception as e:
+            logger.warning(f"⚠️ No se pudo consultar el estado del job {job.job_id}: {e}")
+            return False
+        return job.state == "DONE" and job.error_result is not None
+
+    def _load_jobs(self, df: pd.DataFrame, jobs: list, max_workers: int, retries: int = REINTENTOS_CARGA,
+                   timeout: Optional[float] = None, handle: Optional[LoadHandle] = None) -> None:
+        """Corre los load jobs [(posiciones, destino, config)]; si uno falla, cancela los pendientes y relanza."""
+        if handle is not None:
+            handle._start(len(jobs))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="bqload") as pool:
+            futures = {
+                pool.submit(self._load_chunk, df, positions, destination, job_config, retries, timeout): destination
+                for positions, destination, job_config in jobs
+            }
+            for future in as_completed(futures):
+                try:
+                    rows = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Falló la carga de {futures[future]}: {e}")
+                    for other in futures:
+                        other.cancel()
+                    raise
+                if handle is not None:
+                    handle._advance(rows)
+                if len(jobs) > 1:
+                    logger.info(f"✅ {futures[future]}: {rows} filas")
+
     def load_from_csv(
         self,
         csv_path: str,
         destination: str,
         schema: List[bigquery.SchemaField],
-        read_csv_kwargs: dict = None
+        read_csv_kwargs: dict = None,
+        write_disposition: str = "WRITE_TRUNCATE",
+        chunksize: int = FILAS_POR_BLOQUE_CSV,
+        retries: int = REINTENTOS_CARGA,
+        timeout: Optional[float] = None
     ) -> None:
-        read_csv_kwargs = read_csv_kwargs or {}
-        df = pd.read_csv(csv_path, **read_csv_kwargs)
+        """
+        Carga un CSV por bloques de `chunksize` filas: la memoria pico son dos bloques (el que se
+        sube y el siguiente que se lee), sin importar el tamaño del archivo.
+
+        Cada bloque se lee con los dtypes del esquema (DTYPES_CSV), se estandarizan sus fechas y se
+        carga en su propio job: el primero con `write_disposition` y los demás con WRITE_APPEND.
+        Si falla un bloque intermedio, la tabla queda con los bloques anteriores.
+
+        Args:
+            read_csv_kwargs: Argumentos extra de pd.read_csv (un `dtype` propio tiene prioridad)
+            write_disposition: Disposición del primer bloque
+            chunksize: Filas por bloque / load job
+            retries: Reintentos por job ante errores transitorios (ver is_retryable)
+            timeout: Segundos máximos por job
+        """
+        read_csv_kwargs = dict(read_csv_kwargs or {})
+        dtypes = {field.name: DTYPES_CSV.get(field.field_type, "string") for field in schema}
+        dtypes.update(read_csv_kwargs.pop("dtype", None) or {})
 
         # Identificar columnas de fecha del esquema
         date_columns = [field.name for field in schema if field.field_type in ("DATE", "DATETIME")]
-        
-        # Aplicar estandarización de fechas
         if date_columns:
-            logger.info(f"🔄 Estandarizando fechas para {destination}: {date_columns}")
-            df = standardize_date_columns(df, date_columns)
+            logger.info(f"🔄 Estandarizando fechas por bloque para {destination}: {date_columns}")
 
+        logger.info(f"🔄 Cargando {csv_path} a {destination} en bloques de {chunksize} filas…")
+        total_rows = 0
+        n_chunks = 0
+        pending: Optional[Future] = None
+        # Un solo hilo de carga: el siguiente bloque se lee y normaliza mientras sube el anterior
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="bqload-csv") as pool:
+            try:
+                for chunk in pd.read_csv(csv_path, dtype=dtypes, chunksize=chunksize, **read_csv_kwargs):
+                    if date_columns:
+                        chunk = standardize_date_columns(chunk, date_columns, self.date_normalizer, csv_path)
+                    job_config = bigquery.LoadJobConfig(
+                        schema=schema,
+                        write_disposition=write_disposition if n_chunks == 0 else "WRITE_APPEND"
+                    )
+                    if pending is not None:
+                        total_rows += pending.result()
+                    pending = pool.submit(self._load_chunk, chunk, None, destination, job_config, retries, timeout)
+                    n_chunks += 1
+                if pending is not None:
+                    total_rows += pending.result()
+            except Exception as e:
+                logger.error(f"❌ Falló la carga de {csv_path} tras leer {n_chunks} bloques: {e}")
+                raise
 
-        self.load_table(df, destination, schema)
\ No newline at end of file
+        logger.info(f"✅ Carga completada: {destination} ({total_rows} filas en {n_chunks} bloques)")
\ No newline at end of file
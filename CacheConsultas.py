@@ -0,0 +1,225 @@
+"""
+Caché local de resultados de queries (Parquet) bajo `execute_query_to_df` / ExtraccionConcurrente.
+
+- Clave: sha256 del texto SQL (ya con parámetros sustituidos) más los parámetros de lectura
+  (p. ej. el mapa de dtypes), así que una misma query con otro rango de fechas es otra entrada.
+- Frescura: al guardar se registra la fecha de última modificación (`Table.modified`) de cada
+  tabla que lee la query; la entrada sigue vigente mientras esas fechas no cambien. Si alguna
+  fuente no se puede consultar (comodines `events_*`, vistas, INFORMATION_SCHEMA, sin permiso),
+  la entrada vale solo `ttl_horas` desde que se guardó.
+- Tamaño: si el total pasa de `max_bytes` se desalojan las entradas usadas hace más tiempo (LRU);
+  un resultado más grande que `max_bytes` no se guarda.
+- `leer=False` (--refresh) ignora lo guardado pero escribe los resultados nuevos;
+  `activo=False` (--no-cache) no lee ni escribe.
+
+El índice (`indice.json`) y cada Parquet se escriben en un archivo temporal que se renombra
+al terminar; un archivo que no coincide con el índice se descarta como si no existiera.
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+VERSION_CACHE = 1
+TTL_HORAS = 24.0
+MAX_BYTES = 5 * 1024 ** 3
+_INDICE = "indice.json"
+
+# `proyecto.dataset.tabla` entre backticks o después de FROM / JOIN sin backticks
+_TABLAS_SQL = re.compile(
+    r"`([\w-]+\.[\w-]+\.[\w$*-]+)`|\b(?:FROM|JOIN)\s+([\w-]+\.[\w-]+\.[\w$*-]+)",
+    re.IGNORECASE,
+)
+
+
+def tablas_fuente(sql: str) -> list:
+    """Tablas `proyecto.dataset.tabla` que menciona la query (sin repetir, en orden de aparición)."""
+    tablas = []
+    for con_backticks, sin_backticks in _TABLAS_SQL.findall(sql):
+        tabla = con_backticks or sin_backticks
+        if tabla not in tablas:
+            tablas.append(tabla)
+    return tablas
+
+
+def _modificacion(client, tabla: str) -> Optional[str]:
+    """`Table.modified` (ISO) de una tabla; None si no aplica (comodín, vista) o no se puede leer."""
+    if "*" in tabla or "INFORMATION_SCHEMA" in tabla.upper():
+        return None
+    try:
+        meta = client.get_table(tabla)
+    except Exception as e:
+        logger.debug("Sin metadatos de %s para la caché: %s", tabla, e)
+        return None
+    if getattr(meta, "table_type", "TABLE") != "TABLE" or meta.modified is None:
+        return None
+    return meta.modified.isoformat()
+
+
+class CacheConsultas:
+    """Entradas {clave: {nombre, creado, ultimo_uso, bytes, filas, fuentes}} en `<directorio>/indice.json`."""
+
+    def __init__(self, directorio, ttl_horas: Optional[float] = TTL_HORAS, max_bytes: int = MAX_BYTES,
+                 activo: bool = True, leer: bool = True):
+        self.directorio = Path(directorio)
+        self.ttl = timedelta(hours=ttl_horas) if ttl_horas is not None else None
+        self.max_bytes = max_bytes
+        self.activo = activo
+        self.leer = activo and leer
+        self._candado = threading.Lock()
+        self._indice = self._cargar_indice() if activo else {}
+        if self.bytes_totales > self.max_bytes:
+            # p. ej. si se redujo el tamaño máximo desde la última corrida
+            self._desalojar()
+            self._guardar_indice()
+
+    # ----------------------------
+    # Índice
+    # ----------------------------
+    def _cargar_indice(self) -> dict:
+        try:
+            datos = json.loads((self.directorio / _INDICE).read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Índice de caché ilegible (%s); se empieza vacío", e)
+            return {}
+        if datos.get("version") != VERSION_CACHE:
+            return {}
+        return datos.get("entradas", {})
+
+    def _guardar_indice(self) -> None:
+        self.directorio.mkdir(parents=True, exist_ok=True)
+        tmp = self.directorio / f".{_INDICE}.tmp-{os.getpid()}-{threading.get_ident()}"
+        tmp.write_text(json.dumps({"version": VERSION_CACHE, "entradas": self._indice}, indent=2),
+                       encoding="utf-8")
+        os.replace(tmp, self.directorio / _INDICE)
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / f"{clave}.parquet"
+
+    def _quitar(self, clave: str) -> None:
+        self._indice.pop(clave, None)
+        self._ruta(clave).unlink(missing_ok=True)
+
+    @property
+    def bytes_totales(self) -> int:
+        return sum(e["bytes"] for e in self._indice.values())
+
+    @staticmethod
+    def clave(sql: str, parametros=None) -> str:
+        h = hashlib.sha256()
+        h.update(sql.encode("utf-8"))
+        h.update(b"\x1f")
+        h.update(repr(sorted((str(k), str(v)) for k, v in (parametros or {}).items())).encode("utf-8"))
+        return h.hexdigest()[:24]
+
+    # ----------------------------
+    # Lectura / escritura
+    # ----------------------------
+    def fuentes(self, client, sql: str) -> dict:
+        """{tabla: última modificación o None} de las tablas que lee `sql`."""
+        return {tabla: _modificacion(client, tabla) for tabla in tablas_fuente(sql)}
+
+    def _vigente(self, entrada: dict, fuentes: dict) -> bool:
+        if fuentes and all(fuentes.values()):
+            return entrada["fuentes"] == fuentes
+        if self.ttl is None:
+            return False
+        return datetime.now() - datetime.fromisoformat(entrada["creado"]) < self.ttl
+
+    def obtener(self, client, sql: str, parametros=None, nombre: str = "query"):
+        """
+        (DataFrame o None, fuentes). Con None hay que correr la query y pasar `fuentes`
+        a `guardar`: se leen antes de la query para no marcar como fresco un resultado viejo.
+        """
+        if not self.activo:
+            return None, {}
+        fuentes = self.fuentes(client, sql)
+        if not self.leer:
+            return None, fuentes
+
+        clave = self.clave(sql, parametros)
+        with self._candado:
+            entrada = self._indice.get(clave)
+            if entrada is None:
+                return None, fuentes
+            if not self._vigente(entrada, fuentes):
+                logger.info("Caché de %s desactualizada (fuentes modificadas o TTL vencido)", nombre)
+                self._quitar(clave)
+                self._guardar_indice()
+                return None, fuentes
+            ruta = self._ruta(clave)
+            if not ruta.is_file() or ruta.stat().st_size != entrada["bytes"]:
+                self._quitar(clave)
+                self._guardar_indice()
+                return None, fuentes
+            entrada["ultimo_uso"] = datetime.now().isoformat()
+            self._guardar_indice()
+
+        try:
+            df = pd.read_parquet(ruta)
+        except Exception as e:
+            logger.warning("Caché de %s ilegible (%s); se descarta", nombre, e)
+            with self._candado:
+                self._quitar(clave)
+                self._guardar_indice()
+            return None, fuentes
+        logger.info("♻️  %s desde caché (%d filas, %.1f MB)", nombre, len(df), entrada["bytes"] / (1024 ** 2))
+        return df, fuentes
+
+    def guardar(self, sql: str, df: pd.DataFrame, fuentes: dict, parametros=None, nombre: str = "query") -> None:
+        """Guarda el resultado y desaloja por LRU si se pasa de `max_bytes`. Un error solo se registra."""
+        if not self.activo:
+            return
+        clave = self.clave(sql, parametros)
+        ruta = self._ruta(clave)
+        tmp = self.directorio / f".{clave}.tmp-{os.getpid()}-{threading.get_ident()}"
+        try:
+            self.directorio.mkdir(parents=True, exist_ok=True)
+            df.to_parquet(tmp)
+            tamano = tmp.stat().st_size
+            if tamano > self.max_bytes:
+                logger.info("%s (%.1f MB) excede el tamaño máximo de la caché; no se guarda",
+                            nombre, tamano / (1024 ** 2))
+                tmp.unlink(missing_ok=True)
+                return
+            with self._candado:
+                os.replace(tmp, ruta)
+                ahora = datetime.now().isoformat()
+                self._indice[clave] = {
+                    "nombre": nombre, "creado": ahora, "ultimo_uso": ahora, "bytes": tamano,
+                    "filas": len(df), "fuentes": fuentes,
+                }
+                self._desalojar(conservar=clave)
+                self._guardar_indice()
+        except (OSError, ValueError, TypeError, ImportError) as e:
+            logger.warning("No se pudo guardar %s en la caché: %s", nombre, e)
+            tmp.unlink(missing_ok=True)
+
+    def _desalojar(self, conservar: Optional[str] = None) -> None:
+        por_uso = sorted(self._indice, key=lambda c: self._indice[c]["ultimo_uso"])
+        for clave in por_uso:
+            if self.bytes_totales <= self.max_bytes:
+                break
+            if clave != conservar:
+                logger.info("Caché: se desaloja %s (LRU)", self._indice[clave]["nombre"])
+                self._quitar(clave)
+
+    def leer_o_ejecutar(self, client, sql: str, ejecutar, parametros=None, nombre: str = "query") -> pd.DataFrame:
+        """Resultado desde la caché si está vigente; si no, `ejecutar()` y se guarda."""
+        df, fuentes = self.obtener(client, sql, parametros, nombre)
+        if df is None:
+            df = ejecutar()
+            self.guardar(sql, df, fuentes, parametros, nombre)
+        return df
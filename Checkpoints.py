@@ -0,0 +1,173 @@
+"""
+Checkpoints por etapa (`_time_block`) para reanudar corridas largas de H1Script.
+
+Cada etapa guarda sus salidas en `<directorio>/<etapa>-<clave>/`:
+- DataFrames como Parquet, tablas de Arrow (p. ej. columnas PROMOS_* en CSR) como Arrow IPC;
+- `manifest.json` al final, con tamaño y sha256 de cada archivo.
+La escritura se hace en un directorio temporal que se renombra al terminar, así que
+un checkpoint a medias nunca queda con el nombre final; si aun así falta el manifest
+o un archivo no coincide con él, el checkpoint se descarta y la etapa se recalcula.
+
+La clave es un hash de las entradas y parámetros de la etapa; para no re-hashear
+DataFrames grandes, las etapas encadenan la clave de la etapa anterior.
+Una etapa sin salidas (p. ej. una carga a BigQuery) guarda solo el manifest como marca de "hecha".
+Con clave None la etapa no usa checkpoint (p. ej. si depende de una etapa que no lo dejó).
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+VERSION_CHECKPOINT = 1
+_MANIFEST = "manifest.json"
+
+
+def _huella(valor, h) -> None:
+    """Alimenta el hash `h` con una representación estable de `valor`."""
+    if isinstance(valor, pd.DataFrame):
+        h.update(repr([(str(c), str(t)) for c, t in valor.dtypes.items()]).encode("utf-8"))
+        filas = pd.util.hash_pandas_object(valor, index=True).to_numpy(dtype="uint64")
+        h.update(filas.tobytes())
+    elif isinstance(valor, (bytes, bytearray)):
+        h.update(bytes(valor))
+    elif isinstance(valor, dict):
+        for k in sorted(valor, key=repr):
+            _huella(k, h)
+            _huella(valor[k], h)
+    elif isinstance(valor, (set, frozenset)):
+        for v in sorted(valor, key=repr):
+            _huella(v, h)
+    elif isinstance(valor, (list, tuple)):
+        for v in valor:
+            _huella(v, h)
+    else:
+        h.update(repr(valor).encode("utf-8"))
+    h.update(b"\x1f")
+
+
+def _sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for bloque in iter(lambda: f.read(1 << 20), b""):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+class Checkpoints:
+    """
+    - `guardar`: persistir las salidas de cada etapa.
+    - `reanudar`: usar checkpoints válidos en lugar de recalcular (--resume).
+    Si ninguno está activo, todas las llamadas son no-op.
+    """
+
+    def __init__(self, directorio, guardar: bool = False, reanudar: bool = False):
+        self.directorio = Path(directorio)
+        self.guardar_activo = guardar or reanudar
+        self.reanudar = reanudar
+
+    @staticmethod
+    def clave(etapa: str, *entradas) -> str:
+        """Hash de la etapa, sus entradas (claves previas, SQL, parámetros, DataFrames) y la versión."""
+        h = hashlib.sha1()
+        _huella((VERSION_CHECKPOINT, etapa), h)
+        for entrada in entradas:
+            _huella(entrada, h)
+        return h.hexdigest()[:16]
+
+    def _ruta(self, etapa: str, clave: str) -> Path:
+        return self.directorio / f"{etapa}-{clave}"
+
+    def _descartar(self, ruta: Path, motivo: str) -> None:
+        logger.warning("Checkpoint inválido (%s): %s; se descarta", ruta.name, motivo)
+        shutil.rmtree(ruta, ignore_errors=True)
+
+    def cargar(self, etapa: str, clave: str):
+        """Salidas {nombre: DataFrame | pa.Table} si hay un checkpoint válido y `reanudar`; si no, None."""
+        if not self.reanudar or clave is None:
+            return None
+        ruta = self._ruta(etapa, clave)
+        if not ruta.is_dir():
+            return None
+
+        try:
+            manifest = json.loads((ruta / _MANIFEST).read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            self._descartar(ruta, f"manifest ilegible ({e})")
+            return None
+        if manifest.get("version") != VERSION_CHECKPOINT or manifest.get("clave") != clave:
+            self._descartar(ruta, "versión o clave distinta")
+            return None
+
+        salidas = {}
+        for nombre, info in manifest["archivos"].items():
+            archivo = ruta / info["archivo"]
+            if not archivo.is_file() or archivo.stat().st_size != info["bytes"]:
+                self._descartar(ruta, f"{info['archivo']} incompleto")
+                return None
+            if _sha256(archivo) != info["sha256"]:
+                self._descartar(ruta, f"{info['archivo']} corrupto (sha256)")
+                return None
+            try:
+                if info["formato"] == "parquet":
+                    salidas[nombre] = pd.read_parquet(archivo)
+                else:
+                    with pa.memory_map(str(archivo), "r") as fuente:
+                        salidas[nombre] = ipc.open_file(fuente).read_all()
+            except (OSError, pa.ArrowException) as e:
+                self._descartar(ruta, f"{info['archivo']} no se pudo leer ({e})")
+                return None
+
+        logger.info("♻️  Checkpoint reutilizado: %s (%d salidas)", ruta.name, len(salidas))
+        return salidas
+
+    def guardar(self, etapa: str, clave: str, salidas: dict) -> None:
+        """Persiste las salidas de la etapa; un error al escribir solo se registra (la corrida sigue)."""
+        if not self.guardar_activo or clave is None:
+            return
+        ruta = self._ruta(etapa, clave)
+        tmp = self.directorio / f".{etapa}-{clave}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        try:
+            tmp.mkdir(parents=True)
+            archivos = {}
+            for nombre, valor in salidas.items():
+                if isinstance(valor, pa.Table):
+                    archivo, formato = f"{nombre}.arrow", "arrow"
+                    with ipc.new_file(str(tmp / archivo), valor.schema) as escritor:
+                        escritor.write_table(valor)
+                else:
+                    archivo, formato = f"{nombre}.parquet", "parquet"
+                    valor.to_parquet(tmp / archivo)
+                archivos[nombre] = {
+                    "archivo": archivo,
+                    "formato": formato,
+                    "filas": len(valor),
+                    "bytes": (tmp / archivo).stat().st_size,
+                    "sha256": _sha256(tmp / archivo),
+                }
+
+            # El manifest va al final: sin él, el checkpoint no cuenta como completo
+            manifest = {"version": VERSION_CHECKPOINT, "etapa": etapa, "clave": clave, "archivos": archivos}
+            (tmp / _MANIFEST).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+            shutil.rmtree(ruta, ignore_errors=True)
+            os.replace(tmp, ruta)
+        except (OSError, ValueError, TypeError, pa.ArrowException) as e:
+            logger.warning("No se pudo guardar el checkpoint %s-%s: %s", etapa, clave, e)
+            shutil.rmtree(tmp, ignore_errors=True)
+            return
+
+        # Solo se conserva el checkpoint vigente de cada etapa
+        for viejo in self.directorio.glob(f"{etapa}-*"):
+            if viejo != ruta:
+                shutil.rmtree(viejo, ignore_errors=True)
+        logger.info("💾 Checkpoint guardado: %s", ruta.name)
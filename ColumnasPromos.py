@@ -0,0 +1,201 @@
+"""
+Representación compacta de las columnas PROMOS_* (listas de IDs de promoción).
+
+Cada columna se guarda en formato CSR: `offsets` (n + 1) y `codigos` (int32),
+donde el código es la posición del ID en un catálogo ordenado de promociones
+compartido por todas las columnas. Las listas de Python solo se materializan
+al escribir la salida (REPEATED INTEGER en BigQuery).
+"""
+from itertools import chain
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from IndiceSesiones import IndiceSesiones
+
+
+COLUMNAS_PROMOS = [
+    f"PROMOS_{etapa}_{clase}"
+    for etapa in ("ADD_CART", "CHECKOUT", "PURCHASE")
+    for clase in ("COMPLETAS", "INCOMPLETAS", "TODAS")
+]
+
+# Flags de análisis ADD_TO_CART: nombre -> (columna PROMOS_*, ¿promo combinada?)
+FLAGS_ADD_CART = {
+    "HAS_SIMPLE_INCOMPLETE": ("PROMOS_ADD_CART_INCOMPLETAS", False),
+    "HAS_COMBINED_INCOMPLETE": ("PROMOS_ADD_CART_INCOMPLETAS", True),
+    "HAS_SIMPLE_COMPLETA": ("PROMOS_ADD_CART_COMPLETAS", False),
+    "HAS_COMBINED_COMPLETA": ("PROMOS_ADD_CART_COMPLETAS", True),
+}
+
+
+class ColumnaPromos:
+    """Una columna PROMOS_* en CSR: la fila i tiene catalogo[codigos[offsets[i]:offsets[i + 1]]]."""
+
+    __slots__ = ("offsets", "codigos", "catalogo")
+
+    def __init__(self, offsets, codigos, catalogo):
+        self.offsets = np.asarray(offsets, dtype="int64")
+        self.codigos = np.asarray(codigos, dtype="int32")
+        self.catalogo = np.asarray(catalogo, dtype="int64")
+
+    @classmethod
+    def desde_pares(cls, filas, pids, n: int, catalogo=None) -> "ColumnaPromos":
+        """Construye desde pares (fila, promo); ordena y quita duplicados por fila."""
+        filas = np.asarray(filas, dtype="int64")
+        pids = np.asarray(pids, dtype="int64")
+        catalogo = np.unique(pids) if catalogo is None else np.asarray(catalogo, dtype="int64")
+        codigos = np.searchsorted(catalogo, pids)
+
+        orden = np.lexsort((codigos, filas))
+        filas, codigos = filas[orden], codigos[orden]
+        unicos = np.ones(len(filas), dtype=bool)
+        unicos[1:] = (filas[1:] != filas[:-1]) | (codigos[1:] != codigos[:-1])
+        filas, codigos = filas[unicos], codigos[unicos]
+        return cls(np.searchsorted(filas, np.arange(n + 1)), codigos, catalogo)
+
+    @classmethod
+    def desde_listas(cls, valores, catalogo=None) -> "ColumnaPromos":
+        """Construye desde una columna de listas/ndarrays (lo que no sea lista cuenta como vacío)."""
+        valores = [x if isinstance(x, (list, tuple, np.ndarray)) else () for x in valores]
+        largos = np.fromiter(map(len, valores), dtype="int64", count=len(valores))
+        pids = np.fromiter(chain.from_iterable(valores), dtype="int64", count=int(largos.sum()))
+        return cls.desde_pares(np.repeat(np.arange(len(valores)), largos), pids, len(valores), catalogo)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        return self.offsets.nbytes + self.codigos.nbytes
+
+    def largos(self) -> np.ndarray:
+        """Número de promos por fila."""
+        return np.diff(self.offsets)
+
+    def filas(self) -> np.ndarray:
+        """Fila de cada valor (explode de la columna)."""
+        return np.repeat(np.arange(len(self)), self.largos())
+
+    def valores(self) -> np.ndarray:
+        """IDs de promo de todos los valores, en orden de fila."""
+        return self.catalogo[self.codigos]
+
+    def unicos(self) -> set:
+        """Conjunto de IDs de promo que aparecen en la columna."""
+        return set(self.catalogo[np.unique(self.codigos)].tolist())
+
+    def por_fila(self, marca: np.ndarray) -> np.ndarray:
+        """¿La fila tiene al menos un valor con `marca` (booleano por código del catálogo)?"""
+        return np.bincount(self.filas()[marca[self.codigos]], minlength=len(self)) > 0
+
+    def a_listas(self) -> list:
+        """Materializa listas de int de Python (una por fila)."""
+        valores = self.valores().tolist()
+        offsets = self.offsets
+        return [valores[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+
+class TablaPromos:
+    """
+    Conjunto de columnas PROMOS_* alineadas por posición con un DataFrame
+    (misma cantidad y orden de filas), con catálogo de promos compartido.
+    """
+
+    def __init__(self, columnas: dict):
+        self.columnas = columnas
+
+    @classmethod
+    def desde_df(cls, df: pd.DataFrame, columnas=None) -> "TablaPromos":
+        """Convierte columnas de listas de `df` a CSR (por defecto, las nueve PROMOS_*)."""
+        columnas = [c for c in (columnas or COLUMNAS_PROMOS) if c in df.columns]
+        tmp = {c: ColumnaPromos.desde_listas(df[c].to_numpy(dtype="object")) for c in columnas}
+        catalogo = np.unique(np.concatenate([col.catalogo for col in tmp.values()] or [np.empty(0, "int64")]))
+        return cls({
+            c: ColumnaPromos(col.offsets, np.searchsorted(catalogo, col.valores()), catalogo)
+            for c, col in tmp.items()
+        })
+
+    @classmethod
+    def desde_pares(cls, pares: dict, n: int) -> "TablaPromos":
+        """Construye desde {columna: (filas, pids)} con n filas."""
+        todos = [np.asarray(p, dtype="int64") for _, p in pares.values()]
+        catalogo = np.unique(np.concatenate(todos or [np.empty(0, "int64")]))
+        return cls({
+            c: ColumnaPromos.desde_pares(filas, pids, n, catalogo)
+            for c, (filas, pids) in pares.items()
+        })
+
+    @classmethod
+    def desde_arrow(cls, tabla) -> "TablaPromos":
+        """Inverso de `a_arrow` (columnas list<int64> de una tabla de Arrow)."""
+        crudas = {}
+        for c in tabla.column_names:
+            arr = tabla.column(c).combine_chunks()
+            offsets = arr.offsets.to_numpy().astype("int64")
+            valores = arr.values.to_numpy()[offsets[0]:offsets[-1]]
+            crudas[c] = (offsets - offsets[0], valores)
+        catalogo = np.unique(np.concatenate([v for _, v in crudas.values()] or [np.empty(0, "int64")]))
+        return cls({
+            c: ColumnaPromos(offsets, np.searchsorted(catalogo, valores), catalogo)
+            for c, (offsets, valores) in crudas.items()
+        })
+
+    def a_arrow(self):
+        """Tabla de Arrow con columnas large_list<int64> armadas directo del CSR (sin listas de Python)."""
+        import pyarrow as pa
+        return pa.table({
+            c: pa.LargeListArray.from_arrays(col.offsets, col.valores())
+            for c, col in self.columnas.items()
+        })
+
+    def __getitem__(self, columna: str) -> ColumnaPromos:
+        return self.columnas[columna]
+
+    def __contains__(self, columna: str) -> bool:
+        return columna in self.columnas
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.nbytes for col in self.columnas.values())
+
+    def materializar(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Regresa una copia de `df` con las columnas PROMOS_* como listas (para CSV / BigQuery REPEATED)."""
+        return df.assign(**{
+            c: pd.Series(col.a_listas(), index=df.index, dtype="object")
+            for c, col in self.columnas.items()
+        })
+
+
+def flags_simples_combinadas(tabla: TablaPromos, promos_multi, flags: dict = None) -> dict:
+    """
+    Flags HAS_* por fila en una sola pasada: la pertenencia a `promos_multi` se
+    evalúa una vez por promo del catálogo (isin) y se reduce por fila con el CSR.
+    Regresa {flag: ndarray booleano}.
+    """
+    flags = flags or FLAGS_ADD_CART
+    multi = np.asarray([int(p) for p in promos_multi], dtype="int64")
+    es_multi = {}
+    salida = {}
+    for nombre, (columna, combinada) in flags.items():
+        col = tabla[columna]
+        if columna not in es_multi:
+            es_multi[columna] = np.isin(col.catalogo, multi)
+        marca = es_multi[columna] if combinada else ~es_multi[columna]
+        salida[nombre] = col.por_fila(marca)
+    return salida
+
+
+def flags_por_sesion(df: pd.DataFrame, flags: dict, claves=None, indice: Optional[IndiceSesiones] = None) -> pd.DataFrame:
+    """
+    Agregado `any` de los flags por sesión (mismo resultado que groupby(claves).agg("any"),
+    incluido el descarte de claves nulas), reutilizando los arreglos por fila.
+    Con `indice` (IndiceSesiones de las mismas filas) se reutiliza su ordenamiento.
+    """
+    if indice is None:
+        indice = IndiceSesiones.desde_df(df, claves)
+    sesion = indice.sesiones.copy()
+    for nombre, valores in flags.items():
+        sesion[f"{nombre}_SESION"] = indice.alguno(valores)
+    return sesion
@@ -0,0 +1,6 @@
+-- Modo incremental: elimina las particiones (DATE(FECHA_EVENTO)) que se van a recargar.
+-- Las filas sin FECHA_EVENTO no pertenecen a ningún día del plan y ya no se cargan:
+-- se eliminan las que hayan quedado de cargas anteriores.
+DELETE FROM `{TABLE_PATRONES}`
+WHERE DATE(FECHA_EVENTO) IN UNNEST({DIAS})
+   OR FECHA_EVENTO IS NULL
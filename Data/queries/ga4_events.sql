@@ -20,4 +20,5 @@ SELECT
   transaction_id       AS TRANSACTION_ID,
   CAST(NULL AS STRING) AS item_id
 FROM `{TABLE_B}`
-WHERE attempt_date BETWEEN DATE('{DATE_START}') AND DATE('{DATE_END}')
\ No newline at end of file
+WHERE attempt_date BETWEEN DATE('{DATE_START}') AND DATE('{DATE_END}')
+  AND {FILTRO_DIAS}                -- modo incremental: attempt_date IN UNNEST([...]); TRUE en corrida completa
\ No newline at end of file
@@ -0,0 +1,34 @@
+-- Huella por partición attempt_date de la tabla base GA4 (modo incremental de H1Script).
+-- dia_min_sesion / dia_max_sesion: rango de días de las sesiones que tocan cada partición,
+-- para no partir sesiones que cruzan la medianoche.
+WITH base AS (
+  SELECT
+    attempt_date,
+    USER,
+    SESION,
+    FARM_FINGERPRINT(TO_JSON_STRING(t)) AS huella_fila
+  FROM `{TABLE_B}` AS t
+  WHERE attempt_date BETWEEN DATE('{DATE_START}') AND DATE('{DATE_END}')
+),
+
+sesiones AS (
+  SELECT
+    USER,
+    SESION,
+    MIN(attempt_date) AS dia_min_sesion,
+    MAX(attempt_date) AS dia_max_sesion
+  FROM base
+  GROUP BY USER, SESION
+)
+
+SELECT
+  b.attempt_date,
+  COUNT(*)                                           AS filas,
+  BIT_XOR(b.huella_fila)                             AS huella,
+  MIN(COALESCE(s.dia_min_sesion, b.attempt_date))    AS dia_min_sesion,
+  MAX(COALESCE(s.dia_max_sesion, b.attempt_date))    AS dia_max_sesion
+FROM base b
+LEFT JOIN sesiones s
+  ON b.USER = s.USER AND b.SESION = s.SESION
+GROUP BY b.attempt_date
+ORDER BY b.attempt_date
@@ -7,8 +7,8 @@ WITH t AS (
     USER            AS user_pseudo_id,
     SESION          AS session_id,
     DATETIME        AS datetime_str,
-    PARSE_DATETIME('%d/%m/%Y %H:%M:%S', DATETIME) AS attempt_dt_mx,
-    PARSE_DATE('%d/%m/%Y', SUBSTR(DATETIME,1,10)) AS attempt_date,
+    FECHA_EVENTO    AS attempt_dt_mx,   -- ya tipada desde el script (no se re-parsea DATETIME)
+    DATE(FECHA_EVENTO) AS attempt_date,
     ITEM,
     SAFE_CAST(INTENTO AS INT64) AS intento,
     STATUS,
@@ -26,7 +26,7 @@ WITH t AS (
     traffic_source,
     traffic_medium,
     dias_para_sorteo,	
-    COUNT(*) OVER(PARTITION BY TIMESTAMP_TRUNC(PARSE_DATETIME('%d/%m/%Y %H:%M:%S', DATETIME), MINUTE)) AS traffic_density_score,
+    COUNT(*) OVER(PARTITION BY TIMESTAMP_TRUNC(FECHA_EVENTO, MINUTE)) AS traffic_density_score,
     COUNT(DISTINCT ITEM) OVER(PARTITION BY USER, SESION) AS products_in_session_count,
     -- Fin de cambios JQL 16Ene26
 
@@ -41,7 +41,8 @@ WITH t AS (
     PATRON_ADD_CART, PATRON_BEGIN_CHECKOUT, PATRON_PURCHASE,
     TIENE_PATRON_COMPLETO, TIENE_PATRON_INCOMPLETO
   FROM `sorteostec-ml.h1.ga4_patrones_promociones_20241001_20251231`
-  WHERE PARSE_DATE('%d/%m/%Y', SUBSTR(DATETIME,1,10))
+  -- La tabla está particionada por día de FECHA_EVENTO: este filtro solo lee las particiones del rango
+  WHERE DATE(FECHA_EVENTO)
         BETWEEN DATE '2024-10-01' AND DATE '2025-12-31'
 ),
 s AS (
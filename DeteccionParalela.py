@@ -0,0 +1,102 @@
+"""
+Detección de patrones en paralelo por sesión (motor fila por fila).
+
+Las sesiones (USER, SESION) se reparten en shards con un hash estable; cada
+shard se procesa en un pool de procesos con `detectar_patrones_fila` y los
+resultados se reordenan por el índice original, de modo que el resultado es
+idéntico al de la corrida serial.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from ReglasPromociones import TAMANO_MEMO, detectar_patrones_fila, log_memo
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+# Tablas de reglas de solo lectura; se cargan una sola vez por proceso worker
+_REGLAS = {}
+
+
+def workers_disponibles() -> int:
+    """Núcleos disponibles para este proceso (respeta afinidad de CPU si existe)."""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def asignar_shards(df_eventos: pd.DataFrame, n_shards: int) -> np.ndarray:
+    """
+    Shard de cada fila según (USER, SESION).
+    Usa hash_pandas_object, que no depende de PYTHONHASHSEED: la misma sesión
+    cae siempre en el mismo shard y nunca se parte entre shards.
+    """
+    hashes = pd.util.hash_pandas_object(df_eventos[['USER', 'SESION']], index=False).to_numpy()
+    return (hashes % np.uint64(n_shards)).astype('int64')
+
+
+def _inicializar_worker(condiciones_df, promos_multi, requisitos_multi, vigencia_promo, tamano_memo):
+    _REGLAS['condiciones_df'] = condiciones_df
+    _REGLAS['promos_multi'] = promos_multi
+    _REGLAS['requisitos_multi'] = requisitos_multi
+    _REGLAS['vigencia_promo'] = vigencia_promo
+    _REGLAS['tamano_memo'] = tamano_memo
+
+
+def _procesar_shard(df_shard: pd.DataFrame) -> pd.DataFrame:
+    return detectar_patrones_fila(df_eventos=df_shard, reportar_progreso=False, **_REGLAS)
+
+
+def detectar_patrones_paralelo(df_eventos, condiciones_df, promos_multi, requisitos_multi,
+                               vigencia_promo, n_workers=None, n_shards=None, tamano_memo=TAMANO_MEMO):
+    """
+    Igual que `detectar_patrones_fila`, pero repartiendo las sesiones en `n_shards`
+    shards procesados por `n_workers` procesos (por defecto, los núcleos disponibles).
+    - Las reglas (condiciones, promos_multi, requisitos_multi, vigencia_promo) viajan
+      una vez por worker vía `initializer`, no una vez por shard.
+    - Se usa el contexto "spawn" para no hacer fork de un proceso con hilos del
+      cliente de BigQuery.
+    - Cada worker tiene su propio memo de `tamano_memo` entradas; se reportan las estadísticas sumadas.
+    """
+    n_workers = n_workers or workers_disponibles()
+    n_shards = n_shards or n_workers
+
+    if n_workers <= 1 or n_shards <= 1:
+        return detectar_patrones_fila(df_eventos, condiciones_df, promos_multi,
+                                      requisitos_multi, vigencia_promo, tamano_memo=tamano_memo)
+
+    shards = asignar_shards(df_eventos, n_shards)
+    logger.info("Detección paralela: %d workers, %d shards", n_workers, n_shards)
+
+    resultados = []
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_inicializar_worker,
+        initargs=(condiciones_df, promos_multi, requisitos_multi, vigencia_promo, tamano_memo),
+    ) as pool:
+        futuros = [
+            pool.submit(_procesar_shard, df_eventos[shards == i])
+            for i in range(n_shards)
+            if (shards == i).any()
+        ]
+        for idx, futuro in enumerate(as_completed(futuros), start=1):
+            resultados.append(futuro.result())
+            logger.info("Progreso shards: %d / %d", idx, len(futuros))
+
+    resultados = [r for r in resultados if len(r)]
+    memo = {}
+    for r in resultados:
+        for k, v in r.attrs.get('memo', {}).items():
+            memo[k] = memo.get(k, 0) + v
+    if memo:
+        log_memo(memo)
+    if not resultados:
+        return pd.DataFrame()
+    return pd.concat(resultados).sort_index()
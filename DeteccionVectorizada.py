@@ -0,0 +1,418 @@
+"""
+Motor columnar para la detección de patrones de promociones.
+
+Reproduce las columnas PATRON_* / PROMOS_* / DESC_* que genera
+`detectar_patrones_producto` fila por fila, pero haciendo un solo join
+eventos × condiciones por `clave_edicion_producto` y evaluando cada
+`clave_tipo_cantidad_condicion` (1-7) para las tres etapas con máscaras NumPy.
+"""
+import numpy as np
+import pandas as pd
+
+from ColumnasPromos import TablaPromos
+from IndiceVigencia import IndiceVigencia
+from ReglasPromociones import fechas_evento
+from RequisitosCombinados import como_requisitos
+
+
+# (clave interna, columna de cantidad, sufijo en columnas PROMOS_*, columna PATRON_*)
+ETAPAS = [
+    ("add_cart", "CANTIDAD_ADD_TO_CART", "ADD_CART", "PATRON_ADD_CART"),
+    ("checkout", "CANTIDAD_BEGIN_CHECKOUT", "CHECKOUT", "PATRON_BEGIN_CHECKOUT"),
+    ("purchase", "CANTIDAD_PURCHASE", "PURCHASE", "PATRON_PURCHASE"),
+]
+
+COLUMNAS_RESULTADO = [
+    col
+    for _, _, sufijo, col_patron in ETAPAS
+    for col in (
+        col_patron,
+        f"PROMOS_{sufijo}_COMPLETAS",
+        f"PROMOS_{sufijo}_INCOMPLETAS",
+        f"PROMOS_{sufijo}_TODAS",
+        f"DESC_{sufijo}_COMPLETAS",
+    )
+]
+
+
+# ----------------------------
+# Helpers de arreglos
+# ----------------------------
+def _a_float(serie) -> np.ndarray:
+    """Convierte a float64 conservando NaN (nulos de BigQuery incluidos)."""
+    return pd.to_numeric(serie, errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _cantidades(df: pd.DataFrame, col: str) -> np.ndarray:
+    """Equivalente vectorizado de `row.get(col, 0) or 0`."""
+    if col not in df.columns:
+        return np.zeros(len(df), dtype="float64")
+    return _a_float(df[col])
+
+
+def _como_indice_vigencia(vigencia_promo) -> IndiceVigencia:
+    """Acepta el IndiceVigencia o el dict {pid: (inicio, cierre)} de versiones previas."""
+    if isinstance(vigencia_promo, IndiceVigencia):
+        return vigencia_promo
+    return IndiceVigencia.desde_dict(vigencia_promo)
+
+
+def _join_por_producto(prod_eventos: np.ndarray, prod_reglas: np.ndarray):
+    """
+    Join interno eventos × reglas por clave de producto.
+    Regresa (posiciones de evento, posiciones de regla) de cada par.
+    """
+    pares = pd.DataFrame({"clave": prod_eventos, "_e": np.arange(len(prod_eventos))}).merge(
+        pd.DataFrame({"clave": prod_reglas, "_r": np.arange(len(prod_reglas))}),
+        on="clave",
+        how="inner",
+    )
+    return pares["_e"].to_numpy(dtype="int64"), pares["_r"].to_numpy(dtype="int64")
+
+
+def _listas_por_fila(pos: np.ndarray, valores: np.ndarray, n: int) -> list:
+    """
+    Agrupa pares (fila, valor) en una lista ordenada y sin duplicados por fila.
+    Usa offsets tipo CSR para no iterar sobre los pares en Python.
+    """
+    if len(pos) == 0:
+        return [[] for _ in range(n)]
+    orden = np.lexsort((valores, pos))
+    pos, valores = pos[orden], valores[orden]
+    unicos = np.ones(len(pos), dtype=bool)
+    unicos[1:] = (pos[1:] != pos[:-1]) | (valores[1:] != valores[:-1])
+    pos, valores = pos[unicos], valores[unicos]
+    offsets = np.searchsorted(pos, np.arange(n + 1))
+    valores = valores.tolist()
+    return [valores[offsets[i]:offsets[i + 1]] for i in range(n)]
+
+
+# ----------------------------
+# Reglas vectorizadas
+# ----------------------------
+def cumple_patron_vectorizado(cantidad, tipo, cant_inicial, cant_final):
+    """Versión en arreglos de `cumple_patron` (mismos tipos 1-7)."""
+    cantidad = np.asarray(cantidad, dtype="float64")
+    tipo = np.asarray(tipo, dtype="float64")
+    cant_inicial = np.asarray(cant_inicial, dtype="float64")
+    cant_final = np.asarray(cant_final, dtype="float64")
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        # `cant_final if cant_final else cant_inicial`: 0 cae al inicial, NaN no cumple
+        tope = np.where(cant_final == 0, cant_inicial, cant_final)
+        resto = np.where(cant_inicial != 0, np.mod(cantidad, cant_inicial), np.nan)
+
+        cumple = np.select(
+            [tipo == 1, tipo == 2, tipo == 3, tipo == 4, tipo == 5, tipo == 6, tipo == 7],
+            [
+                cantidad == cant_inicial,
+                cantidad >= cant_inicial,
+                cantidad <= cant_inicial,
+                (cantidad >= cant_inicial) & (cantidad <= tope),
+                cantidad >= cant_inicial,
+                (cantidad >= cant_inicial) & (resto == 0),
+                (cant_inicial > 0) & (resto == 0),
+            ],
+            default=False,
+        )
+    return cumple & ~np.isnan(cantidad) & (cantidad != 0)
+
+
+def es_incompleta_simple_vectorizado(cantidad, cant_inicial):
+    """Versión en arreglos de `es_incompleta_simple` (near miss N - 1)."""
+    cantidad = np.asarray(cantidad, dtype="float64")
+    cant_inicial = np.asarray(cant_inicial, dtype="float64")
+    validos = ~np.isnan(cantidad) & ~np.isnan(cant_inicial)
+    with np.errstate(invalid="ignore"):
+        return validos & (np.trunc(cantidad) == np.trunc(cant_inicial) - 1)
+
+
+# ----------------------------
+# Completitud de combinadas por sesión
+# ----------------------------
+class CompletitudSesiones:
+    """
+    Promos combinadas completas por sesión y etapa, guardadas como matriz
+    dispersa sesiones × promos: por etapa, un arreglo ordenado de claves
+    `codigo_sesion * len(promos) + columna_promo`.
+    - `sesiones`: MultiIndex (USER, SESION); la posición es el código de sesión.
+    - `promos`: ids de promo (ordenados); la posición es la columna.
+    - `codigos_fila`: opcional, código de sesión de cada fila del DataFrame de
+      eventos del que se construyó (-1 si la fila no tiene sesión).
+    """
+
+    def __init__(self, sesiones: pd.MultiIndex, promos, claves: dict, codigos_fila=None):
+        self.sesiones = sesiones
+        self.promos = np.asarray(promos, dtype="int64")
+        self.claves = claves
+        self.codigos_fila = codigos_fila
+
+    @classmethod
+    def desde_pares(cls, sesiones, promos, pares: dict, codigos_fila=None) -> "CompletitudSesiones":
+        """Construye a partir de {etapa: (codigos_sesion, ids_promo)} completos."""
+        promos = np.unique(np.asarray(list(promos), dtype="int64"))
+        claves = {}
+        for etapa, _, _, _ in ETAPAS:
+            codigos, pids = pares.get(etapa, (np.empty(0, "int64"), np.empty(0, "int64")))
+            cols = np.searchsorted(promos, np.asarray(pids, dtype="int64"))
+            claves[etapa] = np.unique(np.asarray(codigos, dtype="int64") * len(promos) + cols)
+        return cls(sesiones, promos, claves, codigos_fila)
+
+    @classmethod
+    def desde_dict(cls, completas_por_sesion: dict, promos) -> "CompletitudSesiones":
+        """Construye a partir de {(USER, SESION): {'add_cart': [...], ...}} (salida de evaluar_promociones_sesion)."""
+        sesiones = pd.MultiIndex.from_tuples(list(completas_por_sesion.keys()), names=["USER", "SESION"])
+        pares = {}
+        for etapa, _, _, _ in ETAPAS:
+            codigos = [i for i, c in enumerate(completas_por_sesion.values()) for _ in c[etapa]]
+            pids = [pid for c in completas_por_sesion.values() for pid in c[etapa]]
+            pares[etapa] = (codigos, pids)
+        return cls.desde_pares(sesiones, promos, pares)
+
+    def codigos(self, users, sesiones) -> np.ndarray:
+        """Código de sesión para cada par (USER, SESION); -1 si no existe."""
+        return self.sesiones.get_indexer(pd.MultiIndex.from_arrays([users, sesiones]))
+
+    def esta_completa(self, etapa: str, codigos: np.ndarray, pids: np.ndarray) -> np.ndarray:
+        """¿La promo `pids[i]` quedó completa en la sesión `codigos[i]`?"""
+        codigos = np.asarray(codigos, dtype="int64")
+        pids = np.asarray(pids, dtype="int64")
+        resultado = np.zeros(len(codigos), dtype=bool)
+        if len(self.promos) == 0 or len(self.claves[etapa]) == 0:
+            return resultado
+
+        cols = np.minimum(np.searchsorted(self.promos, pids), len(self.promos) - 1)
+        validos = (codigos >= 0) & (self.promos[cols] == pids)
+        claves = codigos * len(self.promos) + cols
+        pos = np.minimum(np.searchsorted(self.claves[etapa], claves), len(self.claves[etapa]) - 1)
+        resultado[validos] = self.claves[etapa][pos[validos]] == claves[validos]
+        return resultado
+
+
+def evaluar_promociones_combinadas_matricial(
+    df_eventos: pd.DataFrame,
+    requisitos_multi: dict,
+    vigencia_promo: IndiceVigencia,
+) -> CompletitudSesiones:
+    """
+    Evalúa las promos combinadas de TODAS las sesiones en una sola pasada.
+    Mismo criterio que `evaluar_promociones_sesion`:
+    - cada producto requerido suma cantidad >= cantidad_requerida en la sesión, por etapa;
+    - la promo debe estar vigente en la fecha de la primera fila de la sesión.
+    Se arma un agregado disperso sesión × producto por etapa y se compara contra
+    la tabla promo × producto de requisitos.
+    """
+    con_sesion = (df_eventos["USER"].notna() & df_eventos["SESION"].notna()).to_numpy()
+    ev = df_eventos[con_sesion]
+    grupos = ev.groupby(["USER", "SESION"], sort=True)
+    codigos = grupos.ngroup().to_numpy(dtype="int64")
+    sesiones = grupos.size().index
+    n_sesiones = len(sesiones)
+
+    codigos_fila = np.full(len(df_eventos), -1, dtype="int64")
+    codigos_fila[con_sesion] = codigos
+
+    # Fecha de la sesión = FECHA_EVENTO de su primera fila
+    orden = np.argsort(codigos, kind="stable")
+    inicio_grupo = np.ones(len(orden), dtype=bool)
+    inicio_grupo[1:] = codigos[orden][1:] != codigos[orden][:-1]
+    primeras = orden[inicio_grupo]
+    fecha_sesion = np.full(n_sesiones, np.datetime64("NaT"), dtype="datetime64[ns]")
+    fecha_sesion[codigos[primeras]] = fechas_evento(ev).iloc[primeras].to_numpy(dtype="datetime64[ns]")
+
+    # Tabla promo × producto de requisitos
+    requisitos = como_requisitos(requisitos_multi)
+    req_pid, req_prod, req_need = requisitos.req_pid, requisitos.req_producto, requisitos.req_cantidad
+    promos = requisitos.promos
+    vacio = CompletitudSesiones.desde_pares(sesiones, promos, {}, codigos_fila)
+    if n_sesiones == 0 or len(promos) == 0:
+        return vacio
+
+    req_col = np.searchsorted(promos, req_pid)
+    req_need = req_need.astype("float64")
+    productos, req_prod = np.unique(req_prod.astype("float64"), return_inverse=True)
+
+    vigencia_promo = _como_indice_vigencia(vigencia_promo)
+
+    # Un requisito con cantidad <= 0 se cumple aun sin filas del producto
+    positivos = req_need > 0
+    req_por_promo = np.bincount(req_col[positivos], minlength=len(promos))
+
+    # Agregado disperso sesión × producto (solo productos que aparecen en requisitos)
+    prod_ev = (_a_float(ev["clave_edicion_producto"]) if "clave_edicion_producto" in ev.columns
+               else np.full(len(ev), np.nan))
+    prod_col = np.minimum(np.searchsorted(productos, prod_ev), len(productos) - 1)
+    relevantes = np.flatnonzero(productos[prod_col] == prod_ev)
+    celdas, inversa = np.unique(codigos[relevantes] * len(productos) + prod_col[relevantes], return_inverse=True)
+    celda_sesion, celda_prod = np.divmod(celdas, len(productos))
+    sumas = {
+        etapa: np.bincount(inversa, weights=np.nan_to_num(_cantidades(ev, col)[relevantes]), minlength=len(celdas))
+        for etapa, col, _, _ in ETAPAS
+    }
+
+    # Cruce celdas × requisitos positivos del mismo producto
+    req_pos = np.flatnonzero(positivos)
+    req_pos = req_pos[np.argsort(req_prod[req_pos], kind="stable")]
+    offsets = np.searchsorted(req_prod[req_pos], np.arange(len(productos) + 1))
+    por_celda = offsets[celda_prod + 1] - offsets[celda_prod]
+    celda_rep = np.repeat(np.arange(len(celdas)), por_celda)
+    desfase = np.arange(len(celda_rep)) - np.repeat(np.cumsum(por_celda) - por_celda, por_celda)
+    req_rep = req_pos[np.repeat(offsets[celda_prod], por_celda) + desfase]
+
+    activas_sin_req = np.flatnonzero(req_por_promo == 0)
+    pares = {}
+    for etapa, _, _, _ in ETAPAS:
+        cumple = sumas[etapa][celda_rep] >= req_need[req_rep]
+        claves, conteo = np.unique(
+            celda_sesion[celda_rep[cumple]] * len(promos) + req_col[req_rep[cumple]],
+            return_counts=True,
+        )
+        ses, cols = np.divmod(claves, len(promos))
+        completas = conteo == req_por_promo[cols]
+        ses, cols = ses[completas], cols[completas]
+
+        # Promos cuyos requisitos son todos <= 0: completas en toda sesión vigente
+        if len(activas_sin_req):
+            ses = np.concatenate([ses, np.repeat(np.arange(n_sesiones), len(activas_sin_req))])
+            cols = np.concatenate([cols, np.tile(activas_sin_req, n_sesiones)])
+
+        vigente = vigencia_promo.activas(promos[cols], fecha_sesion[ses])
+        pares[etapa] = (ses[vigente], promos[cols[vigente]])
+
+    return CompletitudSesiones.desde_pares(sesiones, promos, pares, codigos_fila)
+
+
+# ----------------------------
+# Motor principal
+# ----------------------------
+def detectar_patrones_vectorizado(
+    df_eventos: pd.DataFrame,
+    condiciones_df: pd.DataFrame,
+    promos_multi,
+    requisitos_multi: dict,
+    vigencia_promo: IndiceVigencia,
+    completitud_sesiones: CompletitudSesiones,
+    como_csr: bool = False,
+):
+    """
+    Detecta patrones de promociones para todas las filas de `df_eventos` a la vez.
+    - Promos simples: join eventos × condiciones por producto y máscaras por tipo.
+      La vigencia de cada promo se consulta en `vigencia_promo` (IndiceVigencia).
+    - Promos combinadas: join eventos × requisitos por producto; la completitud de
+      la sesión se toma de `completitud_sesiones` (ver
+      `evaluar_promociones_combinadas_matricial`).
+    Regresa un DataFrame con las columnas COLUMNAS_RESULTADO e igual índice que
+    `df_eventos`. Las filas sin USER/SESION quedan en NaN, igual que al iterar
+    con groupby.
+    Con `como_csr=True` regresa (DataFrame sin las columnas PROMOS_*, TablaPromos)
+    para no materializar millones de listas de Python.
+    """
+    con_sesion = df_eventos["USER"].notna() & df_eventos["SESION"].notna()
+    ev = df_eventos[con_sesion]
+    n = len(ev)
+    vigencia_promo = _como_indice_vigencia(vigencia_promo)
+
+    prod_ev = _a_float(ev["clave_edicion_producto"]) if "clave_edicion_producto" in ev.columns \
+        else np.full(n, np.nan)
+    fecha_ev = fechas_evento(ev).to_numpy(dtype="datetime64[ns]")
+    evaluables = np.flatnonzero(~np.isnan(prod_ev) & ~np.isnat(fecha_ev))
+    cantidades = {etapa: _cantidades(ev, col) for etapa, col, _, _ in ETAPAS}
+
+    # Pares (fila, promo) por etapa y clase de resultado
+    pares = {etapa: {"completas": [], "incompletas": [], "todas": []} for etapa, _, _, _ in ETAPAS}
+    pares_desc = {etapa: [] for etapa, _, _, _ in ETAPAS}
+
+    # 6.A) PROMOS COMBINADAS
+    requisitos = como_requisitos(requisitos_multi)
+    en_multi = np.isin(requisitos.req_pid, np.fromiter((int(p) for p in promos_multi), dtype="int64"))
+    req_pid = requisitos.req_pid[en_multi]
+    req_need = requisitos.req_cantidad[en_multi].astype("float64")
+
+    e, r = _join_por_producto(prod_ev[evaluables], requisitos.req_producto[en_multi].astype("float64"))
+    e = evaluables[e]
+    activa = vigencia_promo.activas(req_pid[r], fecha_ev[e])
+    e, r = e[activa], r[activa]
+    if completitud_sesiones.codigos_fila is not None and len(completitud_sesiones.codigos_fila) == len(df_eventos):
+        codigos = completitud_sesiones.codigos_fila[con_sesion.to_numpy()][e]
+    else:
+        codigos = completitud_sesiones.codigos(ev["USER"].to_numpy()[e], ev["SESION"].to_numpy()[e])
+    for etapa, _, _, _ in ETAPAS:
+        with np.errstate(invalid="ignore"):
+            cumple = cantidades[etapa][e] >= req_need[r]
+        if not cumple.any():
+            continue
+        completa = completitud_sesiones.esta_completa(etapa, codigos[cumple], req_pid[r][cumple])
+        filas, pids = e[cumple], req_pid[r][cumple]
+        pares[etapa]["todas"].append((filas, pids))
+        pares[etapa]["completas"].append((filas[completa], pids[completa]))
+        pares[etapa]["incompletas"].append((filas[~completa], pids[~completa]))
+
+    # 6.B) PROMOS SIMPLES
+    cond_pid = _a_float(condiciones_df["clave_promocion"])
+    cond_prod = _a_float(condiciones_df["clave_edicion_producto"])
+    es_multi = pd.Series(cond_pid).isin([float(p) for p in promos_multi]).to_numpy()
+    cond_ok = np.flatnonzero(~np.isnan(cond_pid) & ~np.isnan(cond_prod) & ~es_multi)
+
+    cond = condiciones_df.iloc[cond_ok]
+    cond_pid = cond_pid[cond_ok].astype("int64")
+    tipo = _a_float(cond["clave_tipo_cantidad_condicion"])
+    cant_inicial = _a_float(cond["cantidad_inicial"])
+    cant_final = _a_float(cond["cantidad_final"])
+    if "interpretacion" in cond.columns:
+        interp = cond["interpretacion"].to_numpy(dtype="object")
+    else:
+        interp = np.full(len(cond), "", dtype="object")
+    con_desc = np.array([isinstance(x, str) and x != "" for x in interp], dtype=bool)
+    interp_cod, interp_cat = pd.factorize(
+        pd.Series(np.where(con_desc, interp, ""), dtype="object"), sort=True
+    )
+    interp_cat = np.asarray(interp_cat, dtype="object")
+
+    e, c = _join_por_producto(prod_ev[evaluables], cond_prod[cond_ok])
+    e = evaluables[e]
+    activa = vigencia_promo.activas(cond_pid[c], fecha_ev[e])
+    for etapa, _, _, _ in ETAPAS:
+        cant = cantidades[etapa][e]
+        cumple = cumple_patron_vectorizado(cant, tipo[c], cant_inicial[c], cant_final[c])
+        with np.errstate(invalid="ignore"):
+            incompleta = activa & ~cumple & (cant > 0) & es_incompleta_simple_vectorizado(cant, cant_inicial[c])
+        completa = cumple & activa
+        pids = cond_pid[c]
+        pares[etapa]["todas"].append((e[cumple | incompleta], pids[cumple | incompleta]))
+        pares[etapa]["completas"].append((e[completa], pids[completa]))
+        pares[etapa]["incompletas"].append((e[incompleta], pids[incompleta]))
+        desc = completa & con_desc[c]
+        pares_desc[etapa].append((e[desc], interp_cod[c][desc]))
+
+    # Ensamblado de columnas
+    pares_promos = {}
+    columnas = {}
+    for etapa, _, sufijo, col_patron in ETAPAS:
+        for clase in ("completas", "incompletas", "todas"):
+            filas = np.concatenate([p[0] for p in pares[etapa][clase]] or [np.empty(0, "int64")])
+            pids = np.concatenate([p[1] for p in pares[etapa][clase]] or [np.empty(0, "int64")])
+            pares_promos[f"PROMOS_{sufijo}_{clase.upper()}"] = (filas, pids)
+
+        con_completas = np.zeros(n, dtype=bool)
+        con_completas[pares_promos[f"PROMOS_{sufijo}_COMPLETAS"][0]] = True
+        columnas[col_patron] = np.where(con_completas, "SI", "NO").astype("object")
+
+        filas = np.concatenate([p[0] for p in pares_desc[etapa]] or [np.empty(0, "int64")])
+        cods = np.concatenate([p[1] for p in pares_desc[etapa]] or [np.empty(0, "int64")])
+        columnas[f"DESC_{sufijo}_COMPLETAS"] = [
+            " | ".join(interp_cat[cs]) if cs else "" for cs in _listas_por_fila(filas, cods, n)
+        ]
+
+    df_escalares = pd.DataFrame(columnas, index=ev.index, dtype="object")
+
+    if como_csr:
+        # Posiciones relativas a df_eventos completo (filas sin sesión quedan vacías)
+        pos_df = np.flatnonzero(con_sesion.to_numpy())
+        promos = TablaPromos.desde_pares(
+            {c: (pos_df[filas], pids) for c, (filas, pids) in pares_promos.items()}, len(df_eventos)
+        )
+        return df_escalares.reindex(df_eventos.index), promos
+
+    promos = TablaPromos.desde_pares(pares_promos, n)
+    df_resultados = promos.materializar(df_escalares)[COLUMNAS_RESULTADO]
+    return df_resultados.reindex(df_eventos.index)
@@ -0,0 +1,276 @@
+"""
+Etapas del pipeline que no dependen de BigQuery (limpieza de ITEM, merges con catálogos,
+montos, columnas resumen y agregación por sesión).
+
+Las usan H1Script y H1ShortScript dentro de sus `_time_block`, y `benchmarks` las corre
+sobre datos sintéticos: este módulo no crea clientes ni lee credenciales al importarse.
+"""
+import re
+
+import numpy as np
+import pandas as pd
+
+from ColumnasPromos import TablaPromos
+from IndiceSesiones import IndiceSesiones
+from ReglasPromociones import COL_FECHA_EVENTO, interpretar_cantidad
+
+
+# Prefijos de ITEM en GA4 -> nombre en el catálogo de sorteos
+CAMBIOS_NOMBRE_ITEM = {
+    "LQ": "Sorteo Lo Quiero",
+    "Sorteo Efectivo": "Efectivo",
+}
+
+_RENOMBRAR_COMBINADAS = {
+    'CLAVE_PROMOCION': 'clave_promocion',
+    'CLAVE_EDICION_PRODUCTO': 'clave_edicion_producto',
+    'CANTIDAD_INICIAL': 'cantidad_inicial',
+}
+
+
+# ----------------------------
+# Limpieza de ITEM
+# ----------------------------
+def mover_numero_al_final(texto):
+    if isinstance(texto, str):
+        match = re.match(r"^(\d+)\s*°?\s*(.*)$", texto)
+        if match:
+            numero = match.group(1)
+            resto = match.group(2)
+            return f"{resto.strip()} {numero}"
+    return texto
+
+
+def reemplazar_prefijo(texto: str, diccionario: dict) -> str:
+    if not isinstance(texto, str):
+        return texto
+
+    for clave, valor in diccionario.items():
+        if re.match(rf"^{clave}\s*\d+", texto):
+            return re.sub(rf"^{clave}", valor, texto)
+
+        if clave in texto:
+            return texto.replace(clave, valor)
+
+    return texto
+
+
+def limpiar_item(nombre: str) -> str:
+    if not isinstance(nombre, str):
+        return nombre
+    # Quita duplicación de número final tipo "Sorteo XYZ 123 123"
+    return re.sub(r'(\b\d+)\s+\1$', r'\1', nombre)
+
+
+def limpiar_items(items: pd.Series) -> pd.Series:
+    """Número al final, prefijos de CAMBIOS_NOMBRE_ITEM y número duplicado, en ese orden."""
+    items = items.apply(mover_numero_al_final)
+    items = items.apply(lambda x: reemplazar_prefijo(x, CAMBIOS_NOMBRE_ITEM))
+    return items.apply(limpiar_item)
+
+
+# ----------------------------
+# Catálogos y condiciones
+# ----------------------------
+def preparar_sorteo(df_sorteo: pd.DataFrame) -> pd.DataFrame:
+    """Agrega `item_completo` (desc_sorteo + número) y tipa fecha_celebracion (en el mismo DataFrame)."""
+    df_sorteo['numero_sorteo_int'] = df_sorteo['numero_sorteo'].fillna(0).astype(int).astype(str)
+    df_sorteo['item_completo'] = df_sorteo['desc_sorteo'] + ' ' + df_sorteo['numero_sorteo_int']
+    df_sorteo['fecha_celebracion'] = pd.to_datetime(df_sorteo['fecha_celebracion'])
+    return df_sorteo
+
+
+def unir_condiciones(df_condiciones: pd.DataFrame, df_grupo_condicion: pd.DataFrame,
+                     df_fechas_promocion: pd.DataFrame) -> pd.DataFrame:
+    """Condiciones + clave_promocion (grupo de condiciones) + vigencia de la promoción."""
+    df_condiciones_base = df_condiciones.merge(
+        df_grupo_condicion[['clave_grupo_condiciones', 'clave_promocion']],
+        on='clave_grupo_condiciones',
+        how='left'
+    )
+    return df_condiciones_base.merge(
+        df_fechas_promocion[['clave_promocion', 'd_inicio_promocion', 'd_cierre_promocion']],
+        on='clave_promocion',
+        how='left'
+    )
+
+
+def enriquecer_condiciones(df_condiciones_base: pd.DataFrame, df_tipo_cantidad: pd.DataFrame) -> pd.DataFrame:
+    """Descripción del tipo de cantidad, `interpretacion` y fechas de vigencia tipadas."""
+    df_condiciones_enriquecido = df_condiciones_base.merge(
+        df_tipo_cantidad[['clave_tipo_cantidad_condicion', 'descripcion']],
+        on='clave_tipo_cantidad_condicion',
+        how='left'
+    )
+
+    df_condiciones_enriquecido['interpretacion'] = df_condiciones_enriquecido.apply(
+        interpretar_cantidad, axis=1
+    )
+
+    df_condiciones_enriquecido['d_inicio_promocion'] = pd.to_datetime(
+        df_condiciones_enriquecido['d_inicio_promocion']
+    )
+    df_condiciones_enriquecido['d_cierre_promocion'] = pd.to_datetime(
+        df_condiciones_enriquecido['d_cierre_promocion']
+    )
+    return df_condiciones_enriquecido
+
+
+def normalizar_promos_combinadas(df_promos_combinadas: pd.DataFrame) -> pd.DataFrame:
+    """Columnas en minúsculas, claves numéricas y un requisito por (promo, producto) (gana el último)."""
+    df_combinadas = df_promos_combinadas.rename(
+        columns={c: _RENOMBRAR_COMBINADAS.get(c, c) for c in df_promos_combinadas.columns}
+    )
+
+    for c in ['clave_promocion', 'clave_edicion_producto', 'cantidad_inicial']:
+        if c in df_combinadas.columns:
+            df_combinadas[c] = pd.to_numeric(df_combinadas[c], errors='coerce')
+
+    return df_combinadas.drop_duplicates(
+        subset=['clave_promocion', 'clave_edicion_producto'],
+        keep='last'
+    ).reset_index(drop=True)
+
+
+# ----------------------------
+# Intentos GA4
+# ----------------------------
+def preparar_eventos_base(df_ga4_events: pd.DataFrame, df_sorteo: pd.DataFrame) -> pd.DataFrame:
+    """
+    Limpieza de ITEM, merge con el catálogo de sorteos (clave, precio y fecha de
+    celebración), dias_para_sorteo y montos. `df_sorteo` ya trae `item_completo`.
+    """
+    # Inician cambios JQL - 16Ene26
+
+    # Limpiar nombres de item_name
+    item = limpiar_items(df_ga4_events["ITEM"])
+    item = item.mask(item == "Gana Ya", "Gana Ya 5")
+
+
+    # Merge con sorteo incluyendo la fecha de celebración (el merge ya genera un DataFrame nuevo)
+    df_ga4_events_base = df_ga4_events.assign(ITEM=item).merge(
+        df_sorteo[['item_completo', 'clave_edicion_producto', 'precio_unitario', 'fecha_celebracion']],
+        left_on='ITEM',
+        right_on='item_completo',
+        how='left'
+    )
+
+    # Calcular dias_para_sorteo
+    # La fecha del evento ya viene tipada en FECHA_EVENTO
+    event_dt = df_ga4_events_base[COL_FECHA_EVENTO]
+
+    # Calculamos la diferencia en días enteros
+    df_ga4_events_base['dias_para_sorteo'] = (df_ga4_events_base["fecha_celebracion"].dt.tz_localize(None).dt.normalize() - event_dt.dt.normalize()).dt.days
+
+
+    # Procesamiento de montos y tipos de datos
+    df_ga4_events_base['clave_edicion_producto'] = pd.to_numeric(
+        df_ga4_events_base['clave_edicion_producto'], errors='coerce'
+    ).astype('Int64')
+
+    # Cálculo de montos potenciales (Price * Qty added to cart)
+    df_ga4_events_base['MONTO_ADD_TO_CART'] = (
+        df_ga4_events_base['precio_unitario'] * df_ga4_events_base['CANTIDAD_ADD_TO_CART']
+    )
+
+    # Aseguramos que los montos nulos se manejen como 0 para evitar errores en sumatorias
+    df_ga4_events_base['MONTO_ADD_TO_CART'] = df_ga4_events_base['MONTO_ADD_TO_CART'].fillna(0)
+
+    # Fin de cambios JQL - 16Ene26
+
+
+    df_ga4_events_base['MONTO_BEGIN_CHECKOUT'] = (
+        df_ga4_events_base['precio_unitario'] * df_ga4_events_base['CANTIDAD_BEGIN_CHECKOUT']
+    )
+    df_ga4_events_base['MONTO_PURCHASE'] = (
+        df_ga4_events_base['precio_unitario'] * df_ga4_events_base['CANTIDAD_PURCHASE']
+    )
+
+    return df_ga4_events_base.drop('item_completo', axis=1)
+
+
+def agregar_columnas_resumen(df_ga4_events_final: pd.DataFrame, promos_resultado: TablaPromos) -> dict:
+    """Agrega TIENE_PATRON_COMPLETO / TIENE_PATRON_INCOMPLETO y regresa los conteos del resumen."""
+    tiene_completo = (
+        (df_ga4_events_final['PATRON_ADD_CART'] == 'SI')
+        | (df_ga4_events_final['PATRON_BEGIN_CHECKOUT'] == 'SI')
+        | (df_ga4_events_final['PATRON_PURCHASE'] == 'SI')
+    )
+    df_ga4_events_final['TIENE_PATRON_COMPLETO'] = np.where(tiene_completo, 'SI', 'NO')
+
+    tiene_incompleto = (
+        (promos_resultado['PROMOS_ADD_CART_INCOMPLETAS'].largos() > 0)
+        | (promos_resultado['PROMOS_CHECKOUT_INCOMPLETAS'].largos() > 0)
+        | (promos_resultado['PROMOS_PURCHASE_INCOMPLETAS'].largos() > 0)
+    )
+    df_ga4_events_final['TIENE_PATRON_INCOMPLETO'] = np.where(tiene_incompleto, 'SI', 'NO')
+
+    return {
+        "filas": len(df_ga4_events_final),
+        "completos": int(tiene_completo.sum()),
+        "incompletos": int(tiene_incompleto.sum()),
+        "add_cart": int((df_ga4_events_final['PATRON_ADD_CART'] == 'SI').sum()),
+        "begin_checkout": int((df_ga4_events_final['PATRON_BEGIN_CHECKOUT'] == 'SI').sum()),
+        "purchase": int((df_ga4_events_final['PATRON_PURCHASE'] == 'SI').sum()),
+    }
+
+
+# ----------------------------
+# Funnel completo (patrones_funnel_completo.sql)
+# ----------------------------
+def limpiar_funnel(df_patrones_funnel_completo: pd.DataFrame, df_sorteo: pd.DataFrame) -> pd.DataFrame:
+    """Copia del funnel con ITEM limpio, precio_unitario_inferido completado desde el catálogo y montos."""
+    df_filtrado_copy = df_patrones_funnel_completo.copy()
+    df_filtrado_copy["ITEM"] = limpiar_items(df_filtrado_copy["ITEM"])
+
+    item_completo = df_sorteo['desc_sorteo'] + ' ' + df_sorteo['numero_sorteo'].fillna(0).astype(int).astype(str)
+    precio_por_item = (
+        df_sorteo.assign(item_completo=item_completo)
+                .drop_duplicates('item_completo')
+                .set_index('item_completo')['precio_unitario']
+    )
+
+    mask_precio = df_filtrado_copy['precio_unitario_inferido'].isna()
+    df_filtrado_copy.loc[mask_precio, 'precio_unitario_inferido'] = (
+        df_filtrado_copy.loc[mask_precio, 'ITEM'].map(precio_por_item)
+    )
+
+    df_filtrado_copy['qty_add_to_cart'] = df_filtrado_copy['qty_add_to_cart'].astype(float)
+    df_filtrado_copy['qty_begin_checkout'] = df_filtrado_copy['qty_begin_checkout'].astype(float)
+    df_filtrado_copy['qty_purchase'] = df_filtrado_copy['qty_purchase'].astype(float)
+    df_filtrado_copy['precio_unitario_inferido'] = df_filtrado_copy['precio_unitario_inferido'].astype(float)
+
+    df_filtrado_copy['MONTO_ADD_TO_CART'] = (
+        df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_add_to_cart']
+    )
+    df_filtrado_copy['MONTO_BEGIN_CHECKOUT'] = (
+        df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_begin_checkout']
+    )
+    df_filtrado_copy['MONTO_PURCHASE'] = (
+        df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_purchase']
+    )
+    return df_filtrado_copy
+
+
+def agregar_sesiones(df_filtrado_copy: pd.DataFrame):
+    """
+    Nivel sesión para los KPIs: regresa (indice_sesiones, df_sesiones).
+    El índice (user_pseudo_id, session_id) se reutiliza después en los flags por sesión.
+    """
+    indice_sesiones = IndiceSesiones.desde_df(df_filtrado_copy, ["user_pseudo_id", "session_id"])
+    df_sesiones = indice_sesiones.sesiones.assign(
+        categoria_login=indice_sesiones.primero_valido(df_filtrado_copy["categoria_login"]),
+        MONTO_BEGIN_CHECKOUT=indice_sesiones.sumar(df_filtrado_copy["MONTO_BEGIN_CHECKOUT"]),
+        MONTO_PURCHASE=indice_sesiones.sumar(df_filtrado_copy["MONTO_PURCHASE"]),
+        PATRON_BEGIN_CHECKOUT=indice_sesiones.alguno(df_filtrado_copy["PATRON_BEGIN_CHECKOUT"] == "SI"),
+    )
+
+    # OJO: se usa el mismo texto que venga en los datos ("SIN LOGIN EN SESIÓN")
+    df_sesiones["tiene_login"] = df_sesiones["categoria_login"] != "SIN LOGIN EN SESIÓN"
+    df_sesiones["tiene_purchase"] = df_sesiones["MONTO_PURCHASE"] > 0
+    df_sesiones["tiene_patron_bc"] = df_sesiones["PATRON_BEGIN_CHECKOUT"]
+    df_sesiones["es_sin_registro_con_purchase"] = (
+        (df_sesiones["categoria_login"] == "SIN LOGIN EN SESIÓN")
+        & df_sesiones["tiene_purchase"]
+    )
+    return indice_sesiones, df_sesiones
@@ -0,0 +1,156 @@
+"""
+Extracción concurrente de queries de BigQuery con dependencias declaradas.
+
+Las queries de soporte (sorteo, condiciones, tipos de cantidad, grupos, vigencias, promos
+combinadas), los DDL base y la extracción GA4 no dependen entre sí salvo por el orden
+DDL -> SELECT (ga4_events lee la tabla que crea base_patrones.sql). `ejecutar_consultas`:
+
+- envía de inmediato todos los jobs sin dependencias pendientes (BigQuery los corre en
+  paralelo del lado del servidor; `client.query` no bloquea);
+- espera y descarga los resultados en un pool de hilos sobre el mismo cliente (y su pool
+  de conexiones HTTP), así que el tiempo total es el de la query más lenta, no la suma;
+- envía cada consulta dependiente en cuanto terminan todas sus dependencias;
+- con `cache` (CacheConsultas), los SELECT vigentes en la caché no se envían.
+
+Sirve con cualquier objeto con la interfaz de `bigquery.Client.query` (jobs con
+`result()`, `to_dataframe()` y `to_arrow()` en el resultado), p. ej. un cliente falso local.
+"""
+import logging
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from time import perf_counter
+from typing import Optional
+
+from CacheConsultas import CacheConsultas
+from LecturaArrow import leer_resultado
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+# El pool de conexiones de requests/urllib3 del cliente tiene 10 conexiones por host
+MAX_WORKERS_EXTRACCION = 8
+
+
+class Consulta:
+    """
+    Una query del plan de extracción.
+    - `ddl=True`: CREATE/DELETE/etc. (solo se espera el job; el resultado es None).
+    - `dtypes`: lectura tipada vía Arrow (LecturaArrow); sin dtypes, `to_dataframe()`.
+    - `depende_de`: nombres de consultas que deben terminar antes de enviar esta.
+    """
+
+    def __init__(self, nombre: str, sql: str, ddl: bool = False, dtypes: Optional[dict] = None,
+                 depende_de=()):
+        self.nombre = nombre
+        self.sql = sql
+        self.ddl = ddl
+        self.dtypes = dtypes
+        self.depende_de = tuple(depende_de)
+
+    @property
+    def parametros(self) -> dict:
+        """Parámetros de lectura que entran en la clave de la caché."""
+        return {"dtypes": self.dtypes} if self.dtypes is not None else {}
+
+    def __repr__(self):
+        return f"Consulta({self.nombre!r}, ddl={self.ddl}, depende_de={self.depende_de})"
+
+
+def validar_plan(consultas) -> None:
+    """Nombres únicos, dependencias existentes y sin ciclos; si no, ValueError."""
+    nombres = [c.nombre for c in consultas]
+    repetidos = sorted({n for n in nombres if nombres.count(n) > 1})
+    if repetidos:
+        raise ValueError(f"Consultas repetidas en el plan de extracción: {repetidos}")
+    por_nombre = {c.nombre: c for c in consultas}
+    for c in consultas:
+        faltantes = [d for d in c.depende_de if d not in por_nombre]
+        if faltantes:
+            raise ValueError(f"{c.nombre} depende de consultas fuera del plan: {faltantes}")
+
+    pendientes = dict(por_nombre)
+    resueltas = set()
+    while pendientes:
+        listas = [n for n, c in pendientes.items() if set(c.depende_de) <= resueltas]
+        if not listas:
+            raise ValueError(f"Dependencias circulares entre: {sorted(pendientes)}")
+        for n in listas:
+            resueltas.add(n)
+            del pendientes[n]
+
+
+def _descargar(consulta: Consulta, job, bqstorage_client, t_envio: float):
+    """Espera el job y descarga su resultado (corre en un hilo del pool)."""
+    if consulta.ddl:
+        job.result()
+        resultado = None
+    elif consulta.dtypes is not None:
+        resultado = leer_resultado(job, consulta.dtypes, bqstorage_client=bqstorage_client, nombre=consulta.nombre)
+    else:
+        resultado = job.result().to_dataframe(bqstorage_client=bqstorage_client)
+    return resultado, perf_counter() - t_envio
+
+
+def _desde_cache(client, consulta: Consulta, cache: CacheConsultas, bqstorage_client, t_envio: float):
+    """Lee la consulta de la caché o la ejecuta y la guarda (corre en un hilo del pool)."""
+    df, fuentes = cache.obtener(client, consulta.sql, consulta.parametros, consulta.nombre)
+    if df is not None:
+        return df, perf_counter() - t_envio
+    df, duracion = _descargar(consulta, client.query(consulta.sql), bqstorage_client, t_envio)
+    cache.guardar(consulta.sql, df, fuentes, consulta.parametros, consulta.nombre)
+    return df, duracion
+
+
+def ejecutar_consultas(client, consultas, max_workers: int = MAX_WORKERS_EXTRACCION,
+                       bqstorage_client=None, cache: Optional[CacheConsultas] = None) -> dict:
+    """
+    Corre el plan `consultas` (lista de Consulta) y regresa {nombre: DataFrame o None}.
+    Si una consulta falla, no se envían sus dependientes, se cancelan las descargas
+    que no hayan empezado y se relanza la excepción.
+    Con `cache`, cada SELECT revisa la caché en su hilo (metadatos de las fuentes) y solo
+    se envía a BigQuery si no hay una entrada vigente.
+    """
+    consultas = list(consultas)
+    validar_plan(consultas)
+    por_nombre = {c.nombre: c for c in consultas}
+    pendientes = dict(por_nombre)
+    resultados = {}
+    duraciones = {}
+    t0 = perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="extraccion") as pool:
+        en_curso = {}
+
+        def enviar_listas():
+            listas = [c for c in pendientes.values() if all(d in resultados for d in c.depende_de)]
+            for c in listas:
+                del pendientes[c.nombre]
+                logger.info("Enviando query %s%s", c.nombre,
+                            f" (tras {', '.join(c.depende_de)})" if c.depende_de else "")
+                t_envio = perf_counter()
+                if cache is not None and cache.activo and not c.ddl:
+                    futuro = pool.submit(_desde_cache, client, c, cache, bqstorage_client, t_envio)
+                else:
+                    futuro = pool.submit(_descargar, c, client.query(c.sql), bqstorage_client, t_envio)
+                en_curso[futuro] = c.nombre
+
+        enviar_listas()
+        while en_curso:
+            terminados, _ = wait(en_curso, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                nombre = en_curso.pop(futuro)
+                try:
+                    resultados[nombre], duraciones[nombre] = futuro.result()
+                except Exception:
+                    logger.exception("Falló la query %s; se cancela la extracción", nombre)
+                    for otro in en_curso:
+                        otro.cancel()
+                    raise
+                df = resultados[nombre]
+                logger.info("Query %s lista en %.2fs%s", nombre, duraciones[nombre],
+                            "" if df is None else f" ({len(df)} filas)")
+            enviar_listas()
+
+    total = perf_counter() - t0
+    logger.info("Extracción concurrente: %d queries en %.2fs (suma secuencial %.2fs, más lenta %.2fs)",
+                len(consultas), total, sum(duraciones.values()), max(duraciones.values(), default=0.0))
+    return resultados
@@ -1,14 +1,56 @@
+import argparse
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from time import perf_counter
-import re
+from typing import Optional
 
 import pandas as pd
 from google.cloud import bigquery
 from google.oauth2 import service_account
-from BQLoadClass import BQLoad
-import numpy as np  
+from BQLoadClass import BQLoad, LoadHandle
+from CacheConsultas import CacheConsultas
+from Checkpoints import Checkpoints
+from ColumnasPromos import (
+    COLUMNAS_PROMOS,
+    TablaPromos,
+    flags_por_sesion,
+    flags_simples_combinadas,
+)
+from DeteccionVectorizada import detectar_patrones_vectorizado, evaluar_promociones_combinadas_matricial
+from ExtraccionConcurrente import Consulta, ejecutar_consultas
+from EtapasPipeline import (
+    agregar_columnas_resumen,
+    agregar_sesiones,
+    enriquecer_condiciones,
+    limpiar_funnel,
+    normalizar_promos_combinadas,
+    preparar_eventos_base,
+    preparar_sorteo,
+    unir_condiciones,
+)
+from IndiceSesiones import IndiceSesiones
+from IndiceVigencia import IndiceVigencia
+from ReglasCompiladas import compilar_reglas
+from RequisitosCombinados import RequisitosCombinados
+from SalidaParquet import escribir_parquet, limpiar_salida
+from ReglasPromociones import (
+    COL_FECHA_EVENTO,
+    agregar_fecha_evento,
+    detectar_patrones_fila,
+)
+from DeteccionParalela import detectar_patrones_paralelo
+from IngestaStreaming import lotes_eventos
+from LecturaArrow import DTYPES_QUERY, cliente_storage, leer_query
+from ManifiestoDDL import ManifiestoDDL, MetadatosBigQuery
+from ParticionesIncrementales import (
+    cargar_watermark,
+    guardar_watermark,
+    huella_global,
+    huellas_promociones,
+    lista_dias_sql,
+    planear_incremental,
+)
 
 # ----------------------------
 # Parámetros generales
@@ -30,9 +72,74 @@ LOG_DIR = Path("/home/sam.salinas/PythonProjects/H1/logs")
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / "h1Logs.log"
 
+# Salidas locales: Parquet particionado por attempt_date (SalidaParquet); el CSV solo con --csv
+SALIDA_PARQUET_PROMOS = Path("/home/sam.salinas/PythonProjects/H1/Data/parquet/ga4_patrones_promociones")
+SALIDA_PARQUET_FUNNEL = Path("/home/sam.salinas/PythonProjects/H1/Data/parquet/ga4_patrones_funnel_completo")
+GUARDAR_CSV = False
 OUTPUT_CSV_PROMOS = "/home/sam.salinas/PythonProjects/H1/Data/CSV/ga4_patrones_promociones.csv"
 OUTPUT_CSV_FUNNEL = "/home/sam.salinas/PythonProjects/H1/Data/CSV/ga4_patrones_funnel_completo.csv"
 
+# Motor de detección de patrones:
+#   "fila"        -> detectar_patrones_producto fila por fila (referencia)
+#   "vectorizado" -> DeteccionVectorizada (join por producto + máscaras NumPy)
+#   "paralelo"    -> motor "fila" repartido por sesión en WORKERS_DETECCION procesos
+MOTOR_DETECCION = "fila"
+WORKERS_DETECCION = None  # None = núcleos disponibles
+# Reglas simples compiladas (motores "fila" y "paralelo"); se recompilan si cambia el catálogo
+REGLAS_COMPILADAS_PATH = Path("/home/sam.salinas/PythonProjects/H1/Data/estado/reglas_compiladas.pkl")
+# Entradas del memo LRU de clasificación por fila (motores "fila" y "paralelo"; 0 = sin memo)
+TAMANO_MEMO_DETECCION = 200_000
+
+# Hilos para esperar/descargar las queries de extracción en paralelo (un solo cliente compartido)
+WORKERS_EXTRACCION = 8
+
+# Ingesta de intentos GA4:
+#   "completa"  -> todo el rango de fechas en un solo DataFrame
+#   "streaming" -> record batches Arrow ordenados por USER, SESION; enriquecimiento,
+#                  detección y escritura lote por lote (memoria acotada por FILAS_POR_LOTE)
+MODO_INGESTA = "completa"
+FILAS_POR_LOTE = 500_000
+ARCHIVO_ARROW_EVENTOS = None  # Archivo Arrow IPC local (ordenado por USER, SESION) en lugar de BigQuery
+
+# Tabla destino de patrones_promociones
+TABLE_PATRONES = "sorteostec-ml.h1.ga4_patrones_promociones_20241001_20251231"
+
+# Cargas a BigQuery (BQLoad): tablas particionadas por día y clusterizadas, cargadas en bloques
+# de particiones completas con WORKERS_CARGA load jobs en paralelo
+PARTICION_PATRONES = "FECHA_EVENTO"
+CLUSTER_PATRONES = ["ITEM", "STATUS"]
+PARTICION_FUNNEL = "attempt_date"
+CLUSTER_FUNNEL = ["ITEM", "STATUS", "login_bucket_bc"]
+WORKERS_CARGA = 4
+# Reintentos por load job ante errores transitorios y tiempo máximo por job (None = sin límite).
+# Las cargas corren en segundo plano y se esperan solo donde algo depende de la tabla cargada.
+REINTENTOS_CARGA = 2
+TIMEOUT_CARGA = 3600
+
+# Periodo a procesar:
+#   "completo"    -> DATE_START..DATE_END desde cero (se reemplaza TABLE_PATRONES completa)
+#   "incremental" -> solo particiones attempt_date nuevas o cambiadas (o afectadas por cambios
+#                    de catálogo); se reemplazan únicamente esas particiones de TABLE_PATRONES
+MODO_PERIODO = "completo"
+WATERMARK_PATH = Path("/home/sam.salinas/PythonProjects/H1/Data/estado/watermark_patrones_promociones.json")
+
+# Los DDL base (base_patrones, complemento_funnel) solo se ejecutan si cambió su SQL, sus tablas
+# fuente (tablas diarias events_* del rango y su última modificación) o no existe su tabla;
+# --force los ejecuta siempre
+MANIFIESTO_DDL_PATH = Path("/home/sam.salinas/PythonProjects/H1/Data/estado/manifiesto_ddl.json")
+
+# Checkpoints por etapa (Parquet / Arrow IPC) para reanudar con --resume tras una falla.
+# La ingesta "streaming" no se guarda en checkpoints (escribe a BigQuery lote por lote).
+CHECKPOINT_DIR = Path("/home/sam.salinas/PythonProjects/H1/Data/checkpoints")
+GUARDAR_CHECKPOINTS = False
+
+# Caché local de resultados de queries (Parquet). Una entrada vale mientras no cambie la
+# última modificación de sus tablas fuente; si alguna no se puede consultar (comodines
+# events_*), vale CACHE_TTL_HORAS. --no-cache la desactiva y --refresh la reescribe.
+CACHE_DIR = Path("/home/sam.salinas/PythonProjects/H1/Data/cache")
+CACHE_TTL_HORAS = 24.0
+CACHE_MAX_BYTES = 5 * 1024 ** 3
+
 # ----------------------------
 # Configuración de logging
 # ----------------------------
@@ -87,6 +194,8 @@ def _time_block(label: str):
 # ----------------------------
 credentialsML = service_account.Credentials.from_service_account_file(CREDENTIALS_PATH_ML)
 clientML = bigquery.Client(credentials=credentialsML, project=PROJECT_ID)
+# Storage Read API para las lecturas tipadas (None si la librería no está instalada)
+bqstorage_clientML = cliente_storage(credentialsML)
 
 
 # ----------------------------
@@ -109,394 +218,324 @@ def execute_ddl(query: str) -> None:
     job.result()
 
 
-def execute_query_to_df(query: str):
-    """Ejecuta un SELECT en BigQuery y devuelve un DataFrame."""
-    job = clientML.query(query)
-    return job.to_dataframe()
-
-
-# ----------------------------
-# Lógica de negocio (funciones)
-# ----------------------------
-def interpretar_cantidad(row):
-    """Interpreta la condición de cantidad en lenguaje natural"""
-    tipo = row['clave_tipo_cantidad_condicion']
-    cant_inicial = row['cantidad_inicial']
-    cant_final = row['cantidad_final']
-
-    interpretaciones = {
-        1: f"Exactamente {cant_inicial} unidades",
-        2: f"Mínimo {cant_inicial} unidades",
-        3: f"Máximo {cant_inicial} unidades",
-        4: f"Entre {cant_inicial} y {cant_final} unidades",
-        5: f"Acumula {cant_inicial} unidades",
-        6: f"Por cada {cant_inicial} unidades",
-        7: f"Múltiplo de {cant_inicial}"
-    }
-
-    return interpretaciones.get(tipo, f"Tipo {tipo}: {cant_inicial}")
-
-
-def cumple_patron(cantidad, tipo_condicion, cant_inicial, cant_final=None):
-    """Verifica si una cantidad cumple con un tipo de condición"""
-    if pd.isna(cantidad) or cantidad == 0:
-        return False
-
-    if tipo_condicion == 1:  # Exactamente
-        return cantidad == cant_inicial
-    elif tipo_condicion == 2:  # Mínimo
-        return cantidad >= cant_inicial
-    elif tipo_condicion == 3:  # Máximo
-        return cantidad <= cant_inicial
-    elif tipo_condicion == 4:  # Entre
-        return cant_inicial <= cantidad <= (cant_final if cant_final else cant_inicial)
-    elif tipo_condicion == 5:  # Acumula
-        return cantidad >= cant_inicial
-    elif tipo_condicion == 6:  # Por cada
-        return cantidad >= cant_inicial and cantidad % cant_inicial == 0
-    elif tipo_condicion == 7:  # Múltiplo
-        return cantidad % cant_inicial == 0 if cant_inicial > 0 else False
-    else:
-        return False
-
-
-def evaluar_promociones_sesion(df_sesion, requisitos_multi, vigencia_promo):
+def execute_query_to_df(query: str, dtypes: dict = None, nombre: str = "query", cache: CacheConsultas = None):
     """
-    Evalúa promociones multi-producto (combinadas) para TODA la sesión.
-    Regresa IDs de promos que están COMPLETAS por etapa.
-    - Requisito V1: para cada promo combinada, TODOS sus productos deben sumar
-      cantidad >= cantidad_requerida dentro de la sesión, por etapa.
-    - Vigencia: si la promo no está activa a la fecha del evento (sesión), se ignora.
+    Ejecuta un SELECT en BigQuery y devuelve un DataFrame.
+    Con `dtypes` (ver LecturaArrow.DTYPES_QUERY) la lectura va por Arrow con dtypes compactos.
+    Con `cache`, se regresa el resultado guardado si sigue vigente (ver CacheConsultas).
     """
-    promociones_completas = {'add_cart': [], 'checkout': [], 'purchase': []}
-
-    def _parse_dt_mx(x):
-        for fmt in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S.%f"):
-            try:
-                return pd.to_datetime(x, format=fmt)
-            except Exception:
-                continue
-        return pd.NaT
-
-    try:
-        fecha_evento = _parse_dt_mx(df_sesion['DATETIME'].iloc[0])
-        if pd.isna(fecha_evento):
-            return promociones_completas
-    except Exception:
-        return promociones_completas
+    def ejecutar():
+        if dtypes is not None:
+            return leer_query(clientML, query, dtypes, bqstorage_client=bqstorage_clientML, nombre=nombre)
+        job = clientML.query(query)
+        return job.to_dataframe()
 
-    # Por cada promo combinada definida en requisitos_multi
-    for pid, reqs in requisitos_multi.items():
-        inicio, cierre = vigencia_promo.get(pid, (pd.NaT, pd.NaT))
-        if pd.isna(inicio) or pd.isna(cierre) or not (inicio <= fecha_evento <= cierre):
-            continue
+    if cache is None:
+        return ejecutar()
+    parametros = {"dtypes": dtypes} if dtypes is not None else {}
+    return cache.leer_o_ejecutar(clientML, query, ejecutar, parametros=parametros, nombre=nombre)
 
-        ok_add = True
-        ok_chk = True
-        ok_pur = True
 
-        for req in reqs:
-            prod = req['clave_edicion_producto']
-            need = req['cantidad_requerida']
-
-            subset = df_sesion[df_sesion['clave_edicion_producto'] == prod]
-            s_add = subset['CANTIDAD_ADD_TO_CART'].sum() if 'CANTIDAD_ADD_TO_CART' in subset.columns else 0
-            s_chk = subset['CANTIDAD_BEGIN_CHECKOUT'].sum() if 'CANTIDAD_BEGIN_CHECKOUT' in subset.columns else 0
-            s_pur = subset['CANTIDAD_PURCHASE'].sum() if 'CANTIDAD_PURCHASE' in subset.columns else 0
-
-            ok_add = ok_add and (s_add >= need)
-            ok_chk = ok_chk and (s_chk >= need)
-            ok_pur = ok_pur and (s_pur >= need)
-
-            if not (ok_add or ok_chk or ok_pur):
-                break
-
-        if ok_add:
-            promociones_completas['add_cart'].append(int(pid))
-        if ok_chk:
-            promociones_completas['checkout'].append(int(pid))
-        if ok_pur:
-            promociones_completas['purchase'].append(int(pid))
-
-    return promociones_completas
-
-
-def es_incompleta_simple(cantidad, cant_inicial):
-    """
-    Heurístico de 'promo simple incompleta':
-    - La promo está activa (se valida afuera).
-    - NO cumple el patrón.
-    - La cantidad es exactamente N - 1 (near miss).
-    """
-    if pd.isna(cantidad) or pd.isna(cant_inicial):
-        return False
-    try:
-        return int(cantidad) == int(cant_inicial) - 1
-    except Exception:
-        return False
-
-
-def detectar_patrones_producto(row, condiciones_df, promociones_completas_sesion,
-                               promos_multi, requisitos_multi, vigencia_promo):
-    """
-    Detecta qué promociones cumple un producto individual (fila).
-    - Promos simples:
-        * COMPLETAS: igual que antes, vía condiciones_df + cumple_patron.
-        * INCOMPLETAS: nuevo criterio de 'near miss' -> cantidad == N - 1.
-    - Promos combinadas (V1): operador mínimo (≥) por producto requerido;
-      si la sesión cerró el combo -> COMPLETA; si no -> INCOMPLETA.
-    """
-    clave_producto = row.get('clave_edicion_producto', None)
-
-    resultado_vacio = {
-        'PATRON_ADD_CART': 'NO',
-        'PROMOS_ADD_CART_COMPLETAS': [],
-        'PROMOS_ADD_CART_INCOMPLETAS': [],
-        'PROMOS_ADD_CART_TODAS': [],
-        'DESC_ADD_CART_COMPLETAS': '',
-        'PATRON_BEGIN_CHECKOUT': 'NO',
-        'PROMOS_CHECKOUT_COMPLETAS': [],
-        'PROMOS_CHECKOUT_INCOMPLETAS': [],
-        'PROMOS_CHECKOUT_TODAS': [],
-        'DESC_CHECKOUT_COMPLETAS': '',
-        'PATRON_PURCHASE': 'NO',
-        'PROMOS_PURCHASE_COMPLETAS': [],
-        'PROMOS_PURCHASE_INCOMPLETAS': [],
-        'PROMOS_PURCHASE_TODAS': [],
-        'DESC_PURCHASE_COMPLETAS': ''
-    }
-    if pd.isna(clave_producto):
-        return resultado_vacio
-
-    try:
-        fecha_evento = pd.to_datetime(row['DATETIME'], format='%d/%m/%Y %H:%M:%S')
-    except Exception:
-        return resultado_vacio
-
-    resultados = {
-        'add_cart': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()},
-        'checkout': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()},
-        'purchase': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()}
-    }
-
-    # 6.A) PROMOS COMBINADAS
-    for pid, reqs in requisitos_multi.items():
-        if pid not in promos_multi:
-            continue
-
-        req_actual = next((r for r in reqs if r['clave_edicion_producto'] == clave_producto), None)
-        if not req_actual:
-            continue
-
-        inicio, cierre = vigencia_promo.get(pid, (pd.NaT, pd.NaT))
-        if pd.isna(inicio) or pd.isna(cierre) or not (inicio <= fecha_evento <= cierre):
-            continue
-
-        need = req_actual['cantidad_requerida']
-        c_add = row.get('CANTIDAD_ADD_TO_CART', 0) or 0
-        c_chk = row.get('CANTIDAD_BEGIN_CHECKOUT', 0) or 0
-        c_pur = row.get('CANTIDAD_PURCHASE', 0) or 0
-
-        if c_add >= need:
-            resultados['add_cart']['todas'].add(int(pid))
-            if int(pid) in promociones_completas_sesion['add_cart']:
-                resultados['add_cart']['completas'].add(int(pid))
-            else:
-                resultados['add_cart']['incompletas'].add(int(pid))
-
-        if c_chk >= need:
-            resultados['checkout']['todas'].add(int(pid))
-            if int(pid) in promociones_completas_sesion['checkout']:
-                resultados['checkout']['completas'].add(int(pid))
-            else:
-                resultados['checkout']['incompletas'].add(int(pid))
-
-        if c_pur >= need:
-            resultados['purchase']['todas'].add(int(pid))
-            if int(pid) in promociones_completas_sesion['purchase']:
-                resultados['purchase']['completas'].add(int(pid))
-            else:
-                resultados['purchase']['incompletas'].add(int(pid))
-
-    # 6.B) PROMOS SIMPLES
-    condiciones_producto = condiciones_df[condiciones_df['clave_edicion_producto'] == clave_producto]
-    for _, condicion in condiciones_producto.iterrows():
-        pid = condicion.get('clave_promocion', None)
-        if pd.isna(pid):
-            continue
-        pid = int(pid)
-
-        if pid in promos_multi:
-            continue
-
-        tipo = condicion['clave_tipo_cantidad_condicion']
-        cant_inicial = condicion['cantidad_inicial']
-        cant_final = condicion['cantidad_final']
-        interpretacion = condicion.get('interpretacion', '')
-        fecha_inicio = condicion.get('d_inicio_promocion', pd.NaT)
-        fecha_cierre = condicion.get('d_cierre_promocion', pd.NaT)
-
-        promo_activa = False
-        if pd.notna(fecha_inicio) and pd.notna(fecha_cierre) and (fecha_inicio <= fecha_evento <= fecha_cierre):
-            promo_activa = True
-
-        cant_add = row.get('CANTIDAD_ADD_TO_CART', 0) or 0
-        cant_chk = row.get('CANTIDAD_BEGIN_CHECKOUT', 0) or 0
-        cant_pur = row.get('CANTIDAD_PURCHASE', 0) or 0
-
-        # ADD_TO_CART
-        cumple_add = cumple_patron(cant_add, tipo, cant_inicial, cant_final)
-        if cumple_add:
-            resultados['add_cart']['todas'].add(pid)
-            if promo_activa:
-                resultados['add_cart']['completas'].add(pid)
-                if isinstance(interpretacion, str) and interpretacion:
-                    resultados['add_cart']['desc_completas'].add(interpretacion)
-        else:
-            if promo_activa and cant_add > 0 and es_incompleta_simple(cant_add, cant_inicial):
-                resultados['add_cart']['todas'].add(pid)
-                resultados['add_cart']['incompletas'].add(pid)
-
-        # BEGIN_CHECKOUT
-        cumple_chk = cumple_patron(cant_chk, tipo, cant_inicial, cant_final)
-        if cumple_chk:
-            resultados['checkout']['todas'].add(pid)
-            if promo_activa:
-                resultados['checkout']['completas'].add(pid)
-                if isinstance(interpretacion, str) and interpretacion:
-                    resultados['checkout']['desc_completas'].add(interpretacion)
-        else:
-            if promo_activa and cant_chk > 0 and es_incompleta_simple(cant_chk, cant_inicial):
-                resultados['checkout']['todas'].add(pid)
-                resultados['checkout']['incompletas'].add(pid)
-
-        # PURCHASE
-        cumple_pur = cumple_patron(cant_pur, tipo, cant_inicial, cant_final)
-        if cumple_pur:
-            resultados['purchase']['todas'].add(pid)
-            if promo_activa:
-                resultados['purchase']['completas'].add(pid)
-                if isinstance(interpretacion, str) and interpretacion:
-                    resultados['purchase']['desc_completas'].add(interpretacion)
-        else:
-            if promo_activa and cant_pur > 0 and es_incompleta_simple(cant_pur, cant_inicial):
-                resultados['purchase']['todas'].add(pid)
-                resultados['purchase']['incompletas'].add(pid)
-
-    return {
-        'PATRON_ADD_CART': 'SI' if resultados['add_cart']['completas'] else 'NO',
-        'PROMOS_ADD_CART_COMPLETAS': sorted(list(resultados['add_cart']['completas'])),
-        'PROMOS_ADD_CART_INCOMPLETAS': sorted(list(resultados['add_cart']['incompletas'])),
-        'PROMOS_ADD_CART_TODAS': sorted(list(resultados['add_cart']['todas'])),
-        'DESC_ADD_CART_COMPLETAS': ' | '.join(sorted(resultados['add_cart']['desc_completas'])),
-
-        'PATRON_BEGIN_CHECKOUT': 'SI' if resultados['checkout']['completas'] else 'NO',
-        'PROMOS_CHECKOUT_COMPLETAS': sorted(list(resultados['checkout']['completas'])),
-        'PROMOS_CHECKOUT_INCOMPLETAS': sorted(list(resultados['checkout']['incompletas'])),
-        'PROMOS_CHECKOUT_TODAS': sorted(list(resultados['checkout']['todas'])),
-        'DESC_CHECKOUT_COMPLETAS': ' | '.join(sorted(resultados['checkout']['desc_completas'])),
-
-        'PATRON_PURCHASE': 'SI' if resultados['purchase']['completas'] else 'NO',
-        'PROMOS_PURCHASE_COMPLETAS': sorted(list(resultados['purchase']['completas'])),
-        'PROMOS_PURCHASE_INCOMPLETAS': sorted(list(resultados['purchase']['incompletas'])),
-        'PROMOS_PURCHASE_TODAS': sorted(list(resultados['purchase']['todas'])),
-        'DESC_PURCHASE_COMPLETAS': ' | '.join(sorted(resultados['purchase']['desc_completas']))
-    }
-
-
-def _extraer_promos(df_ga4_events_final, col):
-    acc = []
-    for x in df_ga4_events_final[col]:
-        if isinstance(x, list):
-            acc.extend(x)
-    return set(acc)
-
-
-def mover_numero_al_final(texto):
-    if isinstance(texto, str):
-        match = re.match(r"^(\d+)\s*°?\s*(.*)$", texto)
-        if match:
-            numero = match.group(1)
-            resto = match.group(2)
-            return f"{resto.strip()} {numero}"
-    return texto
-
-
-def reemplazar_prefijo(texto: str, diccionario: dict) -> str:
-    if not isinstance(texto, str):
-        return texto
-
-    for clave, valor in diccionario.items():
-        if re.match(rf"^{clave}\s*\d+", texto):
-            return re.sub(rf"^{clave}", valor, texto)
-
-        if clave in texto:
-            return texto.replace(clave, valor)
+# ----------------------------
+# Lógica de negocio (funciones)
+# ----------------------------
+def _extraer_promos(promos_resultado: TablaPromos, col):
+    """IDs de promo distintos en una columna PROMOS_* (lectura directa del CSR)."""
+    return promos_resultado[col].unicos()
 
-    return texto
 
+# ----------------------------
+# Esquema tabla patrones_promociones
+# ----------------------------
+# Cambios JQL 16Ene26. Definir esquema
+SCHEMA_PATRONES = [
+    bigquery.SchemaField("USER", "STRING"),
+    bigquery.SchemaField("SESION", "INTEGER"),
+    bigquery.SchemaField("DATETIME", "STRING"),
+    bigquery.SchemaField("FECHA_EVENTO", "DATETIME"),
+    bigquery.SchemaField("ITEM", "STRING"),
+    bigquery.SchemaField("INTENTO", "INTEGER"),
+    
+    # New Contextual Columns
+    bigquery.SchemaField("device_category", "STRING"),
+    bigquery.SchemaField("geo_country", "STRING"),
+    bigquery.SchemaField("geo_region", "STRING"),
+    bigquery.SchemaField("geo_city", "STRING"),
+    bigquery.SchemaField("traffic_source", "STRING"),
+    bigquery.SchemaField("traffic_medium", "STRING"),
+
+    # Quantities and IDs
+    bigquery.SchemaField("STATUS", "STRING"),
+    bigquery.SchemaField("CANTIDAD_ADD_TO_CART", "INTEGER"),
+    bigquery.SchemaField("CANTIDAD_BEGIN_CHECKOUT", "INTEGER"),
+    bigquery.SchemaField("CANTIDAD_PURCHASE", "INTEGER"),
+    bigquery.SchemaField("TRANSACTION_ID", "STRING"),
+    bigquery.SchemaField("item_id", "INTEGER"),
+    bigquery.SchemaField("clave_edicion_producto", "INTEGER"),
+
+    # Financials and Dates
+    bigquery.SchemaField("precio_unitario", "FLOAT"),
+    bigquery.SchemaField("fecha_celebracion", "TIMESTAMP"),
+    bigquery.SchemaField("dias_para_sorteo", "FLOAT"),
+    bigquery.SchemaField("MONTO_ADD_TO_CART", "FLOAT"),
+    bigquery.SchemaField("MONTO_BEGIN_CHECKOUT", "FLOAT"),
+    bigquery.SchemaField("MONTO_PURCHASE", "FLOAT"),
+
+    # Patterns - ADD TO CART
+    bigquery.SchemaField("PATRON_ADD_CART", "STRING"),
+    bigquery.SchemaField("PROMOS_ADD_CART_COMPLETAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("PROMOS_ADD_CART_INCOMPLETAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("PROMOS_ADD_CART_TODAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("DESC_ADD_CART_COMPLETAS", "STRING"),
+
+    # Patterns - BEGIN CHECKOUT
+    bigquery.SchemaField("PATRON_BEGIN_CHECKOUT", "STRING"),
+    bigquery.SchemaField("PROMOS_CHECKOUT_COMPLETAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("PROMOS_CHECKOUT_INCOMPLETAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("PROMOS_CHECKOUT_TODAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("DESC_CHECKOUT_COMPLETAS", "STRING"),
+
+    # Patterns - PURCHASE
+    bigquery.SchemaField("PATRON_PURCHASE", "STRING"),
+    bigquery.SchemaField("PROMOS_PURCHASE_COMPLETAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("PROMOS_PURCHASE_INCOMPLETAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("PROMOS_PURCHASE_TODAS", "INTEGER", mode="REPEATED"),
+    bigquery.SchemaField("DESC_PURCHASE_COMPLETAS", "STRING"),
+
+    # Summaries
+    bigquery.SchemaField("TIENE_PATRON_COMPLETO", "STRING"),
+    bigquery.SchemaField("TIENE_PATRON_INCOMPLETO", "STRING")
+]
 
-def limpiar_item(nombre: str) -> str:
-    if not isinstance(nombre, str):
-        return nombre
-    return re.sub(r'(\b\d+)\s+\1$', r'\1', nombre)
 
 # ----------------------------
-# Helpers promos simples / combinadas (ADD_TO_CART)
+# Etapas sobre intentos GA4 (DataFrame completo o lote de sesiones completas)
 # ----------------------------
-def _todas_incompletas_fila(row):
+def detectar_patrones(df_ga4_events_base, df_condiciones_enriquecido, promos_multi, requisitos_multi, vigencia_promo,
+                      reglas_simples=None, indice_sesiones=None):
     """
-    Devuelve todas las promos incompletas ADD_TO_CART de una fila,
-    aceptando listas o ndarrays.
+    Corre el motor MOTOR_DETECCION sobre intentos con sesiones completas.
+    Regresa (df_ga4_events_final, promos_resultado): columnas escalares concatenadas
+    al DataFrame base y columnas PROMOS_* en CSR (TablaPromos).
+    Los motores "fila" y "paralelo" usan `reglas_simples` (ReglasCompiladas) si se dan;
+    el motor "fila" reutiliza `indice_sesiones` (IndiceSesiones de USER, SESION) si se da.
     """
-    val = row.get("PROMOS_ADD_CART_INCOMPLETAS", [])
-
-    if isinstance(val, (list, np.ndarray)):
-        return list(val)
-
-    return []
-
-
-def has_simple_incomplete(row, promos_multi):
-    incompletas = _todas_incompletas_fila(row)
-    return any((p not in promos_multi) for p in incompletas)
+    condiciones_fila = reglas_simples if reglas_simples is not None else df_condiciones_enriquecido
+    if MOTOR_DETECCION == "vectorizado":
+        completitud_sesiones = evaluar_promociones_combinadas_matricial(
+            df_eventos=df_ga4_events_base,
+            requisitos_multi=requisitos_multi,
+            vigencia_promo=vigencia_promo
+        )
+        logger.info("Promos combinadas completas (sesión × promo): add_cart=%d, checkout=%d, purchase=%d",
+                    len(completitud_sesiones.claves['add_cart']),
+                    len(completitud_sesiones.claves['checkout']),
+                    len(completitud_sesiones.claves['purchase']))
+
+        df_resultados, promos_resultado = detectar_patrones_vectorizado(
+            df_eventos=df_ga4_events_base,
+            condiciones_df=df_condiciones_enriquecido,
+            promos_multi=promos_multi,
+            requisitos_multi=requisitos_multi,
+            vigencia_promo=vigencia_promo,
+            completitud_sesiones=completitud_sesiones,
+            como_csr=True,
+        )
+    elif MOTOR_DETECCION == "paralelo":
+        df_resultados = detectar_patrones_paralelo(
+            df_eventos=df_ga4_events_base,
+            condiciones_df=condiciones_fila,
+            promos_multi=promos_multi,
+            requisitos_multi=requisitos_multi,
+            vigencia_promo=vigencia_promo,
+            n_workers=WORKERS_DETECCION,
+            tamano_memo=TAMANO_MEMO_DETECCION,
+        )
+    else:
+        df_resultados = detectar_patrones_fila(
+            df_eventos=df_ga4_events_base,
+            condiciones_df=condiciones_fila,
+            promos_multi=promos_multi,
+            requisitos_multi=requisitos_multi,
+            vigencia_promo=vigencia_promo,
+            tamano_memo=TAMANO_MEMO_DETECCION,
+            indice_sesiones=indice_sesiones,
+        )
+
+    if MOTOR_DETECCION != "vectorizado":
+        # Las columnas PROMOS_* viajan en CSR (TablaPromos), no como listas en el DataFrame
+        df_resultados = df_resultados.reindex(df_ga4_events_base.index)
+        promos_resultado = TablaPromos.desde_df(df_resultados)
+        df_resultados = df_resultados.drop(columns=COLUMNAS_PROMOS)
+
+    df_ga4_events_final = pd.concat([df_ga4_events_base, df_resultados], axis=1)
+    return df_ga4_events_final, promos_resultado
+
+
+def _log_resumen(conteos: dict) -> None:
+    logger.info("=== RESUMEN GENERAL ===")
+    logger.info("Total de filas analizadas: %d", conteos["filas"])
+    logger.info("Filas con patrón COMPLETO: %d", conteos["completos"])
+    logger.info("Filas con patrón INCOMPLETO: %d", conteos["incompletos"])
+
+    logger.info("=== PATRONES COMPLETOS POR ETAPA ===")
+    logger.info("ADD_TO_CART completo: %d", conteos["add_cart"])
+    logger.info("BEGIN_CHECKOUT completo: %d", conteos["begin_checkout"])
+    logger.info("PURCHASE completo: %d", conteos["purchase"])
+
+
+def guardar_csv_patrones(df_ga4_events_final: pd.DataFrame, primero: bool = True) -> None:
+    """Escribe (primero=True) o agrega (lotes siguientes) al CSV de patrones_promociones."""
+    df_ga4_events_final.to_csv(
+        OUTPUT_CSV_PROMOS, index=False, mode="w" if primero else "a", header=primero
+    )
 
 
-def has_combined_incomplete(row, promos_multi):
-    incompletas = _todas_incompletas_fila(row)
-    return any((p in promos_multi) for p in incompletas)
+def preparar_salida_parquet(plan=None) -> None:
+    """Como preparar_destino_patrones, para SALIDA_PARQUET_PROMOS: toda la salida o solo los días del plan."""
+    limpiar_salida(SALIDA_PARQUET_PROMOS, None if plan is None or plan.completo else plan.dias_reemplazar)
 
 
-def _todas_completas_fila(row):
+def preparar_destino_patrones(loader: BQLoad, plan=None) -> None:
     """
-    Devuelve todas las promos COMPLETAS ADD_TO_CART de una fila,
-    aceptando listas o ndarrays.
+    Limpia TABLE_PATRONES antes de cargar: corrida completa -> elimina la tabla;
+    incremental -> elimina solo las particiones DATE(FECHA_EVENTO) que se reemplazan.
     """
-    val = row.get("PROMOS_ADD_CART_COMPLETAS", [])
-
-    if isinstance(val, (list, np.ndarray)):
-        return list(val)
-
-    return []
-
-
-def has_simple_complete(row, promos_multi):
-    completas = _todas_completas_fila(row)
-    return any((p not in promos_multi) for p in completas)
-
-
-def has_combined_complete(row, promos_multi):
-    completas = _todas_completas_fila(row)
-    return any((p in promos_multi) for p in completas)
-
+    if plan is None or plan.completo:
+        logger.info("Eliminando tabla destino (si existe): %s", TABLE_PATRONES)
+        loader.delete_tables(TABLE_PATRONES)
+        return
+
+    logger.info("Eliminando %d particiones de %s", len(plan.dias_reemplazar), TABLE_PATRONES)
+    execute_ddl(load_sql(
+        "./Data/queries/eliminar_particiones_patrones.sql",
+        TABLE_PATRONES=TABLE_PATRONES,
+        DIAS=lista_dias_sql(plan.dias_reemplazar),
+    ))
+
+
+def cargar_patrones_bq(loader: BQLoad, df_ga4_events_final: pd.DataFrame, dias_reemplazar=None,
+                       write_disposition: str = "WRITE_APPEND",
+                       en_segundo_plano: bool = False) -> Optional[LoadHandle]:
+    """
+    Agrega a TABLE_PATRONES (el destino ya se limpió con preparar_destino_patrones).
+    Con `dias_reemplazar` (tabla ya particionada por PARTICION_PATRONES) no hace falta limpiar:
+    cada día se reemplaza con un load job sobre su partición, y la partición de nulos se vacía.
+    Con WRITE_TRUNCATE (corrida completa) BQLoad reemplaza la tabla de una sola vez.
+    Con `en_segundo_plano` regresa el LoadHandle sin esperar la carga.
+    Las filas sin FECHA_EVENTO no se cargan: no caen en ningún día del plan incremental, así que
+    ninguna corrida las reemplazaría (procesamiento_patrones.sql tampoco las lee).
+    """
+    sin_fecha = df_ga4_events_final[COL_FECHA_EVENTO].isna()
+    if sin_fecha.any():
+        logger.warning("Filas sin FECHA_EVENTO que no se cargan a %s: %d", TABLE_PATRONES, int(sin_fecha.sum()))
+        df_ga4_events_final = df_ga4_events_final[~sin_fecha]
+
+    # 1. Extract column names from the schema list in order
+    column_order = [field.name for field in SCHEMA_PATRONES]
+
+    # 2. Reorder the DataFrame (this ensures the CSV/Parquet buffer matches the BQ schema)
+    carga = loader.load_table_async if en_segundo_plano else loader.load_table
+    return carga(
+        df=df_ga4_events_final[column_order],
+        destination=TABLE_PATRONES,
+        schema=SCHEMA_PATRONES,
+        write_disposition=write_disposition,
+        partition_field=PARTICION_PATRONES,
+        clustering_fields=CLUSTER_PATRONES,
+        partitions=None if dias_reemplazar is None else list(dias_reemplazar) + [None],
+        max_workers=WORKERS_CARGA,
+        retries=REINTENTOS_CARGA,
+        timeout=TIMEOUT_CARGA,
+        )
+
+
+def procesar_eventos_streaming(
+    lotes,
+    df_sorteo,
+    df_condiciones_enriquecido,
+    promos_multi,
+    requisitos_multi,
+    vigencia_promo,
+    loader: BQLoad,
+    reglas_simples=None,
+    guardar_csv: bool = GUARDAR_CSV,
+) -> dict:
+    """
+    MODO_INGESTA = "streaming": cada lote (sesiones completas) pasa por preparación,
+    detección y columnas resumen, y se escribe de inmediato a Parquet (una parte por lote),
+    CSV (opcional) y BigQuery.
+    Solo se acumulan conteos, así que la memoria pico depende de FILAS_POR_LOTE y no del rango de fechas.
+    La carga de cada lote corre en segundo plano mientras se procesa el siguiente (a lo más una en curso).
+    """
+    conteos = {}
+    promos_completas_add_cart = set()
+    total_sesiones = 0
+    n_lotes = 0
+    carga_en_curso = None
+
+    for df_lote in lotes:
+        primero = n_lotes == 0
+        n_lotes += 1
+
+        df_lote = agregar_fecha_evento(df_lote)
+        df_ga4_events_base = preparar_eventos_base(df_lote, df_sorteo)
+        del df_lote
+        indice_sesiones = IndiceSesiones.desde_df(df_ga4_events_base, ['USER', 'SESION'])
+        total_sesiones += len(indice_sesiones)
+
+        df_ga4_events_final, promos_resultado = detectar_patrones(
+            df_ga4_events_base, df_condiciones_enriquecido, promos_multi, requisitos_multi, vigencia_promo,
+            reglas_simples=reglas_simples, indice_sesiones=indice_sesiones,
+        )
+        del df_ga4_events_base
+
+        for k, v in agregar_columnas_resumen(df_ga4_events_final, promos_resultado).items():
+            conteos[k] = conteos.get(k, 0) + v
+        promos_completas_add_cart |= _extraer_promos(promos_resultado, 'PROMOS_ADD_CART_COMPLETAS')
+
+        escribir_parquet(df_ga4_events_final, SALIDA_PARQUET_PROMOS, promos=promos_resultado,
+                         columna_fecha=COL_FECHA_EVENTO, parte=n_lotes, nombre=f"lote {n_lotes}")
+        df_ga4_events_final = promos_resultado.materializar(df_ga4_events_final)
+        if guardar_csv:
+            guardar_csv_patrones(df_ga4_events_final, primero=primero)
+        if carga_en_curso is not None:
+            carga_en_curso.wait()
+        carga_en_curso = cargar_patrones_bq(loader, df_ga4_events_final, en_segundo_plano=True)
+
+        logger.info("Lote %d: filas=%d, filas acumuladas=%d, sesiones acumuladas=%d",
+                    n_lotes, len(df_ga4_events_final), conteos["filas"], total_sesiones)
+
+    if carga_en_curso is not None:
+        carga_en_curso.wait()
+    if n_lotes == 0:
+        logger.warning("El streaming de query_ga4_events no regresó filas")
+        return conteos
+
+    logger.info("Lotes procesados: %d | Total sesiones: %d", n_lotes, total_sesiones)
+    _log_resumen(conteos)
+    logger.info("Promos distintas con patrón completo en ADD_TO_CART: %d", len(promos_completas_add_cart))
+    logger.info("Salida Parquet: %s", SALIDA_PARQUET_PROMOS)
+    if guardar_csv:
+        logger.info("Archivo guardado: %s", OUTPUT_CSV_PROMOS)
+    return conteos
 
 
 # ----------------------------
 # main()
 # ----------------------------
-def main():
+def main(reanudar: bool = False, guardar_checkpoints: bool = GUARDAR_CHECKPOINTS,
+         usar_cache: bool = True, refrescar_cache: bool = False, guardar_csv: bool = GUARDAR_CSV,
+         forzar_ddl: bool = False):
     try:
         logger.info("======== EJECUCIÓN H1 PATRONES PROMOCIONES - INICIO ========")
+        checkpoints = Checkpoints(CHECKPOINT_DIR, guardar=guardar_checkpoints, reanudar=reanudar)
+        if checkpoints.guardar_activo:
+            logger.info("Checkpoints: %s (reanudar=%s)", CHECKPOINT_DIR, reanudar)
+        cache = CacheConsultas(CACHE_DIR, ttl_horas=CACHE_TTL_HORAS, max_bytes=CACHE_MAX_BYTES,
+                               activo=usar_cache, leer=not refrescar_cache)
+        if cache.activo:
+            logger.info("Caché de queries: %s (refrescar=%s)", CACHE_DIR, refrescar_cache)
 
         # Cargar queries
         with _time_block("Carga de archivos SQL"):
@@ -507,6 +546,13 @@ def main():
                 TABLE_B=TABLE_B,
                 DATE_START=DATE_START,
                 DATE_END=DATE_END,
+                FILTRO_DIAS="TRUE",
+            )
+            query_huella_particiones = load_sql(
+                "./Data/queries/huella_particiones.sql",
+                TABLE_B=TABLE_B,
+                DATE_START=DATE_START,
+                DATE_END=DATE_END,
             )
             query_sorteo = load_sql("./Data/queries/sorteo.sql")
             query_condiciones_promocion = load_sql("./Data/queries/condiciones_promocion.sql")
@@ -521,126 +567,82 @@ def main():
 
 
         # Ejecutar queries soporte
-        with _time_block("Ejecución de queries BigQuery (GA4 + soporte)"):
-            logger.info("Ejecutando query_base_patrones...")
-            execute_ddl(query_base_patrones)  # comentar cuando se ejecute al menos una vez
-            logger.info("Ejecutando query_complemento_funnel...") 
-            execute_ddl(query_complemento_funnel) # comentar cuando se ejecute al menos una vez
-        # se quedan como llamadas manuales según necesidad (costosas en BQ).
-
-            logger.info("Ejecutando query_ga4_events...")
-            df_ga4_events = execute_query_to_df(query_ga4_events)
-            logger.info(_df_stats(df_ga4_events, "df_ga4_events"))
-
-            logger.info("Ejecutando query_sorteo...")
-            df_sorteo = execute_query_to_df(query_sorteo)
-            logger.info(_df_stats(df_sorteo, "df_sorteo"))
-
-            logger.info("Ejecutando query_condiciones_promocion...")
-            df_condiciones = execute_query_to_df(query_condiciones_promocion)
-            logger.info(_df_stats(df_condiciones, "df_condiciones"))
-
-            logger.info("Ejecutando query_tipo_cantidad_promocion...")
-            df_tipo_cantidad = execute_query_to_df(query_tipo_cantidad_promocion)
-            logger.info(_df_stats(df_tipo_cantidad, "df_tipo_cantidad"))
-
-            logger.info("Ejecutando query_grupo_condicion_promocion...")
-            df_grupo_condicion = execute_query_to_df(query_grupo_condicion_promocion)
-            logger.info(_df_stats(df_grupo_condicion, "df_grupo_condicion"))
-
-            logger.info("Ejecutando query_catalogo_promociones_fechas...")
-            df_fechas_promocion = execute_query_to_df(query_catalogo_promociones_fechas)
-            logger.info(_df_stats(df_fechas_promocion, "df_fechas_promocion"))
-
-            logger.info("Ejecutando query_promociones_combinadas...")
-            df_promos_combinadas = execute_query_to_df(query_promociones_combinadas)
-            logger.info(_df_stats(df_promos_combinadas, "df_promos_combinadas"))
-
-        # Preparar sorteo + GA4 base + montos
-        with _time_block("Preparación df_sorteo + df_ga4_events_base + montos"):
+        clave_soporte = Checkpoints.clave(
+            "soporte",
+            query_base_patrones, query_complemento_funnel, query_sorteo, query_condiciones_promocion,
+            query_tipo_cantidad_promocion, query_grupo_condicion_promocion,
+            query_catalogo_promociones_fechas, query_promociones_combinadas,
+        )
+        # En corrida completa sin --resume la query GA4 no cambia: se extrae junto con el soporte
+        adelantar_ga4 = MODO_PERIODO == "completo" and MODO_INGESTA == "completa" and not reanudar
+        df_ga4_events_adelantado = None
+        with _time_block("Ejecución de queries BigQuery (soporte)"):
+            salidas = checkpoints.cargar("soporte", clave_soporte)
+            if salidas is not None:
+                # Los DDL base ya corrieron en la ejecución que guardó el checkpoint
+                df_sorteo = salidas["df_sorteo"]
+                df_condiciones = salidas["df_condiciones"]
+                df_tipo_cantidad = salidas["df_tipo_cantidad"]
+                df_grupo_condicion = salidas["df_grupo_condicion"]
+                df_fechas_promocion = salidas["df_fechas_promocion"]
+                df_promos_combinadas = salidas["df_promos_combinadas"]
+            else:
+                # DDL base (solo los que cambiaron) y queries de soporte en paralelo; la extracción
+                # GA4 de la corrida completa se adelanta aquí (después de base_patrones, que crea TABLE_B)
+                ddls = {"base_patrones": query_base_patrones, "complemento_funnel": query_complemento_funnel}
+                manifiesto = ManifiestoDDL(MANIFIESTO_DDL_PATH, MetadatosBigQuery(clientML), forzar=forzar_ddl)
+                ddls_pendientes = manifiesto.pendientes(ddls)
+                consultas = [Consulta(nombre, ddls[nombre], ddl=True) for nombre in ddls_pendientes]
+                consultas += [
+                    Consulta("sorteo", query_sorteo),
+                    Consulta("condiciones_promocion", query_condiciones_promocion),
+                    Consulta("tipo_cantidad_promocion", query_tipo_cantidad_promocion),
+                    Consulta("grupo_condicion_promocion", query_grupo_condicion_promocion),
+                    Consulta("catalogo_promociones_fechas", query_catalogo_promociones_fechas),
+                    Consulta("promociones_combinadas", query_promociones_combinadas),
+                ]
+                if adelantar_ga4:
+                    consultas.append(Consulta("ga4_events", query_ga4_events, dtypes=DTYPES_QUERY["ga4_events"],
+                                              depende_de=[n for n in ddls_pendientes if n == "base_patrones"]))
+                resultados = ejecutar_consultas(clientML, consultas, max_workers=WORKERS_EXTRACCION,
+                                                bqstorage_client=bqstorage_clientML, cache=cache)
+                for nombre in ddls_pendientes:
+                    manifiesto.registrar(nombre, ddls[nombre])
+                df_sorteo = resultados["sorteo"]
+                df_condiciones = resultados["condiciones_promocion"]
+                df_tipo_cantidad = resultados["tipo_cantidad_promocion"]
+                df_grupo_condicion = resultados["grupo_condicion_promocion"]
+                df_fechas_promocion = resultados["catalogo_promociones_fechas"]
+                df_promos_combinadas = resultados["promociones_combinadas"]
+                df_ga4_events_adelantado = resultados.get("ga4_events")
+                for nombre, df in (("df_sorteo", df_sorteo), ("df_condiciones", df_condiciones),
+                                   ("df_tipo_cantidad", df_tipo_cantidad), ("df_grupo_condicion", df_grupo_condicion),
+                                   ("df_fechas_promocion", df_fechas_promocion),
+                                   ("df_promos_combinadas", df_promos_combinadas)):
+                    logger.info(_df_stats(df, nombre))
+
+                checkpoints.guardar("soporte", clave_soporte, {
+                    "df_sorteo": df_sorteo,
+                    "df_condiciones": df_condiciones,
+                    "df_tipo_cantidad": df_tipo_cantidad,
+                    "df_grupo_condicion": df_grupo_condicion,
+                    "df_fechas_promocion": df_fechas_promocion,
+                    "df_promos_combinadas": df_promos_combinadas,
+                })
+
+        # Preparar sorteo
+        with _time_block("Preparación df_sorteo"):
             # Inician cambios JQL - 16Ene26
             
-            # Preparar catálogo de sorteos
-            df_sorteo['numero_sorteo_int'] = df_sorteo['numero_sorteo'].fillna(0).astype(int).astype(str)
-            df_sorteo['item_completo'] = df_sorteo['desc_sorteo'] + ' ' + df_sorteo['numero_sorteo_int']
-            
-            # Convertir fecha_celebracion a datetime
-            df_sorteo['fecha_celebracion'] = pd.to_datetime(df_sorteo['fecha_celebracion'])
+            # Preparar catálogo de sorteos (item_completo + fecha_celebracion a datetime)
+            df_sorteo = preparar_sorteo(df_sorteo)
 
             # Inicializar copias base para mantener integridad de datos originales
-            df_ga4_events_base = df_ga4_events.copy()
             df_condiciones_base = df_condiciones.copy()
 
-            # Limpiar nombres de item_name
-            dictCambiosNombre = {
-                "LQ": "Sorteo Lo Quiero",
-                "Sorteo Efectivo": "Efectivo"
-                }
-
-            df_ga4_events_base["ITEM"] = df_ga4_events_base["ITEM"].apply(mover_numero_al_final)
-            df_ga4_events_base["ITEM"] = df_ga4_events_base["ITEM"].apply(
-                 lambda x: reemplazar_prefijo(x, dictCambiosNombre)
-                 )
-            df_ga4_events_base["ITEM"] = df_ga4_events_base["ITEM"].apply(limpiar_item)
-
-            df_ga4_events_base.loc[df_ga4_events_base["ITEM"] == "Gana Ya", "ITEM"] = "Gana Ya 5"
-
-
-            # Merge con sorteo incluyendo la fecha de celebración
-            df_ga4_events_base = df_ga4_events_base.merge(
-                df_sorteo[['item_completo', 'clave_edicion_producto', 'precio_unitario', 'fecha_celebracion']],
-                left_on='ITEM',
-                right_on='item_completo',
-                how='left'
-            )
-
-            # Calcular dias_para_sorteo
-            # Convertimos la fecha del evento a datetime para la operación matemática
-            event_dt = pd.to_datetime(df_ga4_events_base['DATETIME'], format='%d/%m/%Y %H:%M:%S')
-            
-            # Calculamos la diferencia en días enteros
-            df_ga4_events_base['dias_para_sorteo'] = (df_ga4_events_base["fecha_celebracion"].dt.tz_localize(None).dt.normalize() - event_dt.dt.normalize()).dt.days
-
-
-            # Procesamiento de montos y tipos de datos
-            df_ga4_events_base['clave_edicion_producto'] = pd.to_numeric(
-                df_ga4_events_base['clave_edicion_producto'], errors='coerce'
-            ).astype('Int64')
-
-            # Cálculo de montos potenciales (Price * Qty added to cart)
-            df_ga4_events_base['MONTO_ADD_TO_CART'] = (
-                df_ga4_events_base['precio_unitario'] * df_ga4_events_base['CANTIDAD_ADD_TO_CART']
-            )
-            
-            # Aseguramos que los montos nulos se manejen como 0 para evitar errores en sumatorias
-            df_ga4_events_base['MONTO_ADD_TO_CART'] = df_ga4_events_base['MONTO_ADD_TO_CART'].fillna(0)
-            
-            # Fin de cambios JQL - 16Ene26
-
-
-            df_ga4_events_base['MONTO_BEGIN_CHECKOUT'] = (
-                df_ga4_events_base['precio_unitario'] * df_ga4_events_base['CANTIDAD_BEGIN_CHECKOUT']
-            )
-            df_ga4_events_base['MONTO_PURCHASE'] = (
-                df_ga4_events_base['precio_unitario'] * df_ga4_events_base['CANTIDAD_PURCHASE']
-            )
-
-            df_ga4_events_base = df_ga4_events_base.drop('item_completo', axis=1)
-            logger.info(_df_stats(df_ga4_events_base, "df_ga4_events_base"))
-
         # Condiciones + fechas promo
         with _time_block("Merge df_condiciones con grupo_condicion + fechas_promocion"):
-            df_condiciones_base = df_condiciones_base.merge(
-                df_grupo_condicion[['clave_grupo_condiciones', 'clave_promocion']],
-                on='clave_grupo_condiciones',
-                how='left'
-            )
-
-            df_condiciones_base = df_condiciones_base.merge(
-                df_fechas_promocion[['clave_promocion', 'd_inicio_promocion', 'd_cierre_promocion']],
-                on='clave_promocion',
-                how='left'
-            )
+            df_condiciones_base = unir_condiciones(df_condiciones_base, df_grupo_condicion, df_fechas_promocion)
 
             total = len(df_condiciones_base)
             con_fechas = df_condiciones_base['d_inicio_promocion'].notna().sum()
@@ -653,290 +655,219 @@ def main():
 
         # Promos combinadas
         with _time_block("Normalización de promociones combinadas + vigencia_promo"):
-            df_combinadas = df_promos_combinadas.copy()
-
-            rename_map = {
-                'CLAVE_PROMOCION': 'clave_promocion',
-                'CLAVE_EDICION_PRODUCTO': 'clave_edicion_producto',
-                'CANTIDAD_INICIAL': 'cantidad_inicial',
-            }
-            df_combinadas = df_combinadas.rename(columns={c: rename_map.get(c, c) for c in df_combinadas.columns})
-
-            for c in ['clave_promocion', 'clave_edicion_producto', 'cantidad_inicial']:
-                if c in df_combinadas.columns:
-                    df_combinadas[c] = pd.to_numeric(df_combinadas[c], errors='coerce')
-
-            df_combinadas = df_combinadas.drop_duplicates(
-                subset=['clave_promocion', 'clave_edicion_producto'],
-                keep='last'
-            ).reset_index(drop=True)
+            df_combinadas = normalizar_promos_combinadas(df_promos_combinadas)
 
             promos_multi = set(df_combinadas['clave_promocion'].dropna().astype(int).unique())
 
-            requisitos_multi = {}
-            for pid, grp in df_combinadas.groupby('clave_promocion'):
-                if pd.isna(pid):
-                    continue
-                reqs = []
-                for _, r in grp.iterrows():
-                    if pd.isna(r['clave_edicion_producto']) or pd.isna(r['cantidad_inicial']):
-                        continue
-                    reqs.append({
-                        'clave_edicion_producto': int(r['clave_edicion_producto']),
-                        'cantidad_requerida': int(r['cantidad_inicial'])
-                    })
-                if reqs:
-                    requisitos_multi[int(pid)] = reqs
-
-            df_fechas_promocion['d_inicio_promocion'] = pd.to_datetime(
-                df_fechas_promocion['d_inicio_promocion'], errors='coerce'
-            )
-            df_fechas_promocion['d_cierre_promocion'] = pd.to_datetime(
-                df_fechas_promocion['d_cierre_promocion'], errors='coerce'
-            )
+            # Requisitos en arreglos + índice invertido producto -> [(promo, cantidad_requerida)]
+            requisitos_multi = RequisitosCombinados.desde_df(df_combinadas)
 
-            vigencia_promo = {}
-            for _, r in df_fechas_promocion[['clave_promocion', 'd_inicio_promocion', 'd_cierre_promocion']].drop_duplicates().iterrows():
-                pid = r['clave_promocion']
-                if pd.isna(pid):
-                    continue
-                vigencia_promo[int(pid)] = (r['d_inicio_promocion'], r['d_cierre_promocion'])
+            # Índice de intervalos de vigencia (reemplaza al dict {pid: (inicio, cierre)})
+            vigencia_promo = IndiceVigencia.desde_df(df_fechas_promocion)
 
             logger.info("Promociones multi-producto detectadas: %d", len(promos_multi))
+            logger.info("Promociones con vigencia: %d", len(vigencia_promo))
 
         # Enriquecer condiciones con interpretación
         with _time_block("Enriquecimiento df_condiciones_enriquecido"):
-            df_condiciones_enriquecido = df_condiciones_base.merge(
-                df_tipo_cantidad[['clave_tipo_cantidad_condicion', 'descripcion']],
-                on='clave_tipo_cantidad_condicion',
-                how='left'
-            )
-
-            df_condiciones_enriquecido['interpretacion'] = df_condiciones_enriquecido.apply(
-                interpretar_cantidad, axis=1
-            )
-
-            df_condiciones_enriquecido['d_inicio_promocion'] = pd.to_datetime(
-                df_condiciones_enriquecido['d_inicio_promocion']
-            )
-            df_condiciones_enriquecido['d_cierre_promocion'] = pd.to_datetime(
-                df_condiciones_enriquecido['d_cierre_promocion']
-            )
+            df_condiciones_enriquecido = enriquecer_condiciones(df_condiciones_base, df_tipo_cantidad)
 
             logger.info("Condiciones enriquecidas: %d", len(df_condiciones_enriquecido))
 
-        # Detección de patrones con evaluación por sesión
-        with _time_block("Detección de patrones (por sesión y producto)"):
-            logger.info("Detectando patrones con validación completa (con combinadas V1)...")
-            sesiones = df_ga4_events_base.groupby(['USER', 'SESION'])
-            total_sesiones = len(sesiones)
-            logger.info("Total sesiones: %d", total_sesiones)
-
-            resultados_list = []
-            for idx_sesion, ((user, sesion), df_sesion) in enumerate(sesiones, start=1):
-                if idx_sesion % 1000 == 0:
-                    logger.info("Progreso sesiones: %d / %d (%.1f%%)",
-                                idx_sesion, total_sesiones, 100 * idx_sesion / total_sesiones)
-
-                promociones_completas_sesion = evaluar_promociones_sesion(
-                    df_sesion=df_sesion,
-                    requisitos_multi=requisitos_multi,
-                    vigencia_promo=vigencia_promo
+        # Reglas simples compiladas por (producto, cantidad); se reutilizan si el catálogo no cambió
+        with _time_block("Compilación de reglas de promociones simples"):
+            reglas_simples = compilar_reglas(df_condiciones_enriquecido, promos_multi, path=REGLAS_COMPILADAS_PATH)
+
+        # Periodo a procesar: completo o solo particiones attempt_date nuevas/cambiadas
+        plan = None
+        if MODO_PERIODO == "incremental":
+            with _time_block("Planeación incremental (watermark de particiones attempt_date)"):
+                df_huellas = execute_query_to_df(query_huella_particiones)
+                plan = planear_incremental(
+                    df_huellas=df_huellas,
+                    watermark=cargar_watermark(WATERMARK_PATH),
+                    huellas_promos=huellas_promociones(df_condiciones_enriquecido, requisitos_multi, vigencia_promo),
+                    huella_catalogos=huella_global(df_sorteo, df_tipo_cantidad),
+                    tabla_destino=TABLE_PATRONES,
                 )
-
-                for idx_row, row in df_sesion.iterrows():
-                    resultado = detectar_patrones_producto(
-                        row=row,
-                        condiciones_df=df_condiciones_enriquecido,
-                        promociones_completas_sesion=promociones_completas_sesion,
-                        promos_multi=promos_multi,
-                        requisitos_multi=requisitos_multi,
-                        vigencia_promo=vigencia_promo
+                logger.info("Particiones en la base: %d | a reprocesar: %d | a eliminar: %d",
+                            len(df_huellas), len(plan.dias_procesar), len(plan.dias_eliminar))
+                logger.info("Motivos: %s", plan.motivos)
+                if not plan.completo:
+                    query_ga4_events = load_sql(
+                        "./Data/queries/ga4_events.sql",
+                        TABLE_B=TABLE_B,
+                        DATE_START=DATE_START,
+                        DATE_END=DATE_END,
+                        FILTRO_DIAS=plan.filtro_sql(),
                     )
-                    resultado['index'] = idx_row
-                    resultados_list.append(resultado)
-
-            df_resultados = pd.DataFrame(resultados_list)
-            df_resultados = df_resultados.set_index('index').sort_index()
-
-            df_ga4_events_final = pd.concat([df_ga4_events_base, df_resultados], axis=1)
-            logger.info(_df_stats(df_ga4_events_final, "df_ga4_events_final"))
-
-        # Columnas resumen
-        with _time_block("Cálculo columnas resumen patrón completo / incompleto"):
-            df_ga4_events_final['TIENE_PATRON_COMPLETO'] = df_ga4_events_final.apply(
-                lambda row: 'SI' if (row['PATRON_ADD_CART'] == 'SI' or
-                                     row['PATRON_BEGIN_CHECKOUT'] == 'SI' or
-                                     row['PATRON_PURCHASE'] == 'SI') else 'NO',
-                axis=1
-            )
-
-            df_ga4_events_final['TIENE_PATRON_INCOMPLETO'] = df_ga4_events_final.apply(
-                lambda row: 'SI' if (len(row['PROMOS_ADD_CART_INCOMPLETAS']) > 0 or
-                                     len(row['PROMOS_CHECKOUT_INCOMPLETAS']) > 0 or
-                                     len(row['PROMOS_PURCHASE_INCOMPLETAS']) > 0) else 'NO',
-                axis=1
-            )
-
-            logger.info("=== RESUMEN GENERAL ===")
-            total_filas = len(df_ga4_events_final)
-            completos = len(df_ga4_events_final[df_ga4_events_final['TIENE_PATRON_COMPLETO'] == 'SI'])
-            incompletos = len(df_ga4_events_final[df_ga4_events_final['TIENE_PATRON_INCOMPLETO'] == 'SI'])
-            logger.info("Total de filas analizadas: %d", total_filas)
-            logger.info("Filas con patrón COMPLETO: %d", completos)
-            logger.info("Filas con patrón INCOMPLETO: %d", incompletos)
-
-            logger.info("=== PATRONES COMPLETOS POR ETAPA ===")
-            add_comp = len(df_ga4_events_final[df_ga4_events_final['PATRON_ADD_CART'] == 'SI'])
-            bc_comp = len(df_ga4_events_final[df_ga4_events_final['PATRON_BEGIN_CHECKOUT'] == 'SI'])
-            pur_comp = len(df_ga4_events_final[df_ga4_events_final['PATRON_PURCHASE'] == 'SI'])
-            logger.info("ADD_TO_CART completo: %d", add_comp)
-            logger.info("BEGIN_CHECKOUT completo: %d", bc_comp)
-            logger.info("PURCHASE completo: %d", pur_comp)
-
-        # Análisis multi-producto y guardado CSV patrones_promociones
-        with _time_block("Análisis multi-producto + guardado CSV patrones_promociones"):
-
-            df_ga4_events_final.to_csv(OUTPUT_CSV_PROMOS, index=False)
-            logger.info("Archivo guardado: %s", OUTPUT_CSV_PROMOS)
-
-
-        # Carga a BigQuery (tabla patrones_promociones)
-        with _time_block("Carga df_ga4_events_final a BigQuery (BQLoad)"):
-            loader = BQLoad(credentials_path=CREDENTIALS_PATH_ML)
-            PROJECT_DATASET = "sorteostec-ml.h1"
-            TABLE_NAME = "ga4_patrones_promociones_20241001_20251231"
-            table = f"{PROJECT_DATASET}.{TABLE_NAME}"
-
-            logger.info("Eliminando tabla destino (si existe): %s", table)
-            loader.delete_tables(table)
-
-            # Cambios JQL 16Ene26. Definir esquema
-            schema_patrones = [
-                bigquery.SchemaField("USER", "STRING"),
-                bigquery.SchemaField("SESION", "INTEGER"),
-                bigquery.SchemaField("DATETIME", "STRING"),
-                bigquery.SchemaField("ITEM", "STRING"),
-                bigquery.SchemaField("INTENTO", "INTEGER"),
-                
-                # New Contextual Columns
-                bigquery.SchemaField("device_category", "STRING"),
-                bigquery.SchemaField("geo_country", "STRING"),
-                bigquery.SchemaField("geo_region", "STRING"),
-                bigquery.SchemaField("geo_city", "STRING"),
-                bigquery.SchemaField("traffic_source", "STRING"),
-                bigquery.SchemaField("traffic_medium", "STRING"),
-
-                # Quantities and IDs
-                bigquery.SchemaField("STATUS", "STRING"),
-                bigquery.SchemaField("CANTIDAD_ADD_TO_CART", "INTEGER"),
-                bigquery.SchemaField("CANTIDAD_BEGIN_CHECKOUT", "INTEGER"),
-                bigquery.SchemaField("CANTIDAD_PURCHASE", "INTEGER"),
-                bigquery.SchemaField("TRANSACTION_ID", "STRING"),
-                bigquery.SchemaField("item_id", "INTEGER"),
-                bigquery.SchemaField("clave_edicion_producto", "INTEGER"),
-
-                # Financials and Dates
-                bigquery.SchemaField("precio_unitario", "FLOAT"),
-                bigquery.SchemaField("fecha_celebracion", "TIMESTAMP"),
-                bigquery.SchemaField("dias_para_sorteo", "FLOAT"),
-                bigquery.SchemaField("MONTO_ADD_TO_CART", "FLOAT"),
-                bigquery.SchemaField("MONTO_BEGIN_CHECKOUT", "FLOAT"),
-                bigquery.SchemaField("MONTO_PURCHASE", "FLOAT"),
-
-                # Patterns - ADD TO CART
-                bigquery.SchemaField("PATRON_ADD_CART", "STRING"),
-                bigquery.SchemaField("PROMOS_ADD_CART_COMPLETAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("PROMOS_ADD_CART_INCOMPLETAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("PROMOS_ADD_CART_TODAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("DESC_ADD_CART_COMPLETAS", "STRING"),
 
-                # Patterns - BEGIN CHECKOUT
-                bigquery.SchemaField("PATRON_BEGIN_CHECKOUT", "STRING"),
-                bigquery.SchemaField("PROMOS_CHECKOUT_COMPLETAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("PROMOS_CHECKOUT_INCOMPLETAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("PROMOS_CHECKOUT_TODAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("DESC_CHECKOUT_COMPLETAS", "STRING"),
-
-                # Patterns - PURCHASE
-                bigquery.SchemaField("PATRON_PURCHASE", "STRING"),
-                bigquery.SchemaField("PROMOS_PURCHASE_COMPLETAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("PROMOS_PURCHASE_INCOMPLETAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("PROMOS_PURCHASE_TODAS", "INTEGER", mode="REPEATED"),
-                bigquery.SchemaField("DESC_PURCHASE_COMPLETAS", "STRING"),
-
-                # Summaries
-                bigquery.SchemaField("TIENE_PATRON_COMPLETO", "STRING"),
-                bigquery.SchemaField("TIENE_PATRON_INCOMPLETO", "STRING")
-            ]
-
-            # 1. Extract column names from the schema list in order
-            column_order = [field.name for field in schema_patrones]
+        # Clave de la tabla de patrones cargada; None si la rama no deja checkpoint (el funnel se recalcula)
+        clave_patrones = None
+        if plan is not None and plan.vacio:
+            logger.info("Sin particiones nuevas ni cambiadas: se conserva %s", TABLE_PATRONES)
+        elif plan is not None and not plan.dias_procesar:
+            with _time_block("Eliminación de particiones sin datos en la base"):
+                preparar_destino_patrones(BQLoad(credentials_path=CREDENTIALS_PATH_ML), plan)
+                preparar_salida_parquet(plan)
+        elif MODO_INGESTA == "streaming":
+            # Preparación + detección + Parquet + carga por lote de sesiones completas
+            with _time_block("Streaming GA4: preparación, detección, Parquet y carga a BigQuery por lote"):
+                logger.info("Motor de detección: %s | Filas por lote: %d", MOTOR_DETECCION, FILAS_POR_LOTE)
+                loader = BQLoad(credentials_path=CREDENTIALS_PATH_ML)
+                preparar_destino_patrones(loader, plan)
+                preparar_salida_parquet(plan)
+
+                procesar_eventos_streaming(
+                    lotes=lotes_eventos(
+                        client=clientML,
+                        query=query_ga4_events,
+                        archivo_arrow=ARCHIVO_ARROW_EVENTOS,
+                        credentials=credentialsML,
+                        filas_por_lote=FILAS_POR_LOTE,
+                        dtypes=DTYPES_QUERY["ga4_events"],
+                    ),
+                    df_sorteo=df_sorteo,
+                    df_condiciones_enriquecido=df_condiciones_enriquecido,
+                    promos_multi=promos_multi,
+                    requisitos_multi=requisitos_multi,
+                    vigencia_promo=vigencia_promo,
+                    loader=loader,
+                    reglas_simples=reglas_simples,
+                    guardar_csv=guardar_csv,
+                )
+        else:
+            # Extracción GA4 (rango completo o solo las particiones del plan incremental)
+            clave_ga4 = Checkpoints.clave("ga4_base", clave_soporte, query_ga4_events)
+            with _time_block("Extracción GA4 + preparación df_ga4_events_base + montos"):
+                salidas = checkpoints.cargar("ga4_base", clave_ga4)
+                if salidas is not None:
+                    df_ga4_events_base = salidas["df_ga4_events_base"]
+                else:
+                    if df_ga4_events_adelantado is not None:
+                        # Ya se extrajo junto con las queries de soporte
+                        df_ga4_events, df_ga4_events_adelantado = df_ga4_events_adelantado, None
+                    else:
+                        logger.info("Ejecutando query_ga4_events...")
+                        df_ga4_events = execute_query_to_df(query_ga4_events, DTYPES_QUERY["ga4_events"], "ga4_events",
+                                                            cache=cache)
+                    # DATETIME se parsea una sola vez; todo lo posterior lee FECHA_EVENTO
+                    df_ga4_events = agregar_fecha_evento(df_ga4_events)
+                    logger.info("Filas con FECHA_EVENTO inválida: %d", df_ga4_events[COL_FECHA_EVENTO].isna().sum())
+                    logger.info(_df_stats(df_ga4_events, "df_ga4_events"))
+
+                    df_ga4_events_base = preparar_eventos_base(df_ga4_events, df_sorteo)
+                    del df_ga4_events
+                    checkpoints.guardar("ga4_base", clave_ga4, {"df_ga4_events_base": df_ga4_events_base})
+                logger.info(_df_stats(df_ga4_events_base, "df_ga4_events_base"))
+
+            # Detección de patrones con evaluación por sesión
+            # (el motor no entra en la clave: los tres motores dan el mismo resultado)
+            clave_deteccion = Checkpoints.clave("deteccion", clave_ga4)
+            with _time_block("Detección de patrones (por sesión y producto)"):
+                salidas = checkpoints.cargar("deteccion", clave_deteccion)
+                if salidas is not None:
+                    df_ga4_events_final = salidas["df_ga4_events_final"]
+                    promos_resultado = TablaPromos.desde_arrow(salidas["promos_resultado"])
+                else:
+                    logger.info("Detectando patrones con validación completa (con combinadas V1)...")
+                    indice_sesiones = IndiceSesiones.desde_df(df_ga4_events_base, ['USER', 'SESION'])
+                    logger.info("Total sesiones: %d", len(indice_sesiones))
+                    logger.info("Motor de detección: %s", MOTOR_DETECCION)
+
+                    df_ga4_events_final, promos_resultado = detectar_patrones(
+                        df_ga4_events_base, df_condiciones_enriquecido, promos_multi, requisitos_multi, vigencia_promo,
+                        reglas_simples=reglas_simples, indice_sesiones=indice_sesiones,
+                    )
+                    checkpoints.guardar("deteccion", clave_deteccion, {
+                        "df_ga4_events_final": df_ga4_events_final,
+                        "promos_resultado": promos_resultado.a_arrow(),
+                    })
+                logger.info(_df_stats(df_ga4_events_final, "df_ga4_events_final"))
+                logger.info("Columnas PROMOS_* en CSR: memory≈%.2f MB", promos_resultado.nbytes / (1024 ** 2))
 
-            # 2. Reorder the DataFrame (this ensures the CSV/Parquet buffer matches the BQ schema)
-            df_ga4_events_final = df_ga4_events_final[column_order]
+            # Columnas resumen
+            with _time_block("Cálculo columnas resumen patrón completo / incompleto"):
+                _log_resumen(agregar_columnas_resumen(df_ga4_events_final, promos_resultado))
 
-            logger.info("Cargando df_ga4_events_final a %s", table)
-            loader.load_table(
-                df=df_ga4_events_final,
-                destination=table,
-                schema=schema_patrones,
-                )
-            # Fin de Cambios JQL 16Ene26.
+            clave_patrones = Checkpoints.clave(
+                "carga_patrones", clave_deteccion, TABLE_PATRONES, plan.dias_reemplazar if plan else None
+            )
+            carga_patrones = None
+
+            # Análisis multi-producto, envío de la carga a BigQuery y guardado Parquet patrones_promociones
+            with _time_block("Análisis multi-producto + envío carga BigQuery + guardado Parquet patrones_promociones"):
+
+                logger.info("Promos distintas con patrón completo en ADD_TO_CART: %d",
+                            len(_extraer_promos(promos_resultado, 'PROMOS_ADD_CART_COMPLETAS')))
+
+                # Las listas PROMOS_* (REPEATED INTEGER) solo se materializan para CSV / BigQuery
+                df_ga4_events_final = promos_resultado.materializar(df_ga4_events_final)
+
+                # La carga (serialización + subida) corre en segundo plano mientras se escriben Parquet y CSV
+                if checkpoints.cargar("carga_patrones", clave_patrones) is None:
+                    loader = BQLoad(credentials_path=CREDENTIALS_PATH_ML)
+                    logger.info("Cargando df_ga4_events_final a %s en segundo plano", TABLE_PATRONES)
+                    if plan is None or plan.completo:
+                        # Tabla auxiliar + copy job WRITE_TRUNCATE: la tabla en uso no se elimina antes
+                        carga_patrones = cargar_patrones_bq(loader, df_ga4_events_final,
+                                                            write_disposition="WRITE_TRUNCATE",
+                                                            en_segundo_plano=True)
+                    elif loader.is_partitioned_by(TABLE_PATRONES, PARTICION_PATRONES):
+                        # Reemplazo directo de las particiones del plan (sin DELETE previo)
+                        carga_patrones = cargar_patrones_bq(loader, df_ga4_events_final,
+                                                            dias_reemplazar=plan.dias_reemplazar,
+                                                            en_segundo_plano=True)
+                    else:
+                        preparar_destino_patrones(loader, plan)
+                        carga_patrones = cargar_patrones_bq(loader, df_ga4_events_final, en_segundo_plano=True)
+
+                # list<int64> directo del CSR; solo se reemplazan los días del plan incremental
+                preparar_salida_parquet(plan)
+                escribir_parquet(df_ga4_events_final, SALIDA_PARQUET_PROMOS, promos=promos_resultado,
+                                 columna_fecha=COL_FECHA_EVENTO, nombre="df_ga4_events_final")
+
+                if guardar_csv:
+                    guardar_csv_patrones(df_ga4_events_final)
+                    logger.info("Archivo guardado: %s", OUTPUT_CSV_PROMOS)
+
+            # procesamiento_patrones.sql lee TABLE_PATRONES: aquí sí hay que esperar la carga
+            with _time_block("Espera carga df_ga4_events_final a BigQuery (BQLoad)"):
+                if carga_patrones is not None:
+                    carga_patrones.wait()
+                    checkpoints.guardar("carga_patrones", clave_patrones, {})
+                # Fin de Cambios JQL 16Ene26.
+
+        # El watermark solo avanza cuando las particiones ya quedaron cargadas
+        if plan is not None:
+            guardar_watermark(WATERMARK_PATH, plan.estado_nuevo)
+            logger.info("Watermark actualizado: %s", WATERMARK_PATH)
 
         # Procesamiento funnel completo
+        clave_funnel = clave_patrones and Checkpoints.clave(
+            "funnel", clave_patrones, query_procesamiento_patrones, query_patrones_funnel_completo
+        )
         with _time_block("Procesamiento patrones funnel completo (DDL + SELECT)"):
-            execute_ddl(query_procesamiento_patrones)
-            df_patrones_funnel_completo = execute_query_to_df(query_patrones_funnel_completo)
+            salidas = checkpoints.cargar("funnel", clave_funnel)
+            if salidas is not None:
+                df_patrones_funnel_completo = salidas["df_patrones_funnel_completo"]
+            else:
+                execute_ddl(query_procesamiento_patrones)
+                df_patrones_funnel_completo = execute_query_to_df(
+                    query_patrones_funnel_completo, DTYPES_QUERY["patrones_funnel_completo"], "patrones_funnel_completo",
+                    cache=cache,
+                )
+                checkpoints.guardar("funnel", clave_funnel, {"df_patrones_funnel_completo": df_patrones_funnel_completo})
             logger.info(_df_stats(df_patrones_funnel_completo, "df_patrones_funnel_completo"))
 
         # Limpieza ITEM + precios + montos y guardado CSV funnel
         with _time_block("Limpieza ITEM, inferencia precio_unitario, montos"):
-            dictCambiosNombre = {
-                "LQ": "Sorteo Lo Quiero",
-                "Sorteo Efectivo": "Efectivo",
-            }
-
-            df_filtrado_copy = df_patrones_funnel_completo.copy()
-
-            df_filtrado_copy["ITEM"] = df_filtrado_copy["ITEM"].apply(mover_numero_al_final)
-            df_filtrado_copy["ITEM"] = df_filtrado_copy["ITEM"].apply(
-                lambda x: reemplazar_prefijo(x, dictCambiosNombre)
-            )
-            df_filtrado_copy["ITEM"] = df_filtrado_copy["ITEM"].apply(limpiar_item)
-
-            df_sorteo['numero_sorteo_int'] = df_sorteo['numero_sorteo'].fillna(0).astype(int).astype(str)
-            df_sorteo['item_completo'] = df_sorteo['desc_sorteo'] + ' ' + df_sorteo['numero_sorteo_int']
-
-            precio_por_item = (
-                df_sorteo.drop_duplicates('item_completo')
-                        .set_index('item_completo')['precio_unitario']
-            )
-
-            mask_precio = df_filtrado_copy['precio_unitario_inferido'].isna()
-            df_filtrado_copy.loc[mask_precio, 'precio_unitario_inferido'] = (
-                df_filtrado_copy.loc[mask_precio, 'ITEM'].map(precio_por_item)
-            )
-
-            df_filtrado_copy['qty_add_to_cart'] = df_filtrado_copy['qty_add_to_cart'].astype(float)
-            df_filtrado_copy['qty_begin_checkout'] = df_filtrado_copy['qty_begin_checkout'].astype(float)
-            df_filtrado_copy['qty_purchase'] = df_filtrado_copy['qty_purchase'].astype(float)
-            df_filtrado_copy['precio_unitario_inferido'] = df_filtrado_copy['precio_unitario_inferido'].astype(float)
-
-            df_filtrado_copy['MONTO_ADD_TO_CART'] = (
-                df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_add_to_cart']
-            )
-            df_filtrado_copy['MONTO_BEGIN_CHECKOUT'] = (
-                df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_begin_checkout']
-            )
-            df_filtrado_copy['MONTO_PURCHASE'] = (
-                df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_purchase']
-            )
+            df_filtrado_copy = limpiar_funnel(df_patrones_funnel_completo, df_sorteo)
             logger.info(_df_stats(df_filtrado_copy, "df_filtrado_copy"))
 
         # Cambios JQL 16Ene26. Guardar en BD, no en CSV
         # Carga a BigQuery (tabla df_filtrado_copy)
-        with _time_block("Carga df_filtrado_copy a BigQuery (BQLoad), sin guardar CSV"):
+        with _time_block("Envío carga df_filtrado_copy a BigQuery (BQLoad), sin guardar CSV"):
             loader = BQLoad(credentials_path=CREDENTIALS_PATH_ML)
             PROJECT_DATASET = "sorteostec-ml.h1"
             TABLE_NAME = "patrones_funnel_completo__20241001_20251231"
@@ -1033,41 +964,37 @@ def main():
             for col in repeated_cols:
                 df_filtrado_copy[col] = df_filtrado_copy[col].apply(lambda x: x if isinstance(x, list) else [])
 
-            # 3. Ejecutar la carga
-            logger.info("Eliminando tabla destino (si existe): %s", table)
-            loader.delete_tables(table)
+            # 3. Ejecutar la carga en segundo plano: nada posterior lee la tabla, así que el Parquet,
+            # los KPIs y los flags (que solo leen df_filtrado_copy) corren mientras se sube
+            clave_carga_funnel = clave_funnel and Checkpoints.clave("carga_funnel", clave_funnel, table)
+            carga_funnel = None
+            if checkpoints.cargar("carga_funnel", clave_carga_funnel) is None:
+                # WRITE_TRUNCATE con partición: BQLoad carga a una tabla auxiliar y la copia sobre la tabla
+                logger.info("Cargando df_filtrado_copy a %s en segundo plano", table)
+                carga_funnel = loader.load_table_async(
+                    df=df_filtrado_copy,
+                    destination=table,
+                    schema=schema_funnel_completo,
+                    partition_field=PARTICION_FUNNEL,
+                    clustering_fields=CLUSTER_FUNNEL,
+                    max_workers=WORKERS_CARGA,
+                    retries=REINTENTOS_CARGA,
+                    timeout=TIMEOUT_CARGA,
+                )
 
-            logger.info("Cargando df_filtrado_copy a %s", table)
-            loader.load_table(
-                df=df_filtrado_copy,
-                destination=table,
-                schema=schema_funnel_completo,
-            )
-            logger.info("df_filtrado_copy cargada en %s", table)
-        #df_filtrado_copy.to_csv(OUTPUT_CSV_FUNNEL, index=False)
-        #logger.info("Archivo funnel completo guardado: %s", OUTPUT_CSV_FUNNEL)
+        # Copia local del funnel para el análisis sin volver a consultar BigQuery (H1ShortScript --desde-parquet)
+        with _time_block("Guardado Parquet funnel completo"):
+            limpiar_salida(SALIDA_PARQUET_FUNNEL)
+            escribir_parquet(df_filtrado_copy, SALIDA_PARQUET_FUNNEL, nombre="df_filtrado_copy")
+            if guardar_csv:
+                df_filtrado_copy.to_csv(OUTPUT_CSV_FUNNEL, index=False)
+                logger.info("Archivo funnel completo guardado: %s", OUTPUT_CSV_FUNNEL)
         # Fin de cambios JQL 16Ene26
 
         # Agregar nivel sesión + KPIs
         with _time_block("Agregación nivel sesión + KPIs"):
-            df_sesiones = (
-                df_filtrado_copy
-                .groupby(["user_pseudo_id", "session_id"], as_index=False)
-                .agg({
-                    "categoria_login": "first",
-                    "MONTO_BEGIN_CHECKOUT": "sum",
-                    "MONTO_PURCHASE": "sum",
-                    "PATRON_BEGIN_CHECKOUT": lambda s: (s == "SI").any(),
-                })
-            )
-
-            df_sesiones["tiene_login"] = df_sesiones["categoria_login"] != "SIN LOGIN EN SESIÓN"
-            df_sesiones["tiene_purchase"] = df_sesiones["MONTO_PURCHASE"] > 0
-            df_sesiones["tiene_patron_bc"] = df_sesiones["PATRON_BEGIN_CHECKOUT"]
-            df_sesiones["es_sin_registro_con_purchase"] = (
-                (df_sesiones["categoria_login"] == "SIN LOGIN EN SESIÓN")
-                & df_sesiones["tiene_purchase"]
-            )
+            # Índice de sesiones: un solo ordenamiento, reutilizado por los flags por sesión
+            indice_sesiones, df_sesiones = agregar_sesiones(df_filtrado_copy)
 
             # 1) Total sesiones
             total_sesiones_count = len(df_sesiones)
@@ -1188,19 +1115,13 @@ def main():
         with _time_block("Análisis promos simples/combinadas por fila y sesión"):
             df_flags = df_filtrado_copy.copy()
 
-            # Flags fila a fila
-            df_flags["HAS_SIMPLE_INCOMPLETE"] = df_flags.apply(
-                has_simple_incomplete, axis=1, promos_multi=promos_multi
-            )
-            df_flags["HAS_COMBINED_INCOMPLETE"] = df_flags.apply(
-                has_combined_incomplete, axis=1, promos_multi=promos_multi
-            )
-            df_flags["HAS_SIMPLE_COMPLETA"] = df_flags.apply(
-                has_simple_complete, axis=1, promos_multi=promos_multi
-            )
-            df_flags["HAS_COMBINED_COMPLETA"] = df_flags.apply(
-                has_combined_complete, axis=1, promos_multi=promos_multi
+            # Flags fila a fila: un solo explode (CSR) de las columnas ADD_TO_CART
+            promos_flags = TablaPromos.desde_df(
+                df_flags, ["PROMOS_ADD_CART_INCOMPLETAS", "PROMOS_ADD_CART_COMPLETAS"]
             )
+            flags_fila = flags_simples_combinadas(promos_flags, promos_multi)
+            for nombre, valores in flags_fila.items():
+                df_flags[nombre] = valores
 
             total_filas_flags = len(df_flags)
             logger.info("=== RESUMEN FILAS (ADD_TO_CART) ===")
@@ -1213,18 +1134,8 @@ def main():
                         len(df_flags[(df_flags["HAS_SIMPLE_INCOMPLETE"])
                                      & (df_flags["HAS_COMBINED_INCOMPLETE"])]))
 
-            # Agregación a nivel sesión
-            sesion_flags = (
-                df_flags
-                .groupby(["user_pseudo_id", "session_id"])
-                .agg(
-                    HAS_SIMPLE_INCOMPLETE_SESION=("HAS_SIMPLE_INCOMPLETE", "any"),
-                    HAS_COMBINED_INCOMPLETE_SESION=("HAS_COMBINED_INCOMPLETE", "any"),
-                    HAS_SIMPLE_COMPLETA_SESION=("HAS_SIMPLE_COMPLETA", "any"),
-                    HAS_COMBINED_COMPLETA_SESION=("HAS_COMBINED_COMPLETA", "any"),
-                )
-                .reset_index()
-            )
+            # Agregación a nivel sesión (reutiliza los arreglos de flags por fila)
+            sesion_flags = flags_por_sesion(df_flags, flags_fila, indice=indice_sesiones)
 
             total_sesiones_flags = len(sesion_flags)
 
@@ -1325,6 +1236,12 @@ def main():
             )
 
 
+        with _time_block("Espera carga df_filtrado_copy a BigQuery (BQLoad)"):
+            if carga_funnel is not None:
+                carga_funnel.wait()
+                logger.info("df_filtrado_copy cargada en %s", table)
+                checkpoints.guardar("carga_funnel", clave_carga_funnel, {})
+
         logger.info("======== EJECUCIÓN H1 PATRONES PROMOCIONES - FIN EXITOSO ========")
 
 
@@ -1334,5 +1251,21 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="H1 patrones promociones")
+    parser.add_argument("--resume", action="store_true",
+                        help="reanudar desde los checkpoints válidos de la corrida anterior")
+    parser.add_argument("--checkpoints", action="store_true",
+                        help="guardar checkpoints de cada etapa (implícito con --resume)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="no leer ni escribir la caché local de queries")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignorar la caché de queries y reescribirla con resultados nuevos")
+    parser.add_argument("--csv", action="store_true",
+                        help="además del Parquet, escribir los CSV de patrones y funnel")
+    parser.add_argument("--force", action="store_true",
+                        help="ejecutar los DDL base aunque sus fuentes no hayan cambiado")
+    args = parser.parse_args()
+    main(reanudar=args.resume, guardar_checkpoints=args.checkpoints or GUARDAR_CHECKPOINTS,
+         usar_cache=not args.no_cache, refrescar_cache=args.refresh, guardar_csv=args.csv or GUARDAR_CSV,
+         forzar_ddl=args.force)
 
@@ -1,13 +1,19 @@
+import argparse
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 from time import perf_counter
-import re
 
 import pandas as pd
 from google.cloud import bigquery
 from google.oauth2 import service_account
-import numpy as np
+
+from CacheConsultas import CacheConsultas
+from ColumnasPromos import TablaPromos, flags_por_sesion, flags_simples_combinadas
+from ExtraccionConcurrente import Consulta, ejecutar_consultas
+from EtapasPipeline import agregar_sesiones, limpiar_funnel, normalizar_promos_combinadas
+from LecturaArrow import DTYPES_QUERY, cliente_storage, leer_query
+from SalidaParquet import escribir_parquet, leer_parquet, limpiar_salida
 
 
 # ----------------------------
@@ -20,8 +26,16 @@ LOG_DIR = Path("/home/sam.salinas/PythonProjects/H1/logs")
 LOG_DIR.mkdir(parents=True, exist_ok=True)
 LOG_FILE = LOG_DIR / "h1Logs_post.log"
 
+# Funnel limpio como Parquet particionado por attempt_date (SalidaParquet); el CSV solo con --csv
+SALIDA_PARQUET_FUNNEL = Path("/home/sam.salinas/PythonProjects/H1/Data/parquet/ga4_patrones_funnel_completo_post")
+GUARDAR_CSV = False
 OUTPUT_CSV_FUNNEL = "/home/sam.salinas/PythonProjects/H1/Data/CSV/ga4_patrones_funnel_completo_post.csv"
 
+# Caché local de resultados de queries (misma que H1Script; ver CacheConsultas)
+CACHE_DIR = Path("/home/sam.salinas/PythonProjects/H1/Data/cache")
+CACHE_TTL_HORAS = 24.0
+CACHE_MAX_BYTES = 5 * 1024 ** 3
+
 
 # ----------------------------
 # Configuración de logging
@@ -77,6 +91,8 @@ def _time_block(label: str):
 # ----------------------------
 credentialsML = service_account.Credentials.from_service_account_file(CREDENTIALS_PATH_ML)
 clientML = bigquery.Client(credentials=credentialsML, project=PROJECT_ID)
+# Storage Read API para las lecturas tipadas (None si la librería no está instalada)
+bqstorage_clientML = cliente_storage(credentialsML)
 
 
 # ----------------------------
@@ -93,101 +109,30 @@ def load_sql(path: str, **params) -> str:
     return sql_text
 
 
-def execute_query_to_df(query: str) -> pd.DataFrame:
-    """Ejecuta un SELECT en BigQuery y devuelve un DataFrame."""
+def execute_query_to_df(query: str, dtypes: dict = None, nombre: str = "query") -> pd.DataFrame:
+    """
+    Ejecuta un SELECT en BigQuery y devuelve un DataFrame.
+    Con `dtypes` (ver LecturaArrow.DTYPES_QUERY) la lectura va por Arrow con dtypes compactos.
+    """
+    if dtypes is not None:
+        return leer_query(clientML, query, dtypes, bqstorage_client=bqstorage_clientML, nombre=nombre)
     job = clientML.query(query)
     return job.to_dataframe()
 
 
 # ----------------------------
-# Helpers de limpieza de ITEM
-# ----------------------------
-def mover_numero_al_final(texto):
-    if isinstance(texto, str):
-        match = re.match(r"^(\d+)\s*°?\s*(.*)$", texto)
-        if match:
-            numero = match.group(1)
-            resto = match.group(2)
-            return f"{resto.strip()} {numero}"
-    return texto
-
-
-def reemplazar_prefijo(texto: str, diccionario: dict) -> str:
-    if not isinstance(texto, str):
-        return texto
-
-    for clave, valor in diccionario.items():
-        if re.match(rf"^{clave}\s*\d+", texto):
-            return re.sub(rf"^{clave}", valor, texto)
-
-        if clave in texto:
-            return texto.replace(clave, valor)
-
-    return texto
-
-
-def limpiar_item(nombre: str) -> str:
-    if not isinstance(nombre, str):
-        return nombre
-    # Quita duplicación de número final tipo "Sorteo XYZ 123 123"
-    return re.sub(r'(\b\d+)\s+\1$', r'\1', nombre)
-
-
-# ----------------------------
-# Helpers promos simples / combinadas (ADD_TO_CART)
+# main()
 # ----------------------------
-def _todas_incompletas_fila(row):
-    """
-    Devuelve todas las promos incompletas ADD_TO_CART de una fila,
-    aceptando listas o ndarrays.
+def main(usar_cache: bool = True, refrescar_cache: bool = False, guardar_csv: bool = GUARDAR_CSV,
+         desde_parquet=None):
     """
-    val = row.get("PROMOS_ADD_CART_INCOMPLETAS", [])
-
-    if isinstance(val, (list, np.ndarray)):
-        return list(val)
-
-    return []
-
-
-def has_simple_incomplete(row, promos_multi):
-    incompletas = _todas_incompletas_fila(row)
-    return any((p not in promos_multi) for p in incompletas)
-
-
-def has_combined_incomplete(row, promos_multi):
-    incompletas = _todas_incompletas_fila(row)
-    return any((p in promos_multi) for p in incompletas)
-
-
-def _todas_completas_fila(row):
-    """
-    Devuelve todas las promos COMPLETAS ADD_TO_CART de una fila,
-    aceptando listas o ndarrays.
+    `desde_parquet`: carpeta escrita por SalidaParquet (funnel ya limpio de H1Script o de una
+    corrida anterior); se usa en lugar de la query del funnel y del catálogo de sorteos.
     """
-    val = row.get("PROMOS_ADD_CART_COMPLETAS", [])
-
-    if isinstance(val, (list, np.ndarray)):
-        return list(val)
-
-    return []
-
-
-def has_simple_complete(row, promos_multi):
-    completas = _todas_completas_fila(row)
-    return any((p not in promos_multi) for p in completas)
-
-
-def has_combined_complete(row, promos_multi):
-    completas = _todas_completas_fila(row)
-    return any((p in promos_multi) for p in completas)
-
-
-# ----------------------------
-# main()
-# ----------------------------
-def main():
     try:
         logger.info("======== EJECUCIÓN H1 POST-PROCESO PATRONES - INICIO ========")
+        cache = CacheConsultas(CACHE_DIR, ttl_horas=CACHE_TTL_HORAS, max_bytes=CACHE_MAX_BYTES,
+                               activo=usar_cache, leer=not refrescar_cache)
 
         # Cargar queries necesarias
         with _time_block("Carga de archivos SQL"):
@@ -197,113 +142,51 @@ def main():
 
         # Ejecutar queries base (solo lo mínimo)
         with _time_block("Ejecución de queries BigQuery (sorteo + promos_combinadas + funnel)"):
-            logger.info("Ejecutando query_sorteo...")
-            df_sorteo = execute_query_to_df(query_sorteo)
-            logger.info(_df_stats(df_sorteo, "df_sorteo"))
-
-            logger.info("Ejecutando query_promociones_combinadas...")
-            df_promos_combinadas = execute_query_to_df(query_promociones_combinadas)
+            # Las tres queries son independientes: se envían juntas y se descargan en paralelo
+            consultas = [Consulta("promociones_combinadas", query_promociones_combinadas)]
+            if desde_parquet is None:
+                consultas += [
+                    Consulta("sorteo", query_sorteo),
+                    Consulta("patrones_funnel_completo", query_patrones_funnel_completo,
+                             dtypes=DTYPES_QUERY["patrones_funnel_completo"]),
+                ]
+            resultados = ejecutar_consultas(clientML, consultas, bqstorage_client=bqstorage_clientML, cache=cache)
+            df_promos_combinadas = resultados["promociones_combinadas"]
             logger.info(_df_stats(df_promos_combinadas, "df_promos_combinadas"))
-
-            logger.info("Ejecutando query_patrones_funnel_completo...")
-            df_patrones_funnel_completo = execute_query_to_df(query_patrones_funnel_completo)
-            logger.info(_df_stats(df_patrones_funnel_completo, "df_patrones_funnel_completo"))
+            if desde_parquet is None:
+                df_sorteo = resultados["sorteo"]
+                df_patrones_funnel_completo = resultados["patrones_funnel_completo"]
+                logger.info(_df_stats(df_sorteo, "df_sorteo"))
+                logger.info(_df_stats(df_patrones_funnel_completo, "df_patrones_funnel_completo"))
 
         # Normalizar promos combinadas -> promos_multi
         with _time_block("Normalización promociones combinadas (promos_multi)"):
-            df_combinadas = df_promos_combinadas.copy()
-
-            rename_map = {
-                'CLAVE_PROMOCION': 'clave_promocion',
-                'CLAVE_EDICION_PRODUCTO': 'clave_edicion_producto',
-                'CANTIDAD_INICIAL': 'cantidad_inicial',
-            }
-            df_combinadas = df_combinadas.rename(columns={c: rename_map.get(c, c) for c in df_combinadas.columns})
-
-            for c in ['clave_promocion', 'clave_edicion_producto', 'cantidad_inicial']:
-                if c in df_combinadas.columns:
-                    df_combinadas[c] = pd.to_numeric(df_combinadas[c], errors='coerce')
-
-            df_combinadas = df_combinadas.drop_duplicates(
-                subset=['clave_promocion', 'clave_edicion_producto'],
-                keep='last'
-            ).reset_index(drop=True)
+            df_combinadas = normalizar_promos_combinadas(df_promos_combinadas)
 
             promos_multi = set(df_combinadas['clave_promocion'].dropna().astype(int).unique())
             logger.info("Promociones multi-producto detectadas: %d", len(promos_multi))
 
         # Limpieza ITEM + inferencia precio_unitario + montos
-        with _time_block("Limpieza ITEM, inferencia precio_unitario, montos y guardado CSV funnel"):
-            dictCambiosNombre = {
-                "LQ": "Sorteo Lo Quiero",
-                "Sorteo Efectivo": "Efectivo",
-            }
-
-            df_filtrado_copy = df_patrones_funnel_completo.copy()
-
-            # Limpieza de ITEM
-            df_filtrado_copy["ITEM"] = df_filtrado_copy["ITEM"].apply(mover_numero_al_final)
-            df_filtrado_copy["ITEM"] = df_filtrado_copy["ITEM"].apply(
-                lambda x: reemplazar_prefijo(x, dictCambiosNombre)
-            )
-            df_filtrado_copy["ITEM"] = df_filtrado_copy["ITEM"].apply(limpiar_item)
-
-            # Construir item_completo en sorteo y mapear precios
-            df_sorteo['numero_sorteo_int'] = df_sorteo['numero_sorteo'].fillna(0).astype(int).astype(str)
-            df_sorteo['item_completo'] = df_sorteo['desc_sorteo'] + ' ' + df_sorteo['numero_sorteo_int']
-
-            precio_por_item = (
-                df_sorteo.drop_duplicates('item_completo')
-                        .set_index('item_completo')['precio_unitario']
-            )
-
-            mask_precio = df_filtrado_copy['precio_unitario_inferido'].isna()
-            df_filtrado_copy.loc[mask_precio, 'precio_unitario_inferido'] = (
-                df_filtrado_copy.loc[mask_precio, 'ITEM'].map(precio_por_item)
-            )
-
-            # Cast a float
-            df_filtrado_copy['qty_add_to_cart'] = df_filtrado_copy['qty_add_to_cart'].astype(float)
-            df_filtrado_copy['qty_begin_checkout'] = df_filtrado_copy['qty_begin_checkout'].astype(float)
-            df_filtrado_copy['qty_purchase'] = df_filtrado_copy['qty_purchase'].astype(float)
-            df_filtrado_copy['precio_unitario_inferido'] = df_filtrado_copy['precio_unitario_inferido'].astype(float)
-
-            # Montos
-            df_filtrado_copy['MONTO_ADD_TO_CART'] = (
-                df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_add_to_cart']
-            )
-            df_filtrado_copy['MONTO_BEGIN_CHECKOUT'] = (
-                df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_begin_checkout']
-            )
-            df_filtrado_copy['MONTO_PURCHASE'] = (
-                df_filtrado_copy['precio_unitario_inferido'] * df_filtrado_copy['qty_purchase']
-            )
-
-            df_filtrado_copy.to_csv(OUTPUT_CSV_FUNNEL, index=False)
-            logger.info("Archivo funnel completo guardado: %s", OUTPUT_CSV_FUNNEL)
+        with _time_block("Limpieza ITEM, inferencia precio_unitario, montos y guardado Parquet funnel"):
+            if desde_parquet is not None:
+                # Ya limpio: limpiar_items no es idempotente para todos los prefijos
+                df_filtrado_copy = leer_parquet(desde_parquet)
+                logger.info("Funnel leído de %s", desde_parquet)
+            else:
+                df_filtrado_copy = limpiar_funnel(df_patrones_funnel_completo, df_sorteo)
+
+                limpiar_salida(SALIDA_PARQUET_FUNNEL)
+                escribir_parquet(df_filtrado_copy, SALIDA_PARQUET_FUNNEL, nombre="df_filtrado_copy")
+                logger.info("Funnel completo guardado: %s", SALIDA_PARQUET_FUNNEL)
+                if guardar_csv:
+                    df_filtrado_copy.to_csv(OUTPUT_CSV_FUNNEL, index=False)
+                    logger.info("Archivo funnel completo guardado: %s", OUTPUT_CSV_FUNNEL)
             logger.info(_df_stats(df_filtrado_copy, "df_filtrado_copy"))
 
         # Agregar nivel sesión + KPIs
         with _time_block("Agregación nivel sesión + KPIs"):
-            df_sesiones = (
-                df_filtrado_copy
-                .groupby(["user_pseudo_id", "session_id"], as_index=False)
-                .agg({
-                    "categoria_login": "first",
-                    "MONTO_BEGIN_CHECKOUT": "sum",
-                    "MONTO_PURCHASE": "sum",
-                    "PATRON_BEGIN_CHECKOUT": lambda s: (s == "SI").any(),
-                })
-            )
-
-            # OJO: aquí usas el mismo texto que venga en tus datos ("SIN LOGIN EN SESIÓN" / "SIN LOGIN EN SESION")
-            df_sesiones["tiene_login"] = df_sesiones["categoria_login"] != "SIN LOGIN EN SESIÓN"
-            df_sesiones["tiene_purchase"] = df_sesiones["MONTO_PURCHASE"] > 0
-            df_sesiones["tiene_patron_bc"] = df_sesiones["PATRON_BEGIN_CHECKOUT"]
-            df_sesiones["es_sin_registro_con_purchase"] = (
-                (df_sesiones["categoria_login"] == "SIN LOGIN EN SESIÓN")
-                & df_sesiones["tiene_purchase"]
-            )
+            # Índice de sesiones: un solo ordenamiento, reutilizado por los flags por sesión
+            indice_sesiones, df_sesiones = agregar_sesiones(df_filtrado_copy)
 
             # 1) Total sesiones
             total_sesiones_count = len(df_sesiones)
@@ -426,19 +309,13 @@ def main():
         with _time_block("Análisis promos simples/combinadas por fila y sesión"):
             df_flags = df_filtrado_copy.copy()
 
-            # Flags fila a fila
-            df_flags["HAS_SIMPLE_INCOMPLETE"] = df_flags.apply(
-                has_simple_incomplete, axis=1, promos_multi=promos_multi
-            )
-            df_flags["HAS_COMBINED_INCOMPLETE"] = df_flags.apply(
-                has_combined_incomplete, axis=1, promos_multi=promos_multi
-            )
-            df_flags["HAS_SIMPLE_COMPLETA"] = df_flags.apply(
-                has_simple_complete, axis=1, promos_multi=promos_multi
-            )
-            df_flags["HAS_COMBINED_COMPLETA"] = df_flags.apply(
-                has_combined_complete, axis=1, promos_multi=promos_multi
+            # Flags fila a fila: un solo explode (CSR) de las columnas ADD_TO_CART
+            promos_flags = TablaPromos.desde_df(
+                df_flags, ["PROMOS_ADD_CART_INCOMPLETAS", "PROMOS_ADD_CART_COMPLETAS"]
             )
+            flags_fila = flags_simples_combinadas(promos_flags, promos_multi)
+            for nombre, valores in flags_fila.items():
+                df_flags[nombre] = valores
 
             total_filas_flags = len(df_flags)
             logger.info("=== RESUMEN FILAS (ADD_TO_CART) ===")
@@ -451,18 +328,8 @@ def main():
                         len(df_flags[(df_flags["HAS_SIMPLE_INCOMPLETE"])
                                      & (df_flags["HAS_COMBINED_INCOMPLETE"])]))
 
-            # Agregación a nivel sesión
-            sesion_flags = (
-                df_flags
-                .groupby(["user_pseudo_id", "session_id"])
-                .agg(
-                    HAS_SIMPLE_INCOMPLETE_SESION=("HAS_SIMPLE_INCOMPLETE", "any"),
-                    HAS_COMBINED_INCOMPLETE_SESION=("HAS_COMBINED_INCOMPLETE", "any"),
-                    HAS_SIMPLE_COMPLETA_SESION=("HAS_SIMPLE_COMPLETA", "any"),
-                    HAS_COMBINED_COMPLETA_SESION=("HAS_COMBINED_COMPLETA", "any"),
-                )
-                .reset_index()
-            )
+            # Agregación a nivel sesión (reutiliza los arreglos de flags por fila)
+            sesion_flags = flags_por_sesion(df_flags, flags_fila, indice=indice_sesiones)
 
             total_sesiones_flags = len(sesion_flags)
 
@@ -570,4 +437,15 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="H1 post-proceso patrones")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="no leer ni escribir la caché local de queries")
+    parser.add_argument("--refresh", action="store_true",
+                        help="ignorar la caché de queries y reescribirla con resultados nuevos")
+    parser.add_argument("--csv", action="store_true",
+                        help="además del Parquet, escribir el CSV del funnel")
+    parser.add_argument("--desde-parquet", type=Path, default=None, metavar="CARPETA",
+                        help="leer el funnel limpio de una salida Parquet en lugar de BigQuery")
+    args = parser.parse_args()
+    main(usar_cache=not args.no_cache, refrescar_cache=args.refresh, guardar_csv=args.csv or GUARDAR_CSV,
+         desde_parquet=args.desde_parquet)
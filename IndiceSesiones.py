@@ -0,0 +1,99 @@
+"""
+Índice de sesiones: un solo ordenamiento por (USER, SESION) compartido por las pasadas a nivel sesión.
+
+En lugar de `groupby(claves)` (que arma un DataFrame por sesión) se factorizan las
+claves una vez, se ordenan las filas por código de sesión (estable: dentro de cada
+sesión se conserva el orden original) y se guardan los offsets de inicio/fin.
+Cada pasada lee rebanadas contiguas de arreglos NumPy:
+
+    indice = IndiceSesiones.desde_df(df, ["USER", "SESION"])
+    valores = indice.tomar(df["CANTIDAD_PURCHASE"])
+    for i in range(len(indice)):
+        valores[indice.offsets[i]:indice.offsets[i + 1]]
+
+Las sesiones quedan en el orden de `groupby(claves, sort=True)` y las filas con
+alguna clave nula se descartan, igual que en groupby.
+Lo usan la detección fila por fila, los KPIs por sesión y los flags por sesión
+de H1Script y H1ShortScript.
+"""
+import numpy as np
+import pandas as pd
+
+
+class IndiceSesiones:
+    """
+    - `codigos`: sesión de cada fila del DataFrame original (-1 si alguna clave es nula).
+    - `orden`: posiciones de las filas con sesión, ordenadas por sesión.
+    - `offsets`: las filas de la sesión i son orden[offsets[i]:offsets[i + 1]].
+    - `sesiones`: DataFrame con las claves de cada sesión (una fila por sesión).
+    """
+
+    def __init__(self, codigos: np.ndarray, claves_df: pd.DataFrame):
+        self.codigos = np.asarray(codigos, dtype="int64")
+        posiciones = np.flatnonzero(self.codigos >= 0)
+        self.orden = posiciones[np.argsort(self.codigos[posiciones], kind="stable")]
+        n_sesiones = int(self.codigos.max()) + 1 if len(posiciones) else 0
+        self.offsets = np.zeros(n_sesiones + 1, dtype="int64")
+        np.cumsum(np.bincount(self.codigos[posiciones], minlength=n_sesiones), out=self.offsets[1:])
+        self.sesiones = claves_df.iloc[self.primeras].reset_index(drop=True)
+
+    @classmethod
+    def desde_df(cls, df: pd.DataFrame, claves) -> "IndiceSesiones":
+        """Factoriza cada clave (ordenada) y combina los códigos en un código de sesión."""
+        claves = list(claves)
+        combinado = np.zeros(len(df), dtype="int64")
+        validos = np.ones(len(df), dtype=bool)
+        for clave in claves:
+            codigos, niveles = pd.factorize(df[clave], sort=True)
+            validos &= codigos >= 0
+            combinado = combinado * max(len(niveles), 1) + np.maximum(codigos, 0)
+            # Recompactar para que el código combinado no crezca con el producto de cardinalidades
+            _, combinado = np.unique(combinado, return_inverse=True)
+
+        codigos = np.full(len(df), -1, dtype="int64")
+        if validos.any():
+            _, codigos[validos] = np.unique(combinado[validos], return_inverse=True)
+        return cls(codigos, df[claves])
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def primeras(self) -> np.ndarray:
+        """Posición (en el DataFrame original) de la primera fila de cada sesión."""
+        return self.orden[self.offsets[:-1]]
+
+    def tomar(self, valores) -> np.ndarray:
+        """Valores por fila reordenados por sesión (solo filas con sesión)."""
+        if isinstance(valores, pd.Series):
+            valores = valores.to_numpy()
+        return np.asarray(valores)[self.orden]
+
+    def tomar_lista(self, serie: pd.Series) -> list:
+        """Como `tomar`, pero como lista de escalares de Python/pandas (Timestamp, NA) para el motor fila."""
+        return serie.take(self.orden).tolist()
+
+    def sumar(self, valores) -> np.ndarray:
+        """Suma por sesión ignorando nulos (como groupby.sum)."""
+        valores = np.nan_to_num(self.tomar(pd.to_numeric(pd.Series(valores), errors="coerce").astype("float64")))
+        if len(self) == 0:
+            return np.zeros(0, dtype="float64")
+        return np.add.reduceat(valores, self.offsets[:-1])
+
+    def alguno(self, valores) -> np.ndarray:
+        """`any` por sesión de un arreglo booleano por fila."""
+        valores = self.tomar(np.asarray(valores, dtype=bool))
+        if len(self) == 0:
+            return np.zeros(0, dtype=bool)
+        return np.logical_or.reduceat(valores, self.offsets[:-1])
+
+    def primero_valido(self, serie: pd.Series) -> pd.Series:
+        """Primer valor no nulo de cada sesión (como groupby.first); nulo si la sesión no tiene ninguno."""
+        ordenada = serie.take(self.orden).reset_index(drop=True)
+        if len(self) == 0:
+            return ordenada.iloc[:0]
+        posicion = np.where(ordenada.notna().to_numpy(), np.arange(len(ordenada)), len(ordenada))
+        primera = np.minimum.reduceat(posicion, self.offsets[:-1])
+        hay = primera < len(ordenada)
+        resultado = ordenada.iloc[np.where(hay, primera, self.offsets[:-1])].reset_index(drop=True)
+        return resultado.where(hay)
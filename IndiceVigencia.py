@@ -0,0 +1,169 @@
+"""
+Índice de intervalos para la vigencia de promociones (vigencia_promo).
+
+Se construye una sola vez a partir de `df_fechas_promocion` y responde en bloque
+"¿qué promos están activas en estos N timestamps?", sustituyendo las
+comparaciones escalares `inicio <= fecha_evento <= cierre` del ciclo de detección.
+"""
+import numpy as np
+import pandas as pd
+
+
+_NAT = np.datetime64("NaT", "ns")
+_UN_NS = np.timedelta64(1, "ns")
+
+
+def _a_datetime(valores) -> np.ndarray:
+    return pd.to_datetime(pd.Series(valores, dtype="object"), errors="coerce").to_numpy(dtype="datetime64[ns]")
+
+
+class IndiceVigencia:
+    """
+    Vigencia [inicio, cierre] (ambos inclusive) por promoción.
+    - `pids`, `inicios`, `cierres`: arreglos ordenados por id de promo.
+    - Los cortes de todos los intervalos parten el tiempo en segmentos elementales;
+      dentro de cada segmento el conjunto de promos activas es constante y se
+      guarda en formato CSR (`_seg_offsets`, `_seg_pids`).
+    Se puede usar como el dict original: `vigencia_promo.get(pid, (NaT, NaT))`.
+    """
+
+    def __init__(self, pids, inicios, cierres):
+        pids = np.asarray(pids, dtype="int64")
+        orden = np.argsort(pids, kind="stable")
+        self.pids = pids[orden]
+        self.inicios = np.asarray(inicios, dtype="datetime64[ns]")[orden]
+        self.cierres = np.asarray(cierres, dtype="datetime64[ns]")[orden]
+        self._construir_segmentos()
+
+    @classmethod
+    def desde_df(
+        cls,
+        df_fechas_promocion: pd.DataFrame,
+        col_pid: str = "clave_promocion",
+        col_inicio: str = "d_inicio_promocion",
+        col_cierre: str = "d_cierre_promocion",
+    ) -> "IndiceVigencia":
+        """Construcción vectorizada; si una promo se repite, gana la última fila (igual que el dict)."""
+        df = df_fechas_promocion[[col_pid, col_inicio, col_cierre]].copy()
+        df[col_pid] = pd.to_numeric(df[col_pid], errors="coerce")
+        df[col_inicio] = pd.to_datetime(df[col_inicio], errors="coerce")
+        df[col_cierre] = pd.to_datetime(df[col_cierre], errors="coerce")
+        df = (
+            df.drop_duplicates()
+            .dropna(subset=[col_pid])
+            .drop_duplicates(subset=[col_pid], keep="last")
+        )
+        return cls(
+            df[col_pid].to_numpy(dtype="int64"),
+            df[col_inicio].to_numpy(dtype="datetime64[ns]"),
+            df[col_cierre].to_numpy(dtype="datetime64[ns]"),
+        )
+
+    @classmethod
+    def desde_dict(cls, vigencia: dict) -> "IndiceVigencia":
+        """Construye desde {pid: (inicio, cierre)}."""
+        return cls(
+            [int(p) for p in vigencia.keys()],
+            _a_datetime([v[0] for v in vigencia.values()]),
+            _a_datetime([v[1] for v in vigencia.values()]),
+        )
+
+    def _construir_segmentos(self):
+        validos = ~np.isnat(self.inicios) & ~np.isnat(self.cierres) & (self.inicios <= self.cierres)
+        self._cortes = np.unique(np.concatenate([self.inicios[validos], self.cierres[validos] + _UN_NS]))
+
+        # Segmento k (k >= 0) cubre [cortes[k], cortes[k + 1]); antes del primer corte no hay promos.
+        # La promo cubre los segmentos [desde, hasta): sus dos cortes están en `_cortes`.
+        desde = np.searchsorted(self._cortes, self.inicios[validos])
+        hasta = np.searchsorted(self._cortes, self.cierres[validos] + _UN_NS)
+        n_seg = len(self._cortes)
+        por_segmento = np.cumsum(np.bincount(desde, minlength=n_seg + 1) - np.bincount(hasta, minlength=n_seg + 1))
+        self._seg_offsets = np.concatenate([[0], np.cumsum(por_segmento[:-1])]).astype("int64")
+
+        # Un renglón por (promo, segmento) en orden de pid; el orden estable por segmento
+        # deja los pids ordenados dentro de cada segmento
+        largos = hasta - desde
+        inicio_promo = np.cumsum(largos) - largos
+        seg = np.repeat(desde - inicio_promo, largos) + np.arange(largos.sum())
+        self._seg_pids = np.repeat(self.pids[validos], largos)[np.argsort(seg, kind="stable")]
+        self._seg_sets = [None] * len(self._cortes)
+
+    # ----------------------------
+    # Interfaz tipo dict
+    # ----------------------------
+    def __len__(self) -> int:
+        return len(self.pids)
+
+    def __contains__(self, pid) -> bool:
+        return self._posicion(pid) >= 0
+
+    def _posicion(self, pid) -> int:
+        if pd.isna(pid):
+            return -1
+        pos = int(np.searchsorted(self.pids, int(pid)))
+        return pos if pos < len(self.pids) and self.pids[pos] == int(pid) else -1
+
+    def get(self, pid, default=(pd.NaT, pd.NaT)):
+        pos = self._posicion(pid)
+        if pos < 0:
+            return default
+        return pd.Timestamp(self.inicios[pos]), pd.Timestamp(self.cierres[pos])
+
+    def items(self):
+        for pos, pid in enumerate(self.pids.tolist()):
+            yield pid, (pd.Timestamp(self.inicios[pos]), pd.Timestamp(self.cierres[pos]))
+
+    # ----------------------------
+    # Consultas en bloque
+    # ----------------------------
+    def intervalos(self, pids):
+        """(inicios, cierres) de cada pid; NaT si la promo no tiene vigencia."""
+        pids = np.asarray(pids, dtype="int64")
+        if len(self.pids) == 0:
+            vacio = np.full(len(pids), _NAT, dtype="datetime64[ns]")
+            return vacio, vacio.copy()
+        pos = np.minimum(np.searchsorted(self.pids, pids), len(self.pids) - 1)
+        existe = self.pids[pos] == pids
+        inicios = np.where(existe, self.inicios[pos], _NAT)
+        cierres = np.where(existe, self.cierres[pos], _NAT)
+        return inicios, cierres
+
+    def activas(self, pids, fechas) -> np.ndarray:
+        """¿La promo `pids[i]` está vigente en `fechas[i]`? (NaT nunca está vigente)."""
+        inicios, cierres = self.intervalos(pids)
+        fechas = np.asarray(fechas, dtype="datetime64[ns]")
+        return (inicios <= fechas) & (fechas <= cierres)
+
+    def segmentos(self, fechas) -> np.ndarray:
+        """Segmento elemental de cada fecha (-1: ninguna promo activa o NaT)."""
+        fechas = np.asarray(fechas, dtype="datetime64[ns]")
+        seg = np.searchsorted(self._cortes, fechas, side="right") - 1
+        seg[np.isnat(fechas)] = -1
+        return seg
+
+    def promos_activas_en(self, fechas):
+        """
+        Promos activas en cada una de N fechas, en formato CSR:
+        regresa (offsets, pids) con las promos de la fecha i en pids[offsets[i]:offsets[i + 1]].
+        """
+        seg = self.segmentos(fechas)
+        con_seg = seg >= 0
+        inicio = np.where(con_seg, self._seg_offsets[np.maximum(seg, 0)], 0)
+        fin = np.where(con_seg, self._seg_offsets[np.maximum(seg, 0) + 1], 0)
+        largos = fin - inicio
+        offsets = np.concatenate([[0], np.cumsum(largos)])
+        desfase = np.arange(offsets[-1]) - np.repeat(offsets[:-1], largos)
+        return offsets, self._seg_pids[np.repeat(inicio, largos) + desfase]
+
+    def promos_activas(self, fecha) -> frozenset:
+        """Conjunto de promos activas en una sola fecha (cacheado por segmento)."""
+        if pd.isna(fecha):
+            return frozenset()
+        seg = int(self.segmentos(np.asarray([fecha], dtype="datetime64[ns]"))[0])
+        if seg < 0:
+            return frozenset()
+        if self._seg_sets[seg] is None:
+            self._seg_sets[seg] = frozenset(
+                self._seg_pids[self._seg_offsets[seg]:self._seg_offsets[seg + 1]].tolist()
+            )
+        return self._seg_sets[seg]
@@ -0,0 +1,135 @@
+"""
+Ingesta por lotes (streaming) de los intentos GA4.
+
+El resultado de `ga4_events.sql` se lee como record batches de Arrow ordenados por
+(USER, SESION) y se reagrupa en DataFrames de tamaño acotado que nunca parten una
+sesión entre dos lotes; así el enriquecimiento y la detección se pueden correr lote
+por lote con memoria pico constante, sin importar el tamaño de la ventana de fechas.
+
+Fuentes:
+- `lotes_bigquery`: BigQuery Storage Read API (google-cloud-bigquery-storage).
+- `lotes_archivo_arrow`: archivo Arrow IPC local (sustituye a BigQuery en pruebas).
+"""
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from LecturaArrow import cliente_storage, tabla_a_df
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+CLAVES_SESION = ("USER", "SESION")
+FILAS_POR_LOTE = 500_000
+
+
+def ordenar_por_sesion(query: str, claves=CLAVES_SESION) -> str:
+    """Envuelve la query con ORDER BY por sesión (con ORDER BY la lectura conserva el orden)."""
+    return f"SELECT * FROM (\n{query}\n)\nORDER BY {', '.join(claves)}"
+
+
+def lotes_bigquery(client, query: str, credentials=None) -> Iterator[pa.RecordBatch]:
+    """
+    Ejecuta la query y regresa sus filas como record batches de Arrow.
+    Usa la Storage Read API si google-cloud-bigquery-storage está instalado;
+    si no, cae a la paginación REST del cliente.
+    """
+    bqstorage_client = cliente_storage(credentials)
+    filas = client.query(query).result()
+    logger.info("Filas a leer por streaming: %s", filas.total_rows)
+    yield from filas.to_arrow_iterable(bqstorage_client=bqstorage_client)
+
+
+def lotes_archivo_arrow(path) -> Iterator[pa.RecordBatch]:
+    """Record batches de un archivo Arrow IPC local (formato file o stream)."""
+    with pa.memory_map(str(path), "r") as fuente:
+        try:
+            lector = ipc.open_file(fuente)
+        except pa.ArrowInvalid:
+            fuente.seek(0)
+            yield from ipc.open_stream(fuente)
+            return
+        for i in range(lector.num_record_batches):
+            yield lector.get_batch(i)
+
+
+def guardar_archivo_arrow(df: pd.DataFrame, path, filas_por_batch: int = 65_536) -> Path:
+    """Escribe `df` como archivo Arrow IPC (p. ej. un extracto de GA4 para correr sin BigQuery)."""
+    path = Path(path)
+    tabla = pa.Table.from_pandas(df, preserve_index=False)
+    with ipc.new_file(str(path), tabla.schema) as escritor:
+        escritor.write_table(tabla, max_chunksize=filas_por_batch)
+    return path
+
+
+def _inicio_ultima_sesion(tabla: pa.Table, claves) -> int:
+    """Posición de la primera fila de la última sesión de `tabla` (ordenada por `claves`)."""
+    misma = None
+    for clave in claves:
+        columna = tabla.column(clave)
+        ultimo = columna[len(columna) - 1]
+        if ultimo.is_valid:
+            igual = pc.fill_null(pc.equal(columna, ultimo), False)
+        else:
+            igual = pc.is_null(columna)
+        misma = igual if misma is None else pc.and_(misma, igual)
+    distintas = np.flatnonzero(~misma.to_numpy(zero_copy_only=False))
+    return int(distintas[-1]) + 1 if len(distintas) else 0
+
+
+def lotes_por_sesion(
+    batches: Iterable[pa.RecordBatch],
+    filas_por_lote: int = FILAS_POR_LOTE,
+    claves=CLAVES_SESION,
+    dtypes: Optional[dict] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Reagrupa record batches ordenados por `claves` en DataFrames de al menos
+    `filas_por_lote` filas (salvo el último), cortando siempre en frontera de sesión:
+    la última sesión de cada lote se arrastra al siguiente por si continúa ahí.
+    Cada lote se convierte con `dtypes` (ver LecturaArrow.tabla_a_df).
+    """
+    pendientes = []
+    n_pendientes = 0
+    for batch in batches:
+        if batch.num_rows == 0:
+            continue
+        pendientes.append(batch)
+        n_pendientes += batch.num_rows
+        if n_pendientes < filas_por_lote:
+            continue
+
+        tabla = pa.Table.from_batches(pendientes)
+        corte = _inicio_ultima_sesion(tabla, claves)
+        if corte == 0:
+            # Una sola sesión ocupa todo lo pendiente: seguir acumulando
+            continue
+        yield tabla_a_df(tabla.slice(0, corte), dtypes)
+        resto = tabla.slice(corte)
+        pendientes = resto.to_batches()
+        n_pendientes = resto.num_rows
+
+    if n_pendientes:
+        yield tabla_a_df(pa.Table.from_batches(pendientes), dtypes)
+
+
+def lotes_eventos(
+    client=None,
+    query: Optional[str] = None,
+    archivo_arrow=None,
+    credentials=None,
+    filas_por_lote: int = FILAS_POR_LOTE,
+    dtypes: Optional[dict] = None,
+) -> Iterator[pd.DataFrame]:
+    """Lotes de intentos GA4 sin sesiones partidas, desde un archivo Arrow local o desde BigQuery."""
+    if archivo_arrow is not None:
+        logger.info("Fuente streaming: archivo Arrow %s", archivo_arrow)
+        batches = lotes_archivo_arrow(archivo_arrow)
+    else:
+        batches = lotes_bigquery(client, ordenar_por_sesion(query), credentials=credentials)
+    yield from lotes_por_sesion(batches, filas_por_lote=filas_por_lote, dtypes=dtypes)
@@ -0,0 +1,139 @@
+"""
+Lectura tipada de queries de BigQuery vía Arrow (compartida por H1Script y H1ShortScript).
+
+`job.to_dataframe()` deja los textos como objetos de Python y las cantidades como Int64.
+`leer_query` descarga el resultado como tabla de Arrow (Storage Read API si
+google-cloud-bigquery-storage está instalado) y la convierte a pandas con un mapa de
+dtypes por query:
+
+- "category": textos de baja cardinalidad (dispositivo, geo, tráfico, STATUS, SI/NO);
+  se codifican como diccionario en Arrow, sin pasar por objetos de Python.
+- STRING (string[pyarrow]): textos de alta cardinalidad (USER, ITEM, DATETIME).
+- "Int16" / "Int32": cantidades y contadores como enteros nulables pequeños.
+- DATETIME / TIMESTAMP llegan ya como datetime64 desde Arrow; las columnas DATE se
+  dejan como fechas (igual que `to_dataframe`) porque el esquema de carga las espera así.
+
+Se registran filas, bytes transferidos (tamaño de la tabla Arrow), tiempo de descarga,
+tiempo de decodificación y memoria del DataFrame resultante.
+"""
+import logging
+from time import perf_counter
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+STRING = pd.StringDtype("pyarrow")
+
+# Mismos dtypes que `job.to_dataframe()` (INTEGER -> Int64, BOOLEAN -> boolean)
+TIPOS_PANDAS = {
+    pa.int64(): pd.Int64Dtype(),
+    pa.bool_(): pd.BooleanDtype(),
+}
+
+_DIMENSIONES = {
+    "device_category": "category",
+    "geo_country": "category",
+    "geo_region": "category",
+    "geo_city": "category",
+    "traffic_source": "category",
+    "traffic_medium": "category",
+    "STATUS": "category",
+}
+
+# ga4_events.sql (extracción GA4)
+DTYPES_GA4_EVENTS = {
+    "USER": STRING,
+    "DATETIME": STRING,
+    "ITEM": STRING,
+    "INTENTO": "Int32",
+    **_DIMENSIONES,
+    "CANTIDAD_ADD_TO_CART": "Int16",
+    "CANTIDAD_BEGIN_CHECKOUT": "Int16",
+    "CANTIDAD_PURCHASE": "Int16",
+    "TRANSACTION_ID": STRING,
+}
+
+# patrones_funnel_completo.sql (post-proceso y KPIs)
+DTYPES_FUNNEL_COMPLETO = {
+    "user_pseudo_id": STRING,
+    "intento": "Int32",
+    "ITEM": STRING,
+    "datetime_str": STRING,
+    "TRANSACTION_ID": STRING,
+    **_DIMENSIONES,
+    "qty_add_to_cart": "Int16",
+    "qty_begin_checkout": "Int16",
+    "qty_purchase": "Int16",
+    "PATRON_ADD_CART": "category",
+    "PATRON_BEGIN_CHECKOUT": "category",
+    "PATRON_PURCHASE": "category",
+    "TIENE_PATRON_COMPLETO": "category",
+    "TIENE_PATRON_INCOMPLETO": "category",
+    "categoria_login": "category",
+    "login_bucket_bc": "category",
+    "event_count": "Int32",
+}
+
+# Mapa de dtypes por query (nombre del .sql en Data/queries)
+DTYPES_QUERY = {
+    "ga4_events": DTYPES_GA4_EVENTS,
+    "patrones_funnel_completo": DTYPES_FUNNEL_COMPLETO,
+}
+
+
+def cliente_storage(credentials=None):
+    """BigQueryReadClient si google-cloud-bigquery-storage está instalado; si no, None (paginación REST)."""
+    try:
+        from google.cloud import bigquery_storage
+    except ImportError:
+        logger.warning("google-cloud-bigquery-storage no disponible; lectura por páginas REST")
+        return None
+    return bigquery_storage.BigQueryReadClient(credentials=credentials)
+
+
+def tabla_a_df(tabla: pa.Table, dtypes: Optional[dict] = None) -> pd.DataFrame:
+    """
+    Convierte una tabla de Arrow a DataFrame aplicando `dtypes` ({columna: dtype});
+    las columnas fuera del mapa quedan como en `to_dataframe`. Las columnas del mapa
+    que no vengan en la tabla se ignoran.
+    """
+    dtypes = {col: dtype for col, dtype in (dtypes or {}).items() if col in tabla.column_names}
+    for col, dtype in dtypes.items():
+        if dtype == "category" and pa.types.is_string(tabla.schema.field(col).type):
+            i = tabla.schema.get_field_index(col)
+            tabla = tabla.set_column(i, col, pc.dictionary_encode(tabla.column(i)))
+    df = tabla.to_pandas(types_mapper=TIPOS_PANDAS.get)
+    restantes = {col: dtype for col, dtype in dtypes.items() if df[col].dtype != dtype}
+    return df.astype(restantes) if restantes else df
+
+
+def leer_query(client, query: str, dtypes: Optional[dict] = None, bqstorage_client=None,
+               nombre: str = "query") -> pd.DataFrame:
+    """Ejecuta un SELECT y lo regresa como DataFrame tipado (ver `tabla_a_df`)."""
+    return leer_resultado(client.query(query), dtypes, bqstorage_client=bqstorage_client, nombre=nombre)
+
+
+def leer_resultado(job, dtypes: Optional[dict] = None, bqstorage_client=None,
+                   nombre: str = "query") -> pd.DataFrame:
+    """Espera un job de query ya enviado y descarga su resultado como DataFrame tipado."""
+    t0 = perf_counter()
+    filas = job.result()
+    tabla = filas.to_arrow(bqstorage_client=bqstorage_client)
+    t_descarga = perf_counter() - t0
+
+    t0 = perf_counter()
+    df = tabla_a_df(tabla, dtypes)
+    t_decodificacion = perf_counter() - t0
+
+    logger.info(
+        "%s: %d filas, %.1f MB Arrow transferidos (%s), descarga %.2fs, decodificación %.2fs, DataFrame %.1f MB",
+        nombre, tabla.num_rows, tabla.nbytes / (1024 ** 2),
+        "Storage API" if bqstorage_client is not None else "REST",
+        t_descarga, t_decodificacion, df.memory_usage(deep=True).sum() / (1024 ** 2),
+    )
+    return df
@@ -0,0 +1,191 @@
+"""
+Ejecución de los DDL base (base_patrones, complemento_funnel) solo cuando cambian sus fuentes.
+
+Cada DDL es un `CREATE OR REPLACE TABLE` que recorre 15 meses de `events_*`. El manifiesto
+(JSON local) guarda, por DDL, la huella con la que se construyó su tabla:
+
+- hash del SQL (cambiar la query o el rango de fechas obliga a reconstruir);
+- tablas fuente: para un comodín (`events_*`, `events_intraday_*`) el conjunto de tablas
+  diarias `<prefijo>YYYYMMDD` dentro del rango `_TABLE_SUFFIX BETWEEN` del propio SQL con su
+  última modificación (un día nuevo, re-exportado o borrado cambia la huella); para una tabla
+  normal, su última modificación.
+
+`pendientes` regresa los DDL que hay que correr (sin manifiesto, SQL o fuentes distintas,
+tabla destino inexistente o `forzar`); `registrar` guarda la huella después de que el DDL
+terminó bien. La huella se toma antes de correr el DDL, así que un día que llegue durante la
+construcción provoca otra reconstrucción en la siguiente corrida. Si no se pueden leer los
+metadatos, el DDL se corre y no se registra.
+
+Los metadatos vienen de `MetadatosBigQuery` (una consulta a `__TABLES__` por dataset) o de
+cualquier objeto con la misma interfaz (p. ej. benchmarks.ClienteFalso.MetadatosFalsos).
+"""
+import hashlib
+import json
+import logging
+import os
+import re
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Optional
+
+from CacheConsultas import tablas_fuente
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+VERSION_MANIFIESTO = 1
+
+_DESTINO_DDL = re.compile(r"CREATE\s+(?:OR\s+REPLACE\s+)?TABLE\s+`?([\w-]+\.[\w-]+\.[\w$-]+)`?", re.IGNORECASE)
+_RANGO_SUFIJO = re.compile(r"_TABLE_SUFFIX\s+BETWEEN\s+'(\d{8})'\s+AND\s+'(\d{8})'", re.IGNORECASE)
+_SUFIJO_DIARIO = re.compile(r"\d{8}")
+
+
+def destino_ddl(sql: str) -> Optional[str]:
+    """Tabla que crea el DDL (`CREATE [OR REPLACE] TABLE proyecto.dataset.tabla`)."""
+    m = _DESTINO_DDL.search(sql)
+    return m.group(1) if m else None
+
+
+def rango_sufijos(sql: str):
+    """(desde, hasta) del primer `_TABLE_SUFFIX BETWEEN 'AAAAMMDD' AND 'AAAAMMDD'`; None si no hay."""
+    m = _RANGO_SUFIJO.search(sql)
+    return (m.group(1), m.group(2)) if m else None
+
+
+class MetadatosBigQuery:
+    """Metadatos de tablas vía el cliente de BigQuery."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def tablas(self, dataset: str, prefijo: str) -> dict:
+        """{table_id: última modificación ISO} de las tablas de `proyecto.dataset` que empiezan con `prefijo`."""
+        sql = (f"SELECT table_id, last_modified_time FROM `{dataset}.__TABLES__` "
+               f"WHERE STARTS_WITH(table_id, '{prefijo}')")
+        filas = self.client.query(sql).result()
+        return {
+            fila["table_id"]: datetime.fromtimestamp(fila["last_modified_time"] / 1000, tz=timezone.utc).isoformat()
+            for fila in filas
+        }
+
+    def modificacion(self, tabla: str) -> Optional[str]:
+        """Última modificación ISO de `tabla`; None si no existe."""
+        try:
+            meta = self.client.get_table(tabla)
+        except Exception as e:
+            if getattr(e, "code", None) == 404 or type(e).__name__ == "NotFound":
+                return None
+            raise
+        return meta.modified.isoformat() if meta.modified is not None else None
+
+
+def _hash_sql(sql: str) -> str:
+    return hashlib.sha256(sql.encode("utf-8")).hexdigest()[:24]
+
+
+def _cambios(anteriores: dict, actuales: dict) -> str:
+    """Resumen de diferencias entre dos {tabla: modificación}."""
+    nuevas = len(actuales.keys() - anteriores.keys())
+    borradas = len(anteriores.keys() - actuales.keys())
+    modificadas = sum(1 for t in actuales.keys() & anteriores.keys() if actuales[t] != anteriores[t])
+    return f"{nuevas} nuevas, {modificadas} modificadas, {borradas} eliminadas"
+
+
+class ManifiestoDDL:
+    """Huellas {nombre: {destino, sql, fuentes, construido}} de los DDL en un JSON local."""
+
+    def __init__(self, ruta, metadatos, forzar: bool = False):
+        self.ruta = Path(ruta)
+        self.metadatos = metadatos
+        self.forzar = forzar
+        self._estado = self._cargar()
+        self._huellas = {}
+
+    def _cargar(self) -> dict:
+        if not self.ruta.exists():
+            return {}
+        try:
+            estado = json.loads(self.ruta.read_text(encoding="utf-8"))
+        except (OSError, ValueError) as e:
+            logger.warning("Manifiesto de DDL ilegible (%s): %s; se reconstruye todo", self.ruta, e)
+            return {}
+        if estado.get("version") != VERSION_MANIFIESTO:
+            return {}
+        return estado.get("ddl", {})
+
+    def _guardar(self) -> None:
+        self.ruta.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.ruta.with_suffix(self.ruta.suffix + ".tmp")
+        tmp.write_text(json.dumps({"version": VERSION_MANIFIESTO, "ddl": self._estado}, indent=2, sort_keys=True),
+                       encoding="utf-8")
+        os.replace(tmp, self.ruta)
+
+    def huella_fuentes(self, sql: str) -> dict:
+        """{tabla: última modificación} de las fuentes del DDL (comodines expandidos a tablas diarias)."""
+        destino = destino_ddl(sql)
+        rango = rango_sufijos(sql)
+        huella = {}
+        for tabla in tablas_fuente(sql):
+            if tabla == destino:
+                continue
+            if tabla.endswith("*"):
+                dataset, prefijo = tabla.rsplit(".", 1)
+                prefijo = prefijo[:-1]
+                for table_id, modificada in self.metadatos.tablas(dataset, prefijo).items():
+                    sufijo = table_id[len(prefijo):]
+                    # events_* también cubre events_intraday_*: solo cuentan los sufijos AAAAMMDD del rango
+                    if not _SUFIJO_DIARIO.fullmatch(sufijo):
+                        continue
+                    if rango is not None and not rango[0] <= sufijo <= rango[1]:
+                        continue
+                    huella[f"{dataset}.{table_id}"] = modificada
+            else:
+                huella[tabla] = self.metadatos.modificacion(tabla)
+        return huella
+
+    def necesita(self, nombre: str, sql: str):
+        """(hay que correr el DDL, motivo). La huella actual queda lista para `registrar`."""
+        try:
+            huella = {"sql": _hash_sql(sql), "fuentes": self.huella_fuentes(sql)}
+            destino = destino_ddl(sql)
+            existe = destino is None or self.metadatos.modificacion(destino) is not None
+        except Exception as e:
+            logger.warning("Sin metadatos para %s (%s); se ejecuta el DDL", nombre, e)
+            return True, "metadatos no disponibles"
+        self._huellas[nombre] = huella
+
+        if self.forzar:
+            return True, "--force"
+        anterior = self._estado.get(nombre)
+        if anterior is None:
+            return True, "sin manifiesto"
+        if anterior["sql"] != huella["sql"]:
+            return True, "SQL distinto"
+        if not existe:
+            return True, f"no existe {destino}"
+        if anterior["fuentes"] != huella["fuentes"]:
+            return True, f"fuentes cambiaron ({_cambios(anterior['fuentes'], huella['fuentes'])})"
+        return False, f"fuentes sin cambios ({len(huella['fuentes'])} tablas)"
+
+    def pendientes(self, ddls: dict) -> list:
+        """Nombres de `ddls` ({nombre: sql}) que hay que ejecutar; registra el motivo de cada uno."""
+        correr = []
+        for nombre, sql in ddls.items():
+            hay_que_correr, motivo = self.necesita(nombre, sql)
+            logger.info("DDL %s: %s (%s)", nombre, "se ejecuta" if hay_que_correr else "se omite", motivo)
+            if hay_que_correr:
+                correr.append(nombre)
+        return correr
+
+    def registrar(self, nombre: str, sql: str) -> None:
+        """Guarda la huella tomada en `necesita` después de que el DDL terminó bien."""
+        huella = self._huellas.pop(nombre, None)
+        if huella is None:
+            # Sin metadatos en `necesita`: la siguiente corrida lo vuelve a ejecutar
+            return
+        self._estado[nombre] = {
+            "destino": destino_ddl(sql),
+            "construido": datetime.now().isoformat(),
+            **huella,
+        }
+        self._guardar()
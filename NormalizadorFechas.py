@@ -0,0 +1,206 @@
+"""
+Normalización de columnas de fecha en texto con detección de formato (BQLoad y DATETIME de GA4).
+
+En lugar de convertir la columna completa con cada formato hasta que uno funcione:
+
+- Los formatos candidatos se detectan con una muestra de la columna (`TAMANO_MUESTRA` valores
+  repartidos en toda la columna) y se guardan por (origen, columna): los bloques siguientes
+  del mismo archivo o lote ya no vuelven a muestrear.
+- Cada formato es una expresión regular con grupos (año, mes, día, hora, ...). `extract_regex`
+  de Arrow asigna cada valor a su formato y extrae sus componentes en la misma pasada; la fecha
+  se arma con aritmética de numpy (sin strptime por valor) y se validan los rangos, así que
+  31/02/2024 no se convierte (el strptime de Arrow la recorrería al 2 de marzo).
+- Lo que no coincide con ningún candidato se compara contra todos los formatos (y se agregan a
+  la caché los que aparezcan); lo que tampoco así se puede convertir queda como NaT y se reporta.
+
+`normalizar` regresa la columna como datetime64[ns] y un ReporteFechas con filas por formato y
+filas no convertidas (índice y ejemplos).
+"""
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+TAMANO_MUESTRA = 1_000
+EJEMPLOS_REPORTE = 5
+FORMATO_MIXTO = "mixed"
+
+_FECHA_ISO = r"(?P<Y>\d{4})-(?P<m>\d{1,2})-(?P<d>\d{1,2})"
+_FECHA_MX = r"(?P<d>\d{1,2})/(?P<m>\d{1,2})/(?P<Y>\d{4})"
+_HORA = r"(?P<H>\d{1,2}):(?P<M>\d{2})"
+_SEGUNDOS = r":(?P<S>\d{2})"
+_FRACCION = r"\.(?P<f>\d{1,9})"
+
+# {formato (como en strptime, para el reporte): expresión regular}; las formas no se traslapan,
+# así que cada valor cae en a lo más un formato. Día primero, como en los exports de
+# Dashboard_nacional y el DATETIME de GA4 (horario MX).
+FORMATOS_FECHA = {
+    "%Y-%m-%d": _FECHA_ISO,
+    "%Y-%m-%d %H:%M:%S": _FECHA_ISO + " " + _HORA + _SEGUNDOS,
+    "%Y-%m-%d %H:%M:%S.%f": _FECHA_ISO + " " + _HORA + _SEGUNDOS + _FRACCION,
+    "%Y-%m-%dT%H:%M:%S": _FECHA_ISO + "T" + _HORA + _SEGUNDOS,
+    "%d/%m/%Y": _FECHA_MX,
+    "%d/%m/%Y %H:%M": _FECHA_MX + " " + _HORA,
+    "%d/%m/%Y %H:%M:%S": _FECHA_MX + " " + _HORA + _SEGUNDOS,
+    "%d/%m/%Y %H:%M:%S.%f": _FECHA_MX + " " + _HORA + _SEGUNDOS + _FRACCION,
+}
+
+# Años representables en datetime64[ns]
+_ANIO_MIN, _ANIO_MAX = 1678, 2261
+
+
+class ReporteFechas:
+    """Resultado de normalizar una columna: filas por formato y filas que quedaron como NaT."""
+
+    def __init__(self, columna: str, origen: str = ""):
+        self.columna = columna
+        self.origen = origen
+        self.conteos = {}
+        self.nulos = 0
+        self.no_convertidas = pd.Index([])
+        self.ejemplos = []
+
+    @property
+    def convertidas(self) -> int:
+        return sum(self.conteos.values())
+
+    def __str__(self):
+        formatos = ", ".join(f"{fmt}: {n}" for fmt, n in self.conteos.items()) or "ninguno"
+        texto = f"{self.columna}: {self.convertidas} convertidas ({formatos}), {self.nulos} nulas"
+        if len(self.no_convertidas):
+            texto += f", {len(self.no_convertidas)} no convertidas (p. ej. {self.ejemplos})"
+        return texto
+
+
+def _entero(partes: pa.StructArray, campo: str) -> np.ndarray:
+    if partes.type.get_field_index(campo) < 0:
+        return np.zeros(len(partes), dtype=np.int64)
+    valores = partes.field(campo)
+    if campo == "f":
+        # Fracción de segundo -> nanosegundos ("123" -> 123000000)
+        valores = pc.utf8_rpad(valores, 9, "0")
+    return pc.cast(valores, pa.int64()).to_numpy(zero_copy_only=False)
+
+
+def componer_fechas(partes: pa.StructArray):
+    """
+    (datetime64[ns], máscara de válidas) a partir de los grupos Y, m, d[, H, M[, S[, f]]] de
+    `extract_regex` (sin nulos). Inválidas: mes, hora, minuto o segundo fuera de rango, día que no
+    existe en el mes o año fuera de datetime64[ns].
+    """
+    anio, mes, dia = _entero(partes, "Y"), _entero(partes, "m"), _entero(partes, "d")
+    hora, minuto, segundo, nanos = _entero(partes, "H"), _entero(partes, "M"), _entero(partes, "S"), _entero(partes, "f")
+
+    ok = ((anio >= _ANIO_MIN) & (anio <= _ANIO_MAX) & (mes >= 1) & (mes <= 12) & (dia >= 1) & (dia <= 31)
+          & (hora < 24) & (minuto < 60) & (segundo < 60))
+    # Los inválidos se llevan a un valor seguro para que la aritmética no se desborde
+    meses = np.where(ok, (anio - 1970) * 12 + mes - 1, 0).astype("datetime64[M]")
+    dias = meses.astype("datetime64[D]") + np.where(ok, dia - 1, 0).astype("timedelta64[D]")
+    ok &= dias.astype("datetime64[M]") == meses
+    nanos_dia = (hora * 3600 + minuto * 60 + segundo) * 1_000_000_000 + nanos
+    fechas = dias.astype("datetime64[ns]") + np.where(ok, nanos_dia, 0).astype("timedelta64[ns]")
+    return fechas, ok
+
+
+class NormalizadorFechas:
+    """
+    Convierte columnas de texto a datetime64[ns] con los `formatos` dados ({formato: regex con grupos}).
+    Guarda los formatos detectados por (origen, columna) en `formatos_detectados`.
+    Con `respaldo_mixto`, lo que no tenga una forma conocida se intenta con
+    pd.to_datetime(format="mixed", dayfirst=True).
+    """
+
+    def __init__(self, formatos: dict = None, respaldo_mixto: bool = False,
+                 tamano_muestra: int = TAMANO_MUESTRA):
+        self.formatos = {fmt: f"^{patron}$" for fmt, patron in (formatos or FORMATOS_FECHA).items()}
+        self.respaldo_mixto = respaldo_mixto
+        self.tamano_muestra = tamano_muestra
+        self.formatos_detectados = {}
+
+    def detectar(self, texto: pa.Array) -> list:
+        """Formatos con al menos un valor en una muestra de `texto`, del más al menos frecuente."""
+        paso = max(1, len(texto) // self.tamano_muestra)
+        muestra = texto.take(pa.array(np.arange(0, len(texto), paso))).drop_null()
+        conteos = {fmt: pc.sum(pc.match_substring_regex(muestra, patron)).as_py() or 0
+                   for fmt, patron in self.formatos.items()}
+        return [fmt for fmt, n in sorted(conteos.items(), key=lambda x: -x[1]) if n > 0]
+
+    def normalizar(self, serie: pd.Series, columna: Optional[str] = None, origen: str = ""):
+        """(columna como datetime64[ns], ReporteFechas). Las columnas ya datetime se regresan igual."""
+        columna = columna or serie.name
+        reporte = ReporteFechas(columna, origen)
+        if pd.api.types.is_datetime64_any_dtype(serie):
+            reporte.conteos["datetime64"] = int(serie.notna().sum())
+            reporte.nulos = len(serie) - reporte.conteos["datetime64"]
+            return serie, reporte
+
+        texto = pa.array(serie.astype(pd.StringDtype("pyarrow")))
+        if isinstance(texto, pa.ChunkedArray):
+            texto = texto.combine_chunks()
+        pendientes = texto.is_valid().to_numpy(zero_copy_only=False)
+        reporte.nulos = int(len(texto) - pendientes.sum())
+        fechas = np.full(len(texto), np.datetime64("NaT"), dtype="datetime64[ns]")
+        # Con la forma de un formato pero fecha imposible (31/02/2024): ningún otro formato la convierte
+        invalidas = np.zeros(len(texto), dtype=bool)
+
+        clave = (origen, columna)
+        candidatos = self.formatos_detectados.get(clave)
+        if candidatos is None:
+            candidatos = self.detectar(texto)
+            self.formatos_detectados[clave] = candidatos
+        pendientes = self._enrutar(texto, pendientes, candidatos, fechas, reporte, invalidas)
+
+        if pendientes.any():
+            # Formas que no salieron en la muestra (p. ej. en un bloque posterior del archivo)
+            otros = [fmt for fmt in self.formatos if fmt not in candidatos]
+            pendientes = self._enrutar(texto, pendientes, otros, fechas, reporte, invalidas)
+            nuevos = [fmt for fmt in otros if fmt in reporte.conteos]
+            if nuevos:
+                self.formatos_detectados[clave] = candidatos + nuevos
+        if pendientes.any() and self.respaldo_mixto:
+            posiciones = np.flatnonzero(pendientes)
+            mixtas = pd.to_datetime(pd.Series(texto.take(pa.array(posiciones)).to_pylist(), dtype=object),
+                                    format=FORMATO_MIXTO, dayfirst=True, errors="coerce")
+            self._asignar(fechas, posiciones, mixtas.to_numpy(dtype="datetime64[ns]"), mixtas.notna().to_numpy(),
+                          FORMATO_MIXTO, reporte, invalidas)
+            pendientes[:] = False
+
+        no_convertidas = pendientes | invalidas
+        if no_convertidas.any():
+            reporte.no_convertidas = serie.index[no_convertidas]
+            reporte.ejemplos = texto.filter(pa.array(no_convertidas)).slice(0, EJEMPLOS_REPORTE).to_pylist()
+        return pd.Series(fechas, index=serie.index, name=serie.name), reporte
+
+    def _enrutar(self, texto: pa.Array, pendientes: np.ndarray, formatos, fechas: np.ndarray,
+                 reporte: ReporteFechas, invalidas: np.ndarray) -> np.ndarray:
+        """
+        Asigna cada valor pendiente al formato cuya forma coincide y lo convierte. Marca en
+        `invalidas` los que tienen la forma pero no son una fecha; regresa los que no
+        coinciden con ninguna forma.
+        """
+        pendientes = pendientes.copy()
+        for fmt in formatos:
+            if not pendientes.any():
+                break
+            posiciones = np.flatnonzero(pendientes)
+            valores = texto if len(posiciones) == len(texto) else texto.take(pa.array(posiciones))
+            partes = pc.extract_regex(valores, self.formatos[fmt])
+            coinciden = partes.is_valid().to_numpy(zero_copy_only=False)
+            if not coinciden.any():
+                continue
+            posiciones = posiciones[coinciden]
+            convertidas, ok = componer_fechas(partes.filter(pa.array(coinciden)))
+            self._asignar(fechas, posiciones, convertidas, ok, fmt, reporte, invalidas)
+            pendientes[posiciones] = False
+        return pendientes
+
+    @staticmethod
+    def _asignar(fechas: np.ndarray, posiciones: np.ndarray, convertidas: np.ndarray, ok: np.ndarray,
+                 fmt: str, reporte: ReporteFechas, invalidas: np.ndarray) -> None:
+        fechas[posiciones[ok]] = convertidas[ok]
+        invalidas[posiciones[~ok]] = True
+        if ok.any():
+            reporte.conteos[fmt] = reporte.conteos.get(fmt, 0) + int(ok.sum())
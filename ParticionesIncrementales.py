@@ -0,0 +1,234 @@
+"""
+Modo incremental de H1Script: watermark de particiones `attempt_date` procesadas.
+
+El watermark (JSON local) guarda, por día, la huella de la tabla base GA4 con la
+que se generaron sus patrones, y la huella del catálogo de promociones (por promo)
+y de los catálogos globales (sorteos, tipos de cantidad). En cada corrida se
+reprocesan solo:
+- días nuevos o cuya huella cambió en la tabla base;
+- días dentro de la vigencia (anterior o nueva) de una promo cuyo catálogo cambió;
+- todos los días si cambió un catálogo global o no hay watermark válido;
+ampliados a los días de las sesiones que cruzan la medianoche, para no partir sesiones.
+Las particiones de días que ya no existen en la base solo se eliminan.
+
+Las filas cuya FECHA_EVENTO no se pudo parsear no tienen día de destino: no se cargan (en
+ningún modo) y el borrado del plan elimina las que hayan quedado de cargas anteriores, así
+que repetir una corrida incremental no las duplica.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import date, datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+VERSION_WATERMARK = 1
+
+
+def _hash_filas(df: pd.DataFrame) -> int:
+    """Huella de un DataFrame independiente del orden de filas (suma uint64 de hashes por fila)."""
+    if df.empty:
+        return 0
+    return int(pd.util.hash_pandas_object(df, index=False).to_numpy(dtype="uint64").sum(dtype="uint64"))
+
+
+def _hexdigest(*partes) -> str:
+    return hashlib.sha1("|".join(str(p) for p in partes).encode("utf-8")).hexdigest()[:16]
+
+
+def _fecha_iso(valor):
+    return None if pd.isna(valor) else pd.Timestamp(valor).date().isoformat()
+
+
+def huella_global(*dfs: pd.DataFrame) -> str:
+    """Huella de catálogos cuyo cambio afecta a todos los días (p. ej. df_sorteo, df_tipo_cantidad)."""
+    return _hexdigest(*(
+        _hash_filas(df[sorted(df.columns)]) for df in dfs
+    ))
+
+
+def huellas_promociones(df_condiciones_enriquecido: pd.DataFrame, requisitos_multi: dict, vigencia_promo) -> dict:
+    """
+    {pid: {"huella", "inicio", "cierre"}} por promoción: condiciones simples,
+    requisitos combinados y vigencia. Las claves son str (JSON).
+    """
+    cond = df_condiciones_enriquecido.dropna(subset=["clave_promocion"])
+    cond = cond[sorted(cond.columns)]
+    hash_cond = {}
+    if not cond.empty:
+        hashes = pd.util.hash_pandas_object(cond.drop(columns=["clave_promocion"]), index=False).to_numpy(dtype="uint64")
+        pids = cond["clave_promocion"].astype("int64").to_numpy()
+        orden = np.argsort(pids, kind="stable")
+        pids, hashes = pids[orden], hashes[orden]
+        inicios = np.flatnonzero(np.r_[True, pids[1:] != pids[:-1]])
+        # Suma uint64 por promo (con desbordamiento): no depende del orden de las condiciones
+        hash_cond = dict(zip(pids[inicios].tolist(), np.add.reduceat(hashes, inicios).tolist()))
+
+    huellas = {}
+    for pid in set(hash_cond) | {int(p) for p in requisitos_multi} | {int(p) for p, _ in vigencia_promo.items()}:
+        inicio, cierre = vigencia_promo.get(pid, (pd.NaT, pd.NaT))
+        reqs = sorted(
+            (r["clave_edicion_producto"], r["cantidad_requerida"]) for r in requisitos_multi.get(pid, [])
+        )
+        huellas[str(pid)] = {
+            "huella": _hexdigest(hash_cond.get(pid, 0), reqs, inicio, cierre),
+            "inicio": _fecha_iso(inicio),
+            "cierre": _fecha_iso(cierre),
+        }
+    return huellas
+
+
+def cargar_watermark(path) -> dict:
+    """Lee el watermark; regresa {} si no existe o está corrupto (equivale a corrida completa)."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    try:
+        estado = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as e:
+        logger.warning("Watermark ilegible (%s): %s; se reprocesa todo", path, e)
+        return {}
+    if estado.get("version") != VERSION_WATERMARK:
+        logger.warning("Watermark con versión %s (esperada %s); se reprocesa todo",
+                       estado.get("version"), VERSION_WATERMARK)
+        return {}
+    return estado
+
+
+def guardar_watermark(path, estado: dict) -> None:
+    """Escritura atómica (archivo temporal + replace) para no dejar un watermark a medias."""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(estado, indent=2, sort_keys=True), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _dias_en_rango(dias: np.ndarray, inicio, cierre) -> set:
+    if inicio is None or cierre is None:
+        return set()
+    return set(dias[(dias >= np.datetime64(inicio)) & (dias <= np.datetime64(cierre))].tolist())
+
+
+def _cerrar_por_sesiones(dias: set, df_huellas: pd.DataFrame) -> set:
+    """Agrega los días de las sesiones que cruzan la medianoche hasta que el conjunto no cambie."""
+    spans = {
+        r.attempt_date: (r.dia_min_sesion, r.dia_max_sesion)
+        for r in df_huellas.itertuples(index=False)
+        if r.dia_min_sesion != r.dia_max_sesion
+    }
+    pendientes = [d for d in dias if d in spans]
+    while pendientes:
+        d = pendientes.pop()
+        d_min, d_max = spans[d]
+        for extra in pd.date_range(d_min, d_max, freq="D").date:
+            if extra not in dias:
+                dias.add(extra)
+                if extra in spans:
+                    pendientes.append(extra)
+    return dias
+
+
+class PlanIncremental:
+    """Días a reprocesar / eliminar y el estado de watermark que se guarda al terminar."""
+
+    def __init__(self, dias_procesar, dias_eliminar, motivos: dict, estado_nuevo: dict, completo: bool = False):
+        self.completo = completo  # sin watermark válido: se reconstruye la tabla destino completa
+        self.dias_procesar = sorted(dias_procesar)
+        self.dias_eliminar = sorted(dias_eliminar)
+        self.motivos = motivos
+        self.estado_nuevo = estado_nuevo
+
+    @property
+    def dias_reemplazar(self) -> list:
+        """
+        Particiones a borrar del destino antes de cargar (reprocesadas + desaparecidas).
+        El borrado incluye siempre las filas sin FECHA_EVENTO, que no se vuelven a cargar.
+        """
+        return sorted(set(self.dias_procesar) | set(self.dias_eliminar))
+
+    @property
+    def vacio(self) -> bool:
+        return not self.dias_procesar and not self.dias_eliminar
+
+    def filtro_sql(self) -> str:
+        """Filtro para ga4_events.sql ({FILTRO_DIAS})."""
+        return f"attempt_date IN UNNEST({lista_dias_sql(self.dias_procesar)})"
+
+
+def lista_dias_sql(dias) -> str:
+    """Arreglo literal de BigQuery: [DATE '2025-01-01', ...]."""
+    return "[" + ", ".join(f"DATE '{d.isoformat()}'" for d in dias) + "]"
+
+
+def planear_incremental(
+    df_huellas: pd.DataFrame,
+    watermark: dict,
+    huellas_promos: dict,
+    huella_catalogos: str,
+    tabla_destino: str,
+) -> PlanIncremental:
+    """
+    Compara la huella actual de las particiones (`huella_particiones.sql`) y de los
+    catálogos contra el watermark y decide qué días reprocesar.
+    """
+    df_huellas = df_huellas.copy()
+    for col in ("attempt_date", "dia_min_sesion", "dia_max_sesion"):
+        df_huellas[col] = pd.to_datetime(df_huellas[col]).dt.date
+    actuales = {
+        r.attempt_date: {"filas": int(r.filas), "huella": str(r.huella)}
+        for r in df_huellas.itertuples(index=False)
+    }
+    dias = np.array(sorted(actuales), dtype="datetime64[D]")
+
+    motivos = {}
+    completo = not watermark or watermark.get("tabla") != tabla_destino
+    if completo:
+        motivos["sin_watermark"] = len(actuales)
+        procesar = set(actuales)
+    elif watermark.get("huella_catalogos") != huella_catalogos:
+        motivos["catalogos_globales"] = len(actuales)
+        procesar = set(actuales)
+    else:
+        previas = {date.fromisoformat(d): v for d, v in watermark.get("particiones", {}).items()}
+        nuevos = {d for d in actuales if d not in previas}
+        cambiados = {d for d in actuales if d in previas and previas[d] != actuales[d]}
+
+        promos_previas = watermark.get("promociones", {})
+        por_catalogo = set()
+        for pid in set(promos_previas) | set(huellas_promos):
+            antes, ahora = promos_previas.get(pid), huellas_promos.get(pid)
+            if antes == ahora:
+                continue
+            for h in (antes, ahora):
+                if h:
+                    por_catalogo |= _dias_en_rango(dias, h["inicio"], h["cierre"])
+
+        motivos["nuevos"] = len(nuevos)
+        motivos["cambiados"] = len(cambiados)
+        motivos["catalogo_promociones"] = len(por_catalogo - nuevos - cambiados)
+        procesar = nuevos | cambiados | por_catalogo
+
+    n_antes = len(procesar)
+    procesar = _cerrar_por_sesiones(set(procesar), df_huellas)
+    motivos["sesiones_multidia"] = len(procesar) - n_antes
+
+    previas_todas = set() if completo else {date.fromisoformat(d) for d in watermark.get("particiones", {})}
+    eliminar = previas_todas - set(actuales)
+    motivos["eliminados"] = len(eliminar)
+
+    estado_nuevo = {
+        "version": VERSION_WATERMARK,
+        "tabla": tabla_destino,
+        "huella_catalogos": huella_catalogos,
+        "promociones": huellas_promos,
+        "particiones": {d.isoformat(): v for d, v in sorted(actuales.items())},
+        "actualizado": datetime.now().isoformat(timespec="seconds"),
+    }
+    return PlanIncremental(procesar, eliminar, motivos, estado_nuevo, completo=completo)
@@ -0,0 +1,233 @@
+"""
+Compilación de las condiciones de promociones simples en tablas de consulta por producto.
+
+`cumple_patron` y `es_incompleta_simple` reinterpretan tipo, cantidad_inicial y
+cantidad_final de cada condición en cada fila y etapa. Aquí se evalúan una sola vez
+por (producto, cantidad) y el motor fila solo consulta:
+
+    cumple, incompletas = reglas.consultar(producto, cantidad)
+
+- Cantidades enteras 0..limite del producto: tabla con el resultado precalculado.
+- Cantidades mayores al límite: resultado constante de las reglas acotadas
+  (solo los tipos 2/5 "mínimo"/"acumula" siguen cumpliéndose).
+- Reglas de módulo (tipos 6/7), tipos desconocidos, cotas nulas o muy grandes
+  y cantidades no enteras: se evalúan directo con `cumple_patron` / `es_incompleta_simple`.
+
+La misma consulta sirve para las tres etapas (add_cart, checkout, purchase).
+Las reglas compiladas se pueden guardar (pickle) junto con la huella del catálogo,
+para que una corrida con el mismo catálogo no las vuelva a compilar.
+"""
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from ReglasPromociones import cumple_patron, es_incompleta_simple
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+VERSION_REGLAS = 1
+TIPOS_TABULABLES = (1, 2, 3, 4, 5)
+MAX_CANTIDAD_TABLA = 1024  # reglas con cotas mayores van al camino directo
+
+COLUMNAS_REGLA = [
+    "clave_edicion_producto", "clave_promocion", "clave_tipo_cantidad_condicion",
+    "cantidad_inicial", "cantidad_final", "interpretacion",
+]
+_VACIO = ((), ())
+
+
+def _cota(valor) -> Optional[int]:
+    """Cota entera para la tabla; None si es nula, infinita o mayor a MAX_CANTIDAD_TABLA."""
+    if pd.isna(valor):
+        return None
+    valor = float(valor)
+    if not np.isfinite(valor) or abs(valor) > MAX_CANTIDAD_TABLA:
+        return None
+    return int(np.ceil(abs(valor)))
+
+
+def _limite_tabla(tipo, cant_inicial, cant_final) -> Optional[int]:
+    """
+    Mayor cantidad a partir de la cual el resultado de la regla ya no cambia;
+    None si la regla no se puede tabular (módulo, tipo desconocido, cotas no acotadas).
+    """
+    if tipo not in TIPOS_TABULABLES:
+        return None
+    limite = _cota(cant_inicial)
+    if limite is None:
+        return None
+    if tipo == 4 and pd.notna(cant_final) and cant_final:  # cumple_patron usa cant_inicial si cant_final es 0/None
+        final = _cota(cant_final)
+        if final is None:
+            return None
+        limite = max(limite, final)
+    return limite
+
+
+def _evaluar(reglas, cantidad):
+    """(cumple, incompletas) de reglas (pid, tipo, inicial, final, interpretacion) en una cantidad."""
+    cumple = []
+    incompletas = []
+    for pid, tipo, cant_inicial, cant_final, interpretacion in reglas:
+        if cumple_patron(cantidad, tipo, cant_inicial, cant_final):
+            cumple.append((pid, interpretacion))
+        elif cantidad > 0 and es_incompleta_simple(cantidad, cant_inicial):
+            incompletas.append(pid)
+    return tuple(cumple), tuple(incompletas)
+
+
+class ReglasProducto:
+    """
+    Reglas simples de un producto.
+    - `tabla[q]`: (cumple, incompletas) para q entero en 0..len(tabla) - 1.
+    - `cola`: resultado de las reglas tabuladas para q mayores.
+    - `directas`: reglas que siempre se evalúan (módulo, cotas no acotadas).
+    `cumple` son pares (pid, interpretacion); `incompletas`, pids (near miss N - 1).
+    """
+
+    __slots__ = ("tabla", "cola", "tabuladas", "directas")
+
+    def __init__(self, reglas):
+        tabuladas = []
+        directas = []
+        limite = 0
+        for regla in reglas:
+            limite_regla = _limite_tabla(*regla[1:4])
+            if limite_regla is None:
+                directas.append(regla)
+            else:
+                tabuladas.append(regla)
+                limite = max(limite, limite_regla)
+
+        # Por encima de limite + 1 ninguna regla tabulada cambia de resultado (ni el near miss N - 1)
+        self.tabla = tuple(_evaluar(tabuladas, q) for q in range(limite + 2))
+        self.cola = _evaluar(tabuladas, limite + 2)
+        self.tabuladas = tuple(tabuladas)
+        self.directas = tuple(directas)
+
+    def consultar(self, cantidad):
+        if pd.isna(cantidad):
+            return _VACIO
+        if cantidad < 0 or not float(cantidad).is_integer():
+            return _evaluar(self.tabuladas + self.directas, cantidad)
+        q = int(cantidad)
+        resultado = self.tabla[q] if q < len(self.tabla) else self.cola
+        if not self.directas:
+            return resultado
+        cumple, incompletas = _evaluar(self.directas, cantidad)
+        return resultado[0] + cumple, resultado[1] + incompletas
+
+
+class ReglasCompiladas:
+    """
+    {clave_edicion_producto: ReglasProducto} de las promociones simples
+    (sin clave_promocion nula ni promos combinadas), más la huella del catálogo
+    con la que se compilaron.
+    """
+
+    def __init__(self, por_producto: dict, huella: str):
+        self.por_producto = por_producto
+        self.huella = huella
+
+    @staticmethod
+    def huella_catalogo(condiciones_df: pd.DataFrame, promos_multi) -> str:
+        """Huella de las columnas que usa la compilación (independiente del orden de filas)."""
+        h = hashlib.sha1(f"v{VERSION_REGLAS}|{MAX_CANTIDAD_TABLA}|".encode("utf-8"))
+        df = condiciones_df.reindex(columns=COLUMNAS_REGLA)
+        filas = pd.util.hash_pandas_object(df, index=False).to_numpy(dtype="uint64")
+        h.update(np.sort(filas).tobytes())
+        h.update(repr(sorted(int(p) for p in promos_multi)).encode("utf-8"))
+        return h.hexdigest()[:16]
+
+    @classmethod
+    def compilar(cls, condiciones_df: pd.DataFrame, promos_multi, huella: Optional[str] = None) -> "ReglasCompiladas":
+        """Agrupa las condiciones por producto y precalcula sus tablas de consulta."""
+        huella = huella or cls.huella_catalogo(condiciones_df, promos_multi)
+        df = condiciones_df.reindex(columns=COLUMNAS_REGLA)
+        df = df[df["clave_edicion_producto"].notna() & df["clave_promocion"].notna()]
+
+        reglas_por_producto = {}
+        for prod, pid, tipo, cant_inicial, cant_final, interpretacion in df.itertuples(index=False, name=None):
+            pid = int(pid)
+            if pid in promos_multi:
+                continue
+            if not (isinstance(interpretacion, str) and interpretacion):
+                interpretacion = ""
+            # Nulos de BigQuery (pd.NA en columnas Int64) como en el motor vectorizado: tipo
+            # desconocido y cotas NaN (nunca se cumplen); pd.NA no se puede usar en un `if`
+            tipo = None if pd.isna(tipo) else tipo
+            cant_inicial = np.nan if pd.isna(cant_inicial) else cant_inicial
+            cant_final = np.nan if pd.isna(cant_final) else cant_final
+            reglas_por_producto.setdefault(prod, []).append((pid, tipo, cant_inicial, cant_final, interpretacion))
+
+        por_producto = {prod: ReglasProducto(reglas) for prod, reglas in reglas_por_producto.items()}
+        return cls(por_producto, huella)
+
+    def consultar(self, producto, cantidad):
+        """(cumple, incompletas) de las promos simples del producto en `cantidad`."""
+        reglas = self.por_producto.get(producto)
+        if reglas is None:
+            return _VACIO
+        return reglas.consultar(cantidad)
+
+    def __len__(self) -> int:
+        return len(self.por_producto)
+
+    @property
+    def n_reglas(self) -> int:
+        return sum(len(r.tabuladas) + len(r.directas) for r in self.por_producto.values())
+
+    def guardar(self, path) -> None:
+        """Pickle con escritura atómica (archivo temporal + replace)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)
+
+    @classmethod
+    def cargar(cls, path, huella: str) -> Optional["ReglasCompiladas"]:
+        """Reglas guardadas si existen y se compilaron con la misma huella de catálogo; si no, None."""
+        path = Path(path)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "rb") as f:
+                reglas = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError) as e:
+            logger.warning("Reglas compiladas ilegibles (%s): %s; se recompilan", path, e)
+            return None
+        if not isinstance(reglas, cls) or reglas.huella != huella:
+            return None
+        return reglas
+
+
+def compilar_reglas(condiciones_df: pd.DataFrame, promos_multi, path=None) -> ReglasCompiladas:
+    """Compila las reglas simples; con `path`, reutiliza las guardadas si el catálogo no cambió."""
+    huella = ReglasCompiladas.huella_catalogo(condiciones_df, promos_multi)
+    if path is not None:
+        reglas = ReglasCompiladas.cargar(path, huella)
+        if reglas is not None:
+            logger.info("Reglas compiladas reutilizadas (%s): %d productos", path, len(reglas))
+            return reglas
+
+    reglas = ReglasCompiladas.compilar(condiciones_df, promos_multi, huella=huella)
+    logger.info("Reglas compiladas: %d productos, %d reglas", len(reglas), reglas.n_reglas)
+    if path is not None:
+        reglas.guardar(path)
+    return reglas
+
+
+def como_reglas_compiladas(condiciones, promos_multi) -> ReglasCompiladas:
+    """Acepta ReglasCompiladas o el DataFrame de condiciones de versiones previas."""
+    if isinstance(condiciones, ReglasCompiladas):
+        return condiciones
+    return ReglasCompiladas.compilar(condiciones, promos_multi)
@@ -0,0 +1,481 @@
+"""
+Reglas de negocio de detección de patrones de promociones (motor fila por fila).
+
+Módulo sin efectos al importarse (no crea clientes ni credenciales), para que
+lo puedan usar H1Script y los procesos de DeteccionParalela.
+"""
+import logging
+from collections import OrderedDict
+
+import pandas as pd
+
+from IndiceSesiones import IndiceSesiones
+from NormalizadorFechas import FORMATOS_FECHA, NormalizadorFechas
+from RequisitosCombinados import como_requisitos
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+# DATETIME de ga4_events.sql: '%d/%m/%Y %H:%M:%S' (horario MX), a veces con fracción de segundo
+FORMATO_DATETIME = "%d/%m/%Y %H:%M:%S"
+COL_FECHA_EVENTO = "FECHA_EVENTO"
+_FECHAS_GA4 = NormalizadorFechas(
+    {fmt: FORMATOS_FECHA[fmt] for fmt in (FORMATO_DATETIME, FORMATO_DATETIME + ".%f")}
+)
+
+# Entradas del memo de clasificación por fila (0 = sin memo)
+TAMANO_MEMO = 100_000
+_ETAPAS_SESION = ('add_cart', 'checkout', 'purchase')
+_CANTIDADES_ETAPA = ('CANTIDAD_ADD_TO_CART', 'CANTIDAD_BEGIN_CHECKOUT', 'CANTIDAD_PURCHASE')
+_COLUMNAS_FILA = ('clave_edicion_producto', COL_FECHA_EVENTO) + _CANTIDADES_ETAPA
+
+
+def parsear_datetime_mx(serie: pd.Series) -> pd.Series:
+    """
+    Convierte la columna DATETIME (texto) a datetime64[ns] en bloque con NormalizadorFechas:
+    cada valor va a FORMATO_DATETIME o a su variante con fracción de segundo según su forma.
+    Lo que no se pueda convertir queda como NaT (se registra cuántos y ejemplos).
+    """
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie
+    fechas, reporte = _FECHAS_GA4.normalizar(serie, columna='DATETIME', origen='ga4_events')
+    if len(reporte.no_convertidas):
+        logger.warning("DATETIME: %d valores no convertidos a fecha (p. ej. %s)",
+                       len(reporte.no_convertidas), reporte.ejemplos)
+    return fechas
+
+
+def agregar_fecha_evento(df: pd.DataFrame) -> pd.DataFrame:
+    """Agrega FECHA_EVENTO (datetime64) a partir de DATETIME; se hace una sola vez tras la extracción."""
+    df[COL_FECHA_EVENTO] = parsear_datetime_mx(df['DATETIME'])
+    return df
+
+
+def fechas_evento(df: pd.DataFrame) -> pd.Series:
+    """FECHA_EVENTO si ya existe; si no, se parsea DATETIME (uso fuera del pipeline)."""
+    if COL_FECHA_EVENTO in df.columns:
+        return df[COL_FECHA_EVENTO]
+    return parsear_datetime_mx(df['DATETIME'])
+
+
+# ----------------------------
+# Lógica de negocio (funciones)
+# ----------------------------
+def interpretar_cantidad(row):
+    """Interpreta la condición de cantidad en lenguaje natural"""
+    tipo = row['clave_tipo_cantidad_condicion']
+    cant_inicial = row['cantidad_inicial']
+    cant_final = row['cantidad_final']
+
+    interpretaciones = {
+        1: f"Exactamente {cant_inicial} unidades",
+        2: f"Mínimo {cant_inicial} unidades",
+        3: f"Máximo {cant_inicial} unidades",
+        4: f"Entre {cant_inicial} y {cant_final} unidades",
+        5: f"Acumula {cant_inicial} unidades",
+        6: f"Por cada {cant_inicial} unidades",
+        7: f"Múltiplo de {cant_inicial}"
+    }
+
+    return interpretaciones.get(tipo, f"Tipo {tipo}: {cant_inicial}")
+
+
+def cumple_patron(cantidad, tipo_condicion, cant_inicial, cant_final=None):
+    """Verifica si una cantidad cumple con un tipo de condición"""
+    if pd.isna(cantidad) or cantidad == 0:
+        return False
+
+    if tipo_condicion == 1:  # Exactamente
+        return cantidad == cant_inicial
+    elif tipo_condicion == 2:  # Mínimo
+        return cantidad >= cant_inicial
+    elif tipo_condicion == 3:  # Máximo
+        return cantidad <= cant_inicial
+    elif tipo_condicion == 4:  # Entre
+        return cant_inicial <= cantidad <= (cant_final if cant_final else cant_inicial)
+    elif tipo_condicion == 5:  # Acumula
+        return cantidad >= cant_inicial
+    elif tipo_condicion == 6:  # Por cada
+        return cantidad >= cant_inicial and cantidad % cant_inicial == 0
+    elif tipo_condicion == 7:  # Múltiplo
+        return cantidad % cant_inicial == 0 if cant_inicial > 0 else False
+    else:
+        return False
+
+
+def evaluar_promociones_sesion(df_sesion, requisitos_multi, vigencia_promo):
+    """
+    Evalúa promociones multi-producto (combinadas) para TODA la sesión.
+    Regresa IDs de promos que están COMPLETAS por etapa.
+    - Requisito V1: para cada promo combinada, TODOS sus productos deben sumar
+      cantidad >= cantidad_requerida dentro de la sesión, por etapa.
+    - Vigencia: si la promo no está activa a la fecha del evento (sesión), se ignora.
+      `vigencia_promo` es un IndiceVigencia: las promos activas se consultan una vez por sesión.
+    """
+    cantidades = [df_sesion[col].tolist() if col in df_sesion.columns else None for col in _CANTIDADES_ETAPA]
+    return evaluar_promociones_sesion_filas(
+        productos=df_sesion['clave_edicion_producto'].tolist(),
+        cantidades=cantidades,
+        fecha_evento=df_sesion[COL_FECHA_EVENTO].iloc[0],
+        requisitos_multi=como_requisitos(requisitos_multi),
+        vigencia_promo=vigencia_promo,
+    )
+
+
+def evaluar_promociones_sesion_filas(productos, cantidades, fecha_evento, requisitos_multi, vigencia_promo):
+    """
+    `evaluar_promociones_sesion` sobre las filas de una sesión ya extraídas del índice de sesiones:
+    `productos` y cada lista de `cantidades` (add_cart, checkout, purchase; None si no hay columna)
+    traen un valor por fila. Solo se revisan las promos que involucran algún producto de la
+    sesión (índice invertido), más las que se cumplen sin filas (`sin_minimo`).
+    """
+    promociones_completas = {'add_cart': [], 'checkout': [], 'purchase': []}
+
+    if pd.isna(fecha_evento):
+        return promociones_completas
+
+    activas = vigencia_promo.promos_activas(fecha_evento)
+
+    # Sumas por producto y etapa (los nulos no suman, igual que Series.sum)
+    sumas = {}
+    for i, prod in enumerate(productos):
+        if pd.isna(prod):
+            continue
+        suma = sumas.setdefault(prod, [0, 0, 0])
+        for k, valores in enumerate(cantidades):
+            if valores is not None and not pd.isna(valores[i]):
+                suma[k] += valores[i]
+
+    candidatas = set(requisitos_multi.sin_minimo)
+    for prod in sumas:
+        candidatas.update(pid for pid, _ in requisitos_multi.de_producto(prod))
+
+    for pid in sorted(candidatas):
+        if pid not in activas:
+            continue
+
+        ok_add = True
+        ok_chk = True
+        ok_pur = True
+
+        for req in requisitos_multi[pid]:
+            s_add, s_chk, s_pur = sumas.get(req.clave_edicion_producto, (0, 0, 0))
+            need = req.cantidad_requerida
+
+            ok_add = ok_add and (s_add >= need)
+            ok_chk = ok_chk and (s_chk >= need)
+            ok_pur = ok_pur and (s_pur >= need)
+
+            if not (ok_add or ok_chk or ok_pur):
+                break
+
+        if ok_add:
+            promociones_completas['add_cart'].append(pid)
+        if ok_chk:
+            promociones_completas['checkout'].append(pid)
+        if ok_pur:
+            promociones_completas['purchase'].append(pid)
+
+    return promociones_completas
+
+
+def es_incompleta_simple(cantidad, cant_inicial):
+    """
+    Heurístico de 'promo simple incompleta':
+    - La promo está activa (se valida afuera).
+    - NO cumple el patrón.
+    - La cantidad es exactamente N - 1 (near miss).
+    """
+    if pd.isna(cantidad) or pd.isna(cant_inicial):
+        return False
+    try:
+        return int(cantidad) == int(cant_inicial) - 1
+    except Exception:
+        return False
+
+
+def _como_reglas(condiciones, promos_multi):
+    # Import diferido: ReglasCompiladas usa cumple_patron / es_incompleta_simple de este módulo
+    from ReglasCompiladas import como_reglas_compiladas
+    return como_reglas_compiladas(condiciones, promos_multi)
+
+
+def detectar_patrones_producto(row, condiciones_df, promociones_completas_sesion,
+                               promos_multi, requisitos_multi, vigencia_promo):
+    """
+    Detecta qué promociones cumple un producto individual (fila).
+    - Promos simples:
+        * COMPLETAS: igual que antes, vía cumple_patron (precalculado en ReglasCompiladas).
+        * INCOMPLETAS: nuevo criterio de 'near miss' -> cantidad == N - 1.
+      `condiciones_df` puede ser el DataFrame de condiciones o, mejor, las reglas
+      ya compiladas (`ReglasCompiladas`), que se construyen una vez por corrida.
+    - Promos combinadas (V1): operador mínimo (≥) por producto requerido;
+      si la sesión cerró el combo -> COMPLETA; si no -> INCOMPLETA.
+      `requisitos_multi` puede ser RequisitosCombinados o el dict {pid: [requisitos]}.
+    """
+    clave_producto = row.get('clave_edicion_producto', None)
+    reglas_simples = _como_reglas(condiciones_df, promos_multi)
+    requisitos = como_requisitos(requisitos_multi)
+
+    resultado_vacio = {
+        'PATRON_ADD_CART': 'NO',
+        'PROMOS_ADD_CART_COMPLETAS': [],
+        'PROMOS_ADD_CART_INCOMPLETAS': [],
+        'PROMOS_ADD_CART_TODAS': [],
+        'DESC_ADD_CART_COMPLETAS': '',
+        'PATRON_BEGIN_CHECKOUT': 'NO',
+        'PROMOS_CHECKOUT_COMPLETAS': [],
+        'PROMOS_CHECKOUT_INCOMPLETAS': [],
+        'PROMOS_CHECKOUT_TODAS': [],
+        'DESC_CHECKOUT_COMPLETAS': '',
+        'PATRON_PURCHASE': 'NO',
+        'PROMOS_PURCHASE_COMPLETAS': [],
+        'PROMOS_PURCHASE_INCOMPLETAS': [],
+        'PROMOS_PURCHASE_TODAS': [],
+        'DESC_PURCHASE_COMPLETAS': ''
+    }
+    if pd.isna(clave_producto):
+        return resultado_vacio
+
+    fecha_evento = row[COL_FECHA_EVENTO]
+    if pd.isna(fecha_evento):
+        return resultado_vacio
+
+    activas = vigencia_promo.promos_activas(fecha_evento)
+
+    resultados = {
+        'add_cart': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()},
+        'checkout': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()},
+        'purchase': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()}
+    }
+
+    # 6.A) PROMOS COMBINADAS (solo las que requieren este producto, vía índice invertido)
+    c_add = row.get('CANTIDAD_ADD_TO_CART', 0) or 0
+    c_chk = row.get('CANTIDAD_BEGIN_CHECKOUT', 0) or 0
+    c_pur = row.get('CANTIDAD_PURCHASE', 0) or 0
+    for pid, need in requisitos.de_producto(clave_producto):
+        if pid not in promos_multi or pid not in activas:
+            continue
+
+        if c_add >= need:
+            resultados['add_cart']['todas'].add(pid)
+            if pid in promociones_completas_sesion['add_cart']:
+                resultados['add_cart']['completas'].add(pid)
+            else:
+                resultados['add_cart']['incompletas'].add(pid)
+
+        if c_chk >= need:
+            resultados['checkout']['todas'].add(pid)
+            if pid in promociones_completas_sesion['checkout']:
+                resultados['checkout']['completas'].add(pid)
+            else:
+                resultados['checkout']['incompletas'].add(pid)
+
+        if c_pur >= need:
+            resultados['purchase']['todas'].add(pid)
+            if pid in promociones_completas_sesion['purchase']:
+                resultados['purchase']['completas'].add(pid)
+            else:
+                resultados['purchase']['incompletas'].add(pid)
+
+    # 6.B) PROMOS SIMPLES (tablas compiladas por producto y cantidad)
+    etapas = (
+        ('add_cart', row.get('CANTIDAD_ADD_TO_CART', 0) or 0),
+        ('checkout', row.get('CANTIDAD_BEGIN_CHECKOUT', 0) or 0),
+        ('purchase', row.get('CANTIDAD_PURCHASE', 0) or 0),
+    )
+    for etapa, cantidad in etapas:
+        cumple, incompletas = reglas_simples.consultar(clave_producto, cantidad)
+        res = resultados[etapa]
+        for pid, interpretacion in cumple:
+            res['todas'].add(pid)
+            # La vigencia de la condición viene de df_fechas_promocion, igual que el índice
+            if pid in activas:
+                res['completas'].add(pid)
+                if interpretacion:
+                    res['desc_completas'].add(interpretacion)
+        for pid in incompletas:
+            if pid in activas:
+                res['todas'].add(pid)
+                res['incompletas'].add(pid)
+
+    return {
+        'PATRON_ADD_CART': 'SI' if resultados['add_cart']['completas'] else 'NO',
+        'PROMOS_ADD_CART_COMPLETAS': sorted(list(resultados['add_cart']['completas'])),
+        'PROMOS_ADD_CART_INCOMPLETAS': sorted(list(resultados['add_cart']['incompletas'])),
+        'PROMOS_ADD_CART_TODAS': sorted(list(resultados['add_cart']['todas'])),
+        'DESC_ADD_CART_COMPLETAS': ' | '.join(sorted(resultados['add_cart']['desc_completas'])),
+
+        'PATRON_BEGIN_CHECKOUT': 'SI' if resultados['checkout']['completas'] else 'NO',
+        'PROMOS_CHECKOUT_COMPLETAS': sorted(list(resultados['checkout']['completas'])),
+        'PROMOS_CHECKOUT_INCOMPLETAS': sorted(list(resultados['checkout']['incompletas'])),
+        'PROMOS_CHECKOUT_TODAS': sorted(list(resultados['checkout']['todas'])),
+        'DESC_CHECKOUT_COMPLETAS': ' | '.join(sorted(resultados['checkout']['desc_completas'])),
+
+        'PATRON_PURCHASE': 'SI' if resultados['purchase']['completas'] else 'NO',
+        'PROMOS_PURCHASE_COMPLETAS': sorted(list(resultados['purchase']['completas'])),
+        'PROMOS_PURCHASE_INCOMPLETAS': sorted(list(resultados['purchase']['incompletas'])),
+        'PROMOS_PURCHASE_TODAS': sorted(list(resultados['purchase']['todas'])),
+        'DESC_PURCHASE_COMPLETAS': ' | '.join(sorted(resultados['purchase']['desc_completas']))
+    }
+
+
+class MemoLRU:
+    """
+    Memo acotado (LRU) de resultados de `detectar_patrones_producto`.
+    Cuenta aciertos, fallos y desalojos para reportarlos en el log de la etapa.
+    """
+
+    def __init__(self, tamano: int = TAMANO_MEMO):
+        self.tamano = tamano
+        self._datos = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def get(self, clave):
+        resultado = self._datos.get(clave)
+        if resultado is None:
+            self.fallos += 1
+            return None
+        self._datos.move_to_end(clave)
+        self.aciertos += 1
+        return resultado
+
+    def put(self, clave, resultado) -> None:
+        if self.tamano <= 0:
+            return
+        self._datos[clave] = resultado
+        if len(self._datos) > self.tamano:
+            self._datos.popitem(last=False)
+            self.desalojos += 1
+
+    def estadisticas(self) -> dict:
+        return {
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'desalojos': self.desalojos,
+            'entradas': len(self._datos),
+        }
+
+
+def log_memo(estadisticas: dict) -> None:
+    consultas = estadisticas['aciertos'] + estadisticas['fallos']
+    logger.info("Memo clasificación: aciertos=%d, fallos=%d (%.1f%% aciertos), desalojos=%d, entradas=%d",
+                estadisticas['aciertos'], estadisticas['fallos'],
+                100 * estadisticas['aciertos'] / consultas if consultas else 0.0,
+                estadisticas['desalojos'], estadisticas['entradas'])
+
+
+def _promos_del_producto(clave_producto, reglas_simples, requisitos, promos_multi, cache: dict):
+    """(todas, combinadas): promos cuyo estado puede cambiar la clasificación de filas del producto."""
+    promos = cache.get(clave_producto)
+    if promos is None:
+        combinadas = frozenset(pid for pid, _ in requisitos.de_producto(clave_producto) if pid in promos_multi)
+        reglas = reglas_simples.por_producto.get(clave_producto)
+        simples = () if reglas is None else (r[0] for r in reglas.tabuladas + reglas.directas)
+        promos = cache[clave_producto] = (combinadas.union(simples), combinadas)
+    return promos
+
+
+def _clave_memo(row, vigencia_promo, promociones_completas_sesion, promos_producto):
+    """
+    Entrada canónica de la clasificación de una fila: producto, cantidades por etapa,
+    promos activas en la fecha y combinadas completas en la sesión, ambas recortadas
+    a las promos del producto (`promos_producto`). Con las mismas reglas, define el resultado.
+    """
+    clave_producto = row.get('clave_edicion_producto', None)
+    if pd.isna(clave_producto):
+        return (None,)
+    fecha_evento = row[COL_FECHA_EVENTO]
+    if pd.isna(fecha_evento):
+        return (clave_producto, None)
+    todas, combinadas = promos_producto
+    return (
+        clave_producto,
+        row.get('CANTIDAD_ADD_TO_CART', 0) or 0,
+        row.get('CANTIDAD_BEGIN_CHECKOUT', 0) or 0,
+        row.get('CANTIDAD_PURCHASE', 0) or 0,
+        todas & vigencia_promo.promos_activas(fecha_evento),
+        tuple(combinadas.intersection(promociones_completas_sesion[e]) for e in _ETAPAS_SESION),
+    )
+
+
+def detectar_patrones_fila(df_eventos, condiciones_df, promos_multi, requisitos_multi,
+                           vigencia_promo, reportar_progreso=True, tamano_memo=TAMANO_MEMO,
+                           indice_sesiones=None):
+    """
+    Motor de referencia: itera por sesión (USER, SESION) sobre rebanadas del índice de
+    sesiones (IndiceSesiones), evalúa las combinadas de la sesión y luego detecta
+    patrones fila por fila. Lee la fecha de
+    FECHA_EVENTO (ver `agregar_fecha_evento`).
+    Regresa un DataFrame con los resultados indexado por el índice original
+    (las filas sin USER/SESION no aparecen, igual que en groupby).
+    Las filas con la misma entrada (ver `_clave_memo`) reutilizan el resultado de un
+    memo LRU de `tamano_memo` entradas; sus estadísticas quedan en `df.attrs["memo"]`.
+    `indice_sesiones` permite reutilizar un IndiceSesiones ya construido sobre `df_eventos`.
+    """
+    if COL_FECHA_EVENTO not in df_eventos.columns:
+        df_eventos = df_eventos.assign(**{COL_FECHA_EVENTO: fechas_evento(df_eventos)})
+    # Reglas simples e índice de requisitos combinados se construyen una sola vez
+    condiciones_df = _como_reglas(condiciones_df, promos_multi)
+    requisitos_multi = como_requisitos(requisitos_multi)
+
+    # Un solo ordenamiento por sesión; cada sesión es una rebanada contigua de listas por columna
+    indice = indice_sesiones if indice_sesiones is not None else IndiceSesiones.desde_df(df_eventos, ['USER', 'SESION'])
+    total_sesiones = len(indice)
+    etiquetas = df_eventos.index[indice.orden].tolist()
+    columnas = {
+        col: indice.tomar_lista(df_eventos[col]) for col in _COLUMNAS_FILA if col in df_eventos.columns
+    }
+    productos = columnas.get('clave_edicion_producto', [None] * len(etiquetas))
+    fechas = columnas[COL_FECHA_EVENTO]
+    filas = [dict(zip(columnas, valores)) for valores in zip(*columnas.values())]
+
+    memo = MemoLRU(tamano_memo)
+    promos_por_producto = {}
+    resultados_list = []
+    for idx_sesion in range(total_sesiones):
+        if reportar_progreso and (idx_sesion + 1) % 1000 == 0:
+            logger.info("Progreso sesiones: %d / %d (%.1f%%)",
+                        idx_sesion + 1, total_sesiones, 100 * (idx_sesion + 1) / total_sesiones)
+
+        inicio, fin = indice.offsets[idx_sesion], indice.offsets[idx_sesion + 1]
+        promociones_completas_sesion = evaluar_promociones_sesion_filas(
+            productos=productos[inicio:fin],
+            cantidades=[columnas[col][inicio:fin] if col in columnas else None for col in _CANTIDADES_ETAPA],
+            fecha_evento=fechas[inicio],
+            requisitos_multi=requisitos_multi,
+            vigencia_promo=vigencia_promo
+        )
+
+        for pos in range(inicio, fin):
+            row = filas[pos]
+            clave_producto = productos[pos]
+            promos_producto = None if pd.isna(clave_producto) else _promos_del_producto(
+                clave_producto, condiciones_df, requisitos_multi, promos_multi, promos_por_producto
+            )
+            clave = _clave_memo(row, vigencia_promo, promociones_completas_sesion, promos_producto)
+            resultado = memo.get(clave)
+            if resultado is None:
+                resultado = detectar_patrones_producto(
+                    row=row,
+                    condiciones_df=condiciones_df,
+                    promociones_completas_sesion=promociones_completas_sesion,
+                    promos_multi=promos_multi,
+                    requisitos_multi=requisitos_multi,
+                    vigencia_promo=vigencia_promo
+                )
+                memo.put(clave, resultado)
+            # Copia superficial: el resultado memorizado se comparte entre filas
+            resultado = dict(resultado, index=etiquetas[pos])
+            resultados_list.append(resultado)
+
+    if reportar_progreso:
+        log_memo(memo.estadisticas())
+    if not resultados_list:
+        return pd.DataFrame()
+    df_resultados = pd.DataFrame(resultados_list)
+    df_resultados = df_resultados.set_index('index').sort_index()
+    df_resultados.attrs['memo'] = memo.estadisticas()
+    return df_resultados
@@ -0,0 +1,131 @@
+"""
+Requisitos de promociones combinadas (antes `requisitos_multi`: {pid: [dict, ...]}).
+
+Los requisitos viven en arreglos (una fila por par promo × producto, ordenados por
+promo) y se indexan dos veces:
+- por promo: `requisitos[pid]` -> tupla de `Requisito` (registros con __slots__);
+- por producto (índice invertido): `requisitos.de_producto(prod)` -> ((pid, cantidad_requerida), ...),
+  para que el motor fila solo revise las promos que involucran al producto de la fila.
+Conserva la interfaz de dict (`items`, `get`, `in`, `len`) y `Requisito` acepta
+`r["cantidad_requerida"]`, así que el código que esperaba el dict sigue funcionando.
+"""
+import numpy as np
+import pandas as pd
+
+
+class Requisito:
+    """Producto y cantidad mínima de una promo combinada."""
+
+    __slots__ = ("clave_edicion_producto", "cantidad_requerida")
+
+    def __init__(self, clave_edicion_producto: int, cantidad_requerida: int):
+        self.clave_edicion_producto = clave_edicion_producto
+        self.cantidad_requerida = cantidad_requerida
+
+    def __getitem__(self, campo):
+        return getattr(self, campo)
+
+    def __repr__(self):
+        return f"Requisito({self.clave_edicion_producto}, {self.cantidad_requerida})"
+
+
+class RequisitosCombinados:
+    """
+    - `req_pid`, `req_producto`, `req_cantidad`: arreglos int64 de requisitos, ordenados por promo.
+    - `promos`: ids de promo distintos; los requisitos de promos[i] están en offsets[i]:offsets[i + 1].
+    - `por_producto`: {producto: ((pid, cantidad_requerida), ...)}.
+    - `sin_minimo`: promos con todas sus cantidades requeridas <= 0.
+    """
+
+    def __init__(self, req_pid, req_producto, req_cantidad):
+        req_pid = np.asarray(req_pid, dtype="int64")
+        orden = np.argsort(req_pid, kind="stable")
+        self.req_pid = req_pid[orden]
+        self.req_producto = np.asarray(req_producto, dtype="int64")[orden]
+        self.req_cantidad = np.asarray(req_cantidad, dtype="int64")[orden]
+
+        self.promos, inicios = np.unique(self.req_pid, return_index=True)
+        self.offsets = np.append(inicios, len(self.req_pid)).astype("int64")
+
+        pids = self.req_pid.tolist()
+        productos = self.req_producto.tolist()
+        cantidades = self.req_cantidad.tolist()
+        self._por_promo = {}
+        for i, pid in enumerate(self.promos.tolist()):
+            a, b = self.offsets[i], self.offsets[i + 1]
+            self._por_promo[pid] = tuple(Requisito(p, c) for p, c in zip(productos[a:b], cantidades[a:b]))
+
+        # Índice invertido; si un producto se repite en una promo, vale el primer requisito
+        self.por_producto = {}
+        vistos = set()
+        for pid, prod, cant in zip(pids, productos, cantidades):
+            if (pid, prod) in vistos:
+                continue
+            vistos.add((pid, prod))
+            self.por_producto.setdefault(prod, []).append((pid, cant))
+        self.por_producto = {prod: tuple(v) for prod, v in self.por_producto.items()}
+
+        # Promos que se cumplen aun sin filas de sus productos (todas sus cantidades <= 0)
+        self.sin_minimo = frozenset(
+            pid for pid, reqs in self._por_promo.items() if all(r.cantidad_requerida <= 0 for r in reqs)
+        )
+
+    @classmethod
+    def desde_df(
+        cls,
+        df_combinadas: pd.DataFrame,
+        col_pid: str = "clave_promocion",
+        col_producto: str = "clave_edicion_producto",
+        col_cantidad: str = "cantidad_inicial",
+    ) -> "RequisitosCombinados":
+        """Requisitos válidos (sin pid, producto ni cantidad nulos) de `promociones_combinadas.sql` normalizado."""
+        df = df_combinadas[[col_pid, col_producto, col_cantidad]].apply(pd.to_numeric, errors="coerce").dropna()
+        return cls(
+            df[col_pid].to_numpy(dtype="int64"),
+            df[col_producto].to_numpy(dtype="int64"),
+            df[col_cantidad].to_numpy(dtype="int64"),
+        )
+
+    @classmethod
+    def desde_dict(cls, requisitos_multi: dict) -> "RequisitosCombinados":
+        """Construye desde {pid: [{'clave_edicion_producto', 'cantidad_requerida'}, ...]}."""
+        filas = [
+            (int(pid), r["clave_edicion_producto"], r["cantidad_requerida"])
+            for pid, reqs in requisitos_multi.items()
+            for r in reqs
+        ]
+        if not filas:
+            return cls([], [], [])
+        return cls(*zip(*filas))
+
+    def de_producto(self, producto) -> tuple:
+        """((pid, cantidad_requerida), ...) de las promos que requieren `producto`."""
+        return self.por_producto.get(producto, ())
+
+    # ----------------------------
+    # Interfaz tipo dict
+    # ----------------------------
+    def __len__(self) -> int:
+        return len(self._por_promo)
+
+    def __iter__(self):
+        return iter(self._por_promo)
+
+    def __contains__(self, pid) -> bool:
+        return pid in self._por_promo
+
+    def __getitem__(self, pid) -> tuple:
+        return self._por_promo[pid]
+
+    def get(self, pid, default=()):
+        return self._por_promo.get(pid, default)
+
+    def items(self):
+        return self._por_promo.items()
+
+
+def como_requisitos(requisitos_multi) -> RequisitosCombinados:
+    """Acepta RequisitosCombinados o el dict {pid: [dict, ...]} de versiones previas."""
+    if isinstance(requisitos_multi, RequisitosCombinados):
+        return requisitos_multi
+    return RequisitosCombinados.desde_dict(requisitos_multi)
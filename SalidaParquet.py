@@ -0,0 +1,135 @@
+"""
+Salidas de patrones_promociones y funnel completo como Parquet particionado por día.
+
+El CSV convierte las columnas PROMOS_* en el repr de listas de Python (no se pueden leer
+de vuelta tal cual) y ocupa varias veces lo que el mismo contenido en columnas. Aquí:
+
+- Una carpeta por `attempt_date` (particionado hive: `attempt_date=2025-01-31/`), para que
+  el modo incremental reemplace solo los días del plan y las lecturas filtren por fecha.
+- Compresión zstd; ITEM y las dimensiones de dispositivo/geo/tráfico como diccionario
+  (se leen de vuelta como category).
+- Columnas PROMOS_* como list<int64>; con `promos` (TablaPromos) se arman directo del CSR,
+  sin materializar listas de Python.
+
+`limpiar_salida` borra la salida completa o solo algunos días (equivale a
+`preparar_destino_patrones` en BigQuery); `escribir_parquet` agrega archivos `parte-NNNNN-*`
+(una parte por lote en la ingesta streaming); `leer_parquet` regresa el DataFrame para las
+etapas de análisis sin volver a consultar BigQuery.
+"""
+import logging
+import os
+import shutil
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from ColumnasPromos import TablaPromos
+from LecturaArrow import TIPOS_PANDAS
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+COLUMNA_PARTICION = "attempt_date"
+COMPRESION = "zstd"
+COLUMNAS_DICCIONARIO = (
+    "ITEM",
+    "device_category",
+    "geo_country",
+    "geo_region",
+    "geo_city",
+    "traffic_source",
+    "traffic_medium",
+)
+_LISTA_ENTEROS = pa.list_(pa.int64())
+_PARTICIONADO = ds.partitioning(pa.schema([(COLUMNA_PARTICION, pa.date32())]), flavor="hive")
+_LECTURA = ds.ParquetFileFormat(read_options=ds.ParquetReadOptions(dictionary_columns=list(COLUMNAS_DICCIONARIO)))
+
+
+def tabla_salida(df: pd.DataFrame, promos: Optional[TablaPromos] = None,
+                 columna_fecha: str = COLUMNA_PARTICION) -> pa.Table:
+    """
+    Tabla de Arrow lista para escribir: columnas de `promos` desde el CSR, listas a
+    list<int64>, COLUMNAS_DICCIONARIO codificadas y `attempt_date` (date32) derivada de
+    `columna_fecha` si no existe. Las filas sin fecha de partición no tienen día de destino
+    (igual que en TABLE_PATRONES): se descartan y se registran en el log.
+    """
+    columnas_promos = list(promos.columnas) if promos is not None else []
+    tabla = pa.Table.from_pandas(df.drop(columns=columnas_promos, errors="ignore"), preserve_index=False)
+    for c in columnas_promos:
+        col = promos[c]
+        lista = pa.LargeListArray.from_arrays(col.offsets, col.valores()).cast(_LISTA_ENTEROS)
+        tabla = tabla.append_column(c, lista)
+
+    for i, campo in enumerate(tabla.schema):
+        if pa.types.is_list(campo.type) and campo.type != _LISTA_ENTEROS:
+            # Columnas REPEATED INTEGER desde listas de Python (p. ej. todas vacías -> list<null>)
+            tabla = tabla.set_column(i, campo.name, tabla.column(i).cast(_LISTA_ENTEROS))
+        elif campo.name in COLUMNAS_DICCIONARIO and pa.types.is_string(campo.type):
+            tabla = tabla.set_column(i, campo.name, pc.dictionary_encode(tabla.column(i)))
+
+    if COLUMNA_PARTICION in tabla.column_names:
+        i = tabla.schema.get_field_index(COLUMNA_PARTICION)
+        if tabla.schema.field(i).type != pa.date32():
+            tabla = tabla.set_column(i, COLUMNA_PARTICION, tabla.column(i).cast(pa.date32()))
+    else:
+        tabla = tabla.append_column(COLUMNA_PARTICION, tabla.column(columna_fecha).cast(pa.date32()))
+
+    sin_fecha = tabla.column(COLUMNA_PARTICION).null_count
+    if sin_fecha:
+        logger.warning("Filas sin %s que no se escriben al Parquet: %d", COLUMNA_PARTICION, sin_fecha)
+        tabla = tabla.filter(pc.is_valid(tabla.column(COLUMNA_PARTICION)))
+    return tabla
+
+
+def limpiar_salida(directorio, dias=None) -> None:
+    """Borra toda la salida (dias=None) o solo las carpetas de esos días."""
+    directorio = Path(directorio)
+    if dias is None:
+        shutil.rmtree(directorio, ignore_errors=True)
+        return
+    for dia in dias:
+        shutil.rmtree(directorio / f"{COLUMNA_PARTICION}={pd.Timestamp(dia).date().isoformat()}", ignore_errors=True)
+
+
+def escribir_parquet(df: pd.DataFrame, directorio, promos: Optional[TablaPromos] = None,
+                     columna_fecha: str = COLUMNA_PARTICION, parte: int = 0, nombre: str = "salida") -> int:
+    """
+    Escribe `df` en `directorio` particionado por attempt_date y regresa los bytes escritos.
+    No borra nada: los archivos de otra `parte` (otro lote) conviven en la misma partición.
+    """
+    t0 = perf_counter()
+    tabla = tabla_salida(df, promos, columna_fecha)
+    escritos = []
+    ds.write_dataset(
+        tabla,
+        Path(directorio),
+        format="parquet",
+        partitioning=_PARTICIONADO,
+        basename_template=f"parte-{parte:05d}-{{i}}.parquet",
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESION),
+        file_visitor=lambda archivo: escritos.append(archivo.path),
+    )
+    total = sum(os.path.getsize(p) for p in escritos)
+    logger.info("Parquet %s: %d filas en %d archivos, %.1f MB en disco, %.2fs (%s)",
+                nombre, tabla.num_rows, len(escritos), total / (1024 ** 2), perf_counter() - t0, directorio)
+    return total
+
+
+def leer_parquet(directorio, dias=None, columnas=None) -> pd.DataFrame:
+    """
+    DataFrame desde una salida de `escribir_parquet` (opcionalmente solo `dias` y `columnas`).
+    attempt_date regresa como fecha; las listas, como arreglos (igual que la lectura vía Arrow).
+    """
+    dataset = ds.dataset(Path(directorio), format=_LECTURA, partitioning=_PARTICIONADO)
+    filtro = None
+    if dias is not None:
+        fechas = pa.array([pd.Timestamp(d).date() for d in dias], type=pa.date32())
+        filtro = ds.field(COLUMNA_PARTICION).isin(fechas)
+    tabla = dataset.to_table(columns=columnas, filter=filtro)
+    return tabla.to_pandas(types_mapper=TIPOS_PANDAS.get)
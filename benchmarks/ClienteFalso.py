@@ -0,0 +1,290 @@
+"""
+Cliente falso de BigQuery en memoria para correr la extracción sin credenciales.
+
+`ClienteFalso.query(sql)` regresa un job cuyo `result()` bloquea hasta que pasa la
+latencia simulada de esa query (contada desde el envío, como un job que corre del lado
+del servidor) y luego entrega el DataFrame registrado vía `to_dataframe()` / `to_arrow()`.
+Lleva un registro de envíos y de cuántas queries llegaron a correr a la vez.
+`get_table` regresa la última modificación registrada de cada tabla (ver `modificar`),
+para probar la vigencia de CacheConsultas.
+
+Para BQLoad (`BQLoad(client=ClienteFalso(...))`): `create_table`, `delete_table`, `copy_table`,
+`get_job` y `load_table_from_dataframe`, cuyo job tarda `latencia_carga` (más ~`segundos_por_millon`
+por millón de filas, como la subida). Fallas transitorias simuladas por destino, las primeras N veces:
+`fallas_carga` (el job termina con error_result y no escribe), `fallas_envio` (el job sí se crea pero
+el envío da error de conexión) y `fallas_espera` (result() da error de conexión aunque el job sigue y
+termina bien). Un job_id repetido da 409. Las cargas terminadas quedan en `cargas`.
+
+`MetadatosFalsos` reemplaza a ManifiestoDDL.MetadatosBigQuery: tablas con su última
+modificación que se pueden agregar, modificar o eliminar entre corridas.
+"""
+import threading
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+
+
+class _ResultadoFalso:
+    def __init__(self, df):
+        self._df = df
+
+    @property
+    def total_rows(self):
+        return 0 if self._df is None else len(self._df)
+
+    def to_dataframe(self, bqstorage_client=None, **_):
+        return pd.DataFrame() if self._df is None else self._df.copy()
+
+    def to_arrow(self, bqstorage_client=None, **_):
+        return pa.table({}) if self._df is None else pa.Table.from_pandas(self._df, preserve_index=False)
+
+
+class _TablaFalsa:
+    def __init__(self, tabla, modified, time_partitioning=None, clustering_fields=None):
+        self.table_id = tabla
+        self.table_type = "TABLE"
+        self.modified = modified
+        self.time_partitioning = time_partitioning
+        self.clustering_fields = clustering_fields
+
+
+class _JobFalso:
+    def __init__(self, cliente, sql, df, error, t_fin):
+        self._cliente = cliente
+        self.query = sql
+        self._df = df
+        self._error = error
+        self._t_fin = t_fin
+        self._terminado = False
+
+    def result(self):
+        espera = self._t_fin - time.perf_counter()
+        if espera > 0:
+            time.sleep(espera)
+        if not self._terminado:
+            self._terminado = True
+            self._cliente._terminar()
+        if self._error is not None:
+            raise self._error
+        return _ResultadoFalso(self._df)
+
+    def to_dataframe(self, **kwargs):
+        return self.result().to_dataframe(**kwargs)
+
+
+class _Conflicto(Exception):
+    """Como google.api_core.exceptions.Conflict: el job_id ya existe."""
+    code = 409
+
+
+class _JobCargaFalso:
+    def __init__(self, cliente, job_id, destino, filas, disposicion, error, t_fin):
+        self._cliente = cliente
+        self.job_id = job_id
+        self.destination = destino
+        self.filas = filas
+        self.disposicion = disposicion
+        self._error = error
+        self._t_fin = t_fin
+        self.cancelado = False
+        self._terminado = False
+
+    @property
+    def state(self):
+        return "DONE" if self._terminado else "RUNNING"
+
+    @property
+    def error_result(self):
+        if self._terminado and self._error is not None:
+            return {"reason": "backendError", "message": str(self._error)}
+        return None
+
+    def reload(self):
+        if not self._terminado and time.perf_counter() >= self._t_fin:
+            self._terminado = True
+            self._cliente._terminar_carga(self)
+
+    def result(self, timeout=None):
+        if self._cliente._falla("fallas_espera", self.destination):
+            raise ConnectionError(f"Conexión interrumpida esperando el job {self.job_id}")
+        espera = self._t_fin - time.perf_counter()
+        if timeout is not None and espera > timeout:
+            time.sleep(timeout)
+            raise FutureTimeoutError(f"Job de carga a {self.destination} sin terminar tras {timeout}s")
+        if espera > 0:
+            time.sleep(espera)
+        self.reload()
+        if self._error is not None:
+            raise self._error
+        return self
+
+    def cancel(self):
+        self.cancelado = True
+        if not self._terminado:
+            self._terminado = True
+            self._cliente._terminar_carga(self)
+        return True
+
+
+class _JobCopiaFalso:
+    def __init__(self, cliente, origen, destino):
+        self._cliente = cliente
+        self.origen = origen
+        self.destino = destino
+
+    def result(self, timeout=None):
+        self._cliente._copiar(self.origen, self.destino)
+        return self
+
+
+class ClienteFalso:
+    """
+    `respuestas` es {sql: DataFrame o None (DDL)}; `latencias` {sql: segundos} (por omisión
+    `latencia`); `errores` {sql: excepción} para simular fallas; `tablas` {tabla: datetime de
+    última modificación} para `get_table` (una tabla no registrada da KeyError).
+    """
+
+    def __init__(self, respuestas: dict = None, latencia: float = 0.1, latencias: dict = None, errores: dict = None,
+                 tablas: dict = None, latencia_carga: float = 0.1, segundos_por_millon: float = 0.0,
+                 fallas_carga: dict = None, fallas_envio: dict = None, fallas_espera: dict = None):
+        self.respuestas = respuestas or {}
+        self.latencia = latencia
+        self.latencias = latencias or {}
+        self.errores = errores or {}
+        self.tablas = dict(tablas or {})
+        self.latencia_carga = latencia_carga
+        self.segundos_por_millon = segundos_por_millon
+        self.fallas_carga = dict(fallas_carga or {})
+        self.fallas_envio = dict(fallas_envio or {})
+        self.fallas_espera = dict(fallas_espera or {})
+        self.enviadas = []
+        self.cargas = []
+        self.copias = []
+        self.eliminadas = []
+        self.max_concurrentes = 0
+        self.max_cargas_concurrentes = 0
+        self._creadas = {}
+        self._jobs = {}
+        self._corriendo = 0
+        self._cargando = 0
+        self._candado = threading.Lock()
+
+    def query(self, sql: str):
+        if sql not in self.respuestas and sql not in self.errores:
+            raise KeyError(f"Query no registrada en el cliente falso: {sql[:60]!r}")
+        with self._candado:
+            self.enviadas.append((sql, time.perf_counter()))
+            self._corriendo += 1
+            self.max_concurrentes = max(self.max_concurrentes, self._corriendo)
+        t_fin = time.perf_counter() + self.latencias.get(sql, self.latencia)
+        return _JobFalso(self, sql, self.respuestas.get(sql), self.errores.get(sql), t_fin)
+
+    def get_table(self, tabla: str):
+        if tabla in self._creadas:
+            return self._creadas[tabla]
+        return _TablaFalsa(tabla, self.tablas[tabla])
+
+    def create_table(self, tabla, exists_ok: bool = False):
+        with self._candado:
+            if tabla.table_id in self._creadas:
+                if not exists_ok:
+                    raise ValueError(f"La tabla {tabla.table_id} ya existe")
+                return self._creadas[tabla.table_id]
+            creada = _TablaFalsa(tabla.table_id, datetime.now(timezone.utc),
+                                 tabla.time_partitioning, tabla.clustering_fields)
+            self._creadas[tabla.table_id] = creada
+            return creada
+
+    def delete_table(self, tabla: str, not_found_ok: bool = False):
+        with self._candado:
+            self.eliminadas.append(tabla)
+            if "$" in tabla:
+                return
+            if self._creadas.pop(tabla, None) is None and not not_found_ok:
+                raise KeyError(f"No existe la tabla {tabla}")
+
+    def copy_table(self, origen: str, destino: str, job_config=None):
+        return _JobCopiaFalso(self, origen, destino)
+
+    def get_job(self, job_id: str, location=None):
+        return self._jobs[job_id]
+
+    def load_table_from_dataframe(self, df, destino: str, job_config=None, job_id: str = None):
+        tabla = destino.split("$")[0]
+        with self._candado:
+            if job_id is not None and job_id in self._jobs:
+                raise _Conflicto(f"Already Exists: Job {job_id}")
+            if tabla not in self._creadas:
+                self._creadas[tabla] = _TablaFalsa(tabla, datetime.now(timezone.utc))
+            error = None
+            if self.fallas_carga.get(destino, 0) > 0:
+                self.fallas_carga[destino] -= 1
+                error = ConnectionError(f"Conexión interrumpida al cargar {destino}")
+            self._cargando += 1
+            self.max_cargas_concurrentes = max(self.max_cargas_concurrentes, self._cargando)
+            t_fin = time.perf_counter() + self.latencia_carga + self.segundos_por_millon * len(df) / 1_000_000
+            job_id = job_id or f"job_{len(self._jobs)}"
+            job = _JobCargaFalso(self, job_id, destino, len(df), getattr(job_config, "write_disposition", None),
+                                 error, t_fin)
+            self._jobs[job_id] = job
+        if self._falla("fallas_envio", destino):
+            raise ConnectionError(f"Conexión interrumpida enviando el job {job_id} (el job sí se creó)")
+        return job
+
+    def modificar(self, tabla: str) -> None:
+        """Marca `tabla` como modificada ahora (invalida las entradas de caché que la leen)."""
+        self.tablas[tabla] = datetime.now(timezone.utc)
+
+    def _falla(self, tipo: str, destino: str) -> bool:
+        """Consume una de las fallas `tipo` ("fallas_envio", "fallas_espera") pendientes para `destino`."""
+        fallas = getattr(self, tipo)
+        with self._candado:
+            if fallas.get(destino, 0) > 0:
+                fallas[destino] -= 1
+                return True
+            return False
+
+    def _copiar(self, origen: str, destino: str):
+        with self._candado:
+            tabla = self._creadas[origen]
+            self._creadas[destino] = _TablaFalsa(destino, datetime.now(timezone.utc),
+                                                 tabla.time_partitioning, tabla.clustering_fields)
+            self.copias.append((origen, destino))
+
+    def _terminar(self):
+        with self._candado:
+            self._corriendo -= 1
+
+    def _terminar_carga(self, job):
+        with self._candado:
+            self._cargando -= 1
+            if job._error is None and not job.cancelado:
+                self.cargas.append((job.destination, job.filas, job.disposicion))
+
+
+class MetadatosFalsos:
+    """`tablas` es {proyecto.dataset.tabla: datetime de última modificación}; cuenta las consultas hechas."""
+
+    def __init__(self, tablas: dict = None):
+        self._tablas = dict(tablas or {})
+        self.consultas = 0
+
+    def tablas(self, dataset: str, prefijo: str) -> dict:
+        self.consultas += 1
+        inicio = f"{dataset}.{prefijo}"
+        return {tabla[len(dataset) + 1:]: modificada.isoformat()
+                for tabla, modificada in self._tablas.items() if tabla.startswith(inicio)}
+
+    def modificacion(self, tabla: str):
+        modificada = self._tablas.get(tabla)
+        return None if modificada is None else modificada.isoformat()
+
+    def modificar(self, tabla: str) -> None:
+        """Crea `tabla` o la marca como modificada ahora."""
+        self._tablas[tabla] = datetime.now(timezone.utc)
+
+    def eliminar(self, tabla: str) -> None:
+        self._tablas.pop(tabla, None)
@@ -0,0 +1,279 @@
+"""
+Curvas de escalamiento de los motores de detección, con verificación de equivalencia.
+
+Barre una dimensión de la carga sintética a la vez (el resto queda en la config base):
+
+    sesiones, filas_por_sesion, condiciones_simples, promos_combinadas
+
+y en cada punto corre cada motor sobre las mismas entradas, midiendo tiempo y memoria
+pico (Medicion.medir). La salida de cada motor se compara fila por fila, en todas las
+columnas PATRON_* / PROMOS_* / DESC_*, contra el motor "referencia": la detección original
+congelada en benchmarks.Referencia (groupby + iterrows sobre `df_condiciones_enriquecido` y
+los dicts `requisitos_multi` / `vigencia_promo`), no las funciones actuales de ReglasPromociones.
+
+    python -m benchmarks.Escalamiento [--dimensiones sesiones,promos_combinadas]
+        [--motores referencia,fila,vectorizado] [--valores sesiones=1000:4000:16000]
+        [--salida curvas.csv] [--grafica curvas.png]
+
+Termina con código 1 si algún motor difiere de la referencia.
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from DeteccionVectorizada import COLUMNAS_RESULTADO
+
+from benchmarks.Etapas import detectar_fila, detectar_paralelo, detectar_vectorizado, preparar_entradas
+from benchmarks.GeneradorSintetico import ConfigCarga, generar_carga
+from benchmarks.Medicion import entorno, guardar_resultados, medir
+from benchmarks.Referencia import detectar_patrones_referencia, promos_combinadas_referencia, vigencia_referencia
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+CONFIG_BASE = ConfigCarga(sesiones=2000)
+DIMENSIONES = {
+    "sesiones": [1000, 2000, 4000, 8000],
+    "filas_por_sesion": [1.5, 3.0, 6.0, 12.0],
+    "condiciones_simples": [100, 300, 1000, 3000],
+    "promos_combinadas": [5, 20, 80, 320],
+}
+MAX_DIFERENCIAS_LOG = 10
+
+
+# ----------------------------
+# Motores: motor(entradas, opciones) -> DataFrame con COLUMNAS_RESULTADO
+# ----------------------------
+def detectar_referencia(e: dict) -> pd.DataFrame:
+    """
+    Detección original (benchmarks.Referencia) con sus entradas crudas: no usa ReglasCompiladas,
+    RequisitosCombinados ni IndiceVigencia; promos_multi, requisitos_multi y vigencia_promo se
+    arman de nuevo desde las tablas de la carga, como en el H1Script original.
+    """
+    carga = e["carga"]
+    promos_multi, requisitos_multi = promos_combinadas_referencia(carga["promociones_combinadas"])
+    vigencia_promo = vigencia_referencia(carga["catalogo_promociones_fechas"])
+    if not (e["base"]["USER"].notna() & e["base"]["SESION"].notna()).any():
+        return pd.DataFrame(columns=COLUMNAS_RESULTADO)
+    return detectar_patrones_referencia(e["base"], e["condiciones"], promos_multi, requisitos_multi, vigencia_promo)
+
+
+def _motor_vectorizado(e, _):
+    df_resultados, promos_resultado = detectar_vectorizado(e)
+    return promos_resultado.materializar(df_resultados)
+
+
+MOTORES = {
+    "referencia": lambda e, _: detectar_referencia(e),
+    "fila": lambda e, _: detectar_fila(e),
+    "vectorizado": _motor_vectorizado,
+    "paralelo": lambda e, opciones: detectar_paralelo(e, opciones.get("workers")),
+}
+# El paralelo depende de los núcleos de la máquina: solo corre si se pide
+MOTORES_POR_DEFECTO = ["referencia", "fila", "vectorizado"]
+
+
+# ----------------------------
+# Equivalencia
+# ----------------------------
+def _canonico(valor):
+    if isinstance(valor, (list, tuple, np.ndarray)):
+        return tuple(int(v) for v in valor)
+    if valor is None or (not isinstance(valor, str) and pd.isna(valor)):
+        return None
+    return valor
+
+
+def diferencias(df: pd.DataFrame, df_referencia: pd.DataFrame, indice: pd.Index) -> list:
+    """
+    Celdas distintas entre dos salidas de detección, alineadas sobre `indice`
+    (las filas que un motor omite cuentan como nulas). Regresa [(columna, índice, valor, esperado)].
+    """
+    df = df.reindex(indice)
+    df_referencia = df_referencia.reindex(indice)
+    encontradas = []
+    for col in COLUMNAS_RESULTADO:
+        if col not in df.columns or col not in df_referencia.columns:
+            encontradas.append((col, None, "sin columna" if col not in df.columns else "", ""))
+            continue
+        for idx, valor, esperado in zip(indice, df[col].tolist(), df_referencia[col].tolist()):
+            valor, esperado = _canonico(valor), _canonico(esperado)
+            if valor != esperado:
+                encontradas.append((col, idx, valor, esperado))
+    return encontradas
+
+
+# ----------------------------
+# Barrido
+# ----------------------------
+def medir_punto(config: ConfigCarga, motores, repeticiones: int = 1, memoria: bool = True,
+                workers=None) -> list:
+    """Mide cada motor sobre la carga de `config` y verifica su salida contra la referencia."""
+    entradas = preparar_entradas(generar_carga(config))
+    filas = len(entradas["base"])
+    opciones = {"workers": workers}
+    df_referencia = MOTORES["referencia"](entradas, opciones)
+    # Las filas sin USER/SESION no se evalúan (ningún motor les asigna patrón)
+    base = entradas["base"]
+    con_sesion = base.index[base["USER"].notna() & base["SESION"].notna()]
+
+    puntos = []
+    for motor in motores:
+        funcion = MOTORES[motor]
+        medida = medir(lambda: funcion(entradas, opciones), filas, repeticiones=repeticiones, memoria=memoria)
+        distintas = [] if motor == "referencia" else diferencias(
+            funcion(entradas, opciones), df_referencia, con_sesion
+        )
+        for col, idx, valor, esperado in distintas[:MAX_DIFERENCIAS_LOG]:
+            logger.error("%s difiere de la referencia en %s[%s]: %r != %r", motor, col, idx, valor, esperado)
+        puntos.append({
+            "motor": motor,
+            "filas": filas,
+            "sesiones": len(entradas["indice"]),
+            "condiciones": len(entradas["condiciones"]),
+            "promos_combinadas": len(entradas["requisitos"]),
+            "segundos": medida["segundos"],
+            "filas_por_segundo": medida["filas_por_segundo"],
+            "memoria_pico_mb": medida["memoria_pico_mb"],
+            "diferencias": len(distintas),
+        })
+    return puntos
+
+
+def curvas_escalamiento(config_base: ConfigCarga = None, dimensiones: dict = None, motores=None,
+                        repeticiones: int = 1, memoria: bool = True, workers=None) -> pd.DataFrame:
+    """
+    Una fila por (dimensión, valor, motor) con tiempo, filas/segundo, memoria pico y
+    número de celdas distintas a la referencia. `dimensiones` es {atributo de ConfigCarga: valores}.
+    """
+    config_base = config_base or CONFIG_BASE
+    dimensiones = dimensiones or DIMENSIONES
+    motores = list(motores or MOTORES_POR_DEFECTO)
+    desconocidos = [m for m in motores if m not in MOTORES]
+    if desconocidos:
+        raise ValueError(f"Motores desconocidos: {desconocidos} (disponibles: {list(MOTORES)})")
+
+    filas = []
+    for dimension, valores in dimensiones.items():
+        for valor in valores:
+            config = config_base.con(**{dimension: valor})
+            logger.info("Escalamiento %s=%s", dimension, valor)
+            for punto in medir_punto(config, motores, repeticiones, memoria, workers):
+                filas.append({"dimension": dimension, "valor": valor, **punto})
+                logger.info("  %-12s %8d filas %8.3fs %s", punto["motor"], punto["filas"], punto["segundos"],
+                            "OK" if punto["diferencias"] == 0 else f"{punto['diferencias']} diferencias")
+    return pd.DataFrame(filas)
+
+
+def tabla_curvas(df: pd.DataFrame) -> str:
+    """Segundos por motor (columnas) para cada (dimensión, valor)."""
+    tabla = df.pivot_table(index=["dimension", "valor"], columns="motor", values="segundos", sort=False)
+    return tabla.to_string(float_format=lambda s: f"{s:.3f}")
+
+
+def graficar_curvas(df: pd.DataFrame, path) -> bool:
+    """Tiempo y memoria vs. tamaño, un panel por dimensión. Requiere matplotlib (opcional)."""
+    try:
+        import matplotlib
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        logger.warning("matplotlib no disponible; no se genera la gráfica %s", path)
+        return False
+
+    dimensiones = list(dict.fromkeys(df["dimension"]))
+    fig, ejes = plt.subplots(2, len(dimensiones), figsize=(4 * len(dimensiones), 7), squeeze=False)
+    for j, dimension in enumerate(dimensiones):
+        df_dim = df[df["dimension"] == dimension]
+        for motor, df_motor in df_dim.groupby("motor", sort=False):
+            ejes[0][j].plot(df_motor["valor"], df_motor["segundos"], marker="o", label=motor)
+            ejes[1][j].plot(df_motor["valor"], df_motor["memoria_pico_mb"], marker="o", label=motor)
+        ejes[0][j].set_title(dimension)
+        ejes[0][j].set_ylabel("segundos")
+        ejes[1][j].set_ylabel("memoria pico (MB)")
+        ejes[1][j].set_xlabel(dimension)
+        for eje in (ejes[0][j], ejes[1][j]):
+            eje.set_xscale("log")
+            eje.set_yscale("log")
+            eje.legend(fontsize="small")
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+    return True
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def _valores(textos, dimensiones: dict) -> dict:
+    """`dimension=v1:v2:v3` -> reemplaza los valores del barrido de esa dimensión."""
+    dimensiones = dict(dimensiones)
+    for texto in textos or []:
+        dimension, _, valores = texto.partition("=")
+        if dimension not in DIMENSIONES:
+            raise ValueError(f"Dimensión desconocida: {dimension} (disponibles: {list(DIMENSIONES)})")
+        tipo = float if dimension == "filas_por_sesion" else int
+        dimensiones[dimension] = [tipo(v) for v in valores.split(":")]
+    return dimensiones
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.Escalamiento",
+                                     description="Curvas de escalamiento de los motores de detección")
+    parser.add_argument("--dimensiones", default=None, help=f"separadas por comas: {','.join(DIMENSIONES)}")
+    parser.add_argument("--valores", action="append", help="dimension=v1:v2:... (repetible)")
+    parser.add_argument("--motores", default=None,
+                        help=f"separados por comas (por defecto {','.join(MOTORES_POR_DEFECTO)}): {','.join(MOTORES)}")
+    parser.add_argument("--sesiones-base", type=int, default=CONFIG_BASE.sesiones)
+    parser.add_argument("--semilla", type=int, default=CONFIG_BASE.semilla)
+    parser.add_argument("--repeticiones", type=int, default=1)
+    parser.add_argument("--sin-memoria", action="store_true")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--salida", type=Path, default=None, help="CSV o JSON con un renglón por punto y motor")
+    parser.add_argument("--grafica", type=Path, default=None, help="PNG con tiempo y memoria vs. tamaño")
+    args = parser.parse_args(argv)
+
+    dimensiones = _valores(args.valores, DIMENSIONES)
+    if args.dimensiones:
+        dimensiones = {d: dimensiones[d] for d in args.dimensiones.split(",")}
+    config_base = CONFIG_BASE.con(sesiones=args.sesiones_base, semilla=args.semilla)
+    motores = args.motores.split(",") if args.motores else MOTORES_POR_DEFECTO
+
+    df = curvas_escalamiento(config_base, dimensiones, motores, args.repeticiones,
+                             memoria=not args.sin_memoria, workers=args.workers)
+    print(tabla_curvas(df))
+
+    if args.salida is not None:
+        if args.salida.suffix == ".json":
+            guardar_resultados(args.salida, {
+                "creado": datetime.now().isoformat(timespec="seconds"),
+                "config_base": config_base.a_dict(),
+                "entorno": entorno(),
+                "puntos": df.to_dict(orient="records"),
+            })
+        else:
+            args.salida.parent.mkdir(parents=True, exist_ok=True)
+            df.to_csv(args.salida, index=False)
+        logger.info("Curvas guardadas: %s", args.salida)
+    if args.grafica is not None and graficar_curvas(df, args.grafica):
+        logger.info("Gráfica guardada: %s", args.grafica)
+
+    con_diferencias = df[df["diferencias"] > 0]
+    for fila in con_diferencias.itertuples():
+        logger.error("%s no es equivalente a la referencia con %s=%s (%d celdas)",
+                     fila.motor, fila.dimension, fila.valor, fila.diferencias)
+    return 1 if len(con_diferencias) else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    sys.exit(main())
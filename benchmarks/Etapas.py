@@ -0,0 +1,388 @@
+"""
+Benchmarks por etapa del pipeline sobre una carga sintética (GeneradorSintetico).
+
+`preparar_entradas` corre una vez la cadena real (EtapasPipeline, índices, reglas)
+para tener las entradas de cada etapa; después cada etapa se mide aislada, con las
+mismas funciones que llaman H1Script y H1ShortScript:
+
+    fecha_evento          parseo de DATETIME -> FECHA_EVENTO
+    limpieza_item         limpiar_items sobre ITEM de GA4
+    merge_sorteo          preparar_eventos_base (limpieza + merge con sorteo + montos)
+    merge_condiciones     condiciones + grupos + vigencias + tipo de cantidad + interpretación
+    promos_combinadas     normalización + RequisitosCombinados + IndiceVigencia
+    compilacion_reglas    ReglasCompiladas.compilar
+    indice_sesiones       IndiceSesiones sobre (USER, SESION)
+    deteccion_fila        motor "fila" (con reglas compiladas e índice de sesiones)
+    deteccion_vectorizado motor "vectorizado" (completitud matricial + CSR)
+    deteccion_paralelo    motor "paralelo" (solo si se pide: depende de los núcleos)
+    preparacion_carga     columnas resumen + listas PROMOS_* + Parquet (lo que serializa BQLoad)
+    limpieza_funnel       limpiar_funnel (ITEM, precio inferido, montos)
+    kpis_sesion           agregar_sesiones (nivel sesión de los KPIs)
+    flags                 flags ADD_TO_CART por fila y por sesión
+    decodificacion_arrow  tabla Arrow -> DataFrame con los dtypes de LecturaArrow (GA4 + funnel)
+    extraccion_concurrente  DDL + queries de soporte + GA4 con ExtraccionConcurrente sobre un
+                          cliente falso con LATENCIA_FALSA por query (tiempo ~ la más lenta)
+    extraccion_secuencial   las mismas queries una tras otra (referencia, tiempo ~ la suma)
+    salida_parquet        patrones a Parquet particionado por attempt_date (SalidaParquet, desde el CSR)
+    salida_csv            patrones materializados a CSV (referencia; la salida anterior, ahora opcional)
+    carga_solapada        carga del funnel con BQLoad.load_table_async sobre un cliente falso con
+                          LATENCIA_FALSA_CARGA mientras corren KPIs y flags (tiempo ~ el mayor)
+    carga_secuencial      la misma carga esperada antes de KPIs y flags (referencia, tiempo ~ la suma)
+"""
+import atexit
+import io
+import logging
+import shutil
+import tempfile
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ColumnasPromos import TablaPromos, flags_por_sesion, flags_simples_combinadas
+from DeteccionParalela import detectar_patrones_paralelo
+from DeteccionVectorizada import detectar_patrones_vectorizado, evaluar_promociones_combinadas_matricial
+from ExtraccionConcurrente import Consulta, ejecutar_consultas
+from EtapasPipeline import (
+    agregar_columnas_resumen,
+    agregar_sesiones,
+    enriquecer_condiciones,
+    limpiar_funnel,
+    limpiar_items,
+    normalizar_promos_combinadas,
+    preparar_eventos_base,
+    preparar_sorteo,
+    unir_condiciones,
+)
+from IndiceSesiones import IndiceSesiones
+from IndiceVigencia import IndiceVigencia
+from LecturaArrow import DTYPES_QUERY, tabla_a_df
+from ReglasCompiladas import ReglasCompiladas
+from ReglasPromociones import agregar_fecha_evento, detectar_patrones_fila, parsear_datetime_mx
+from RequisitosCombinados import RequisitosCombinados
+from SalidaParquet import escribir_parquet, limpiar_salida
+
+from benchmarks.ClienteFalso import ClienteFalso
+from benchmarks.GeneradorSintetico import ConfigCarga, generar_carga
+from benchmarks.Medicion import medir, resultados
+
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+
+def preparar_entradas(carga: dict) -> dict:
+    """Salidas intermedias de la cadena real, para alimentar cada etapa por separado."""
+    e = {"carga": carga}
+    e["sorteo"] = preparar_sorteo(carga["sorteo"].copy())
+    e["ga4"] = agregar_fecha_evento(carga["ga4_events"].copy())
+    e["base"] = preparar_eventos_base(e["ga4"], e["sorteo"])
+
+    condiciones_base = unir_condiciones(
+        carga["condiciones_promocion"], carga["grupo_condicion_promocion"], carga["catalogo_promociones_fechas"]
+    )
+    e["condiciones"] = enriquecer_condiciones(condiciones_base, carga["tipo_cantidad_promocion"])
+
+    df_combinadas = normalizar_promos_combinadas(carga["promociones_combinadas"])
+    e["promos_multi"] = set(df_combinadas["clave_promocion"].dropna().astype(int).unique())
+    e["requisitos"] = RequisitosCombinados.desde_df(df_combinadas)
+    e["vigencia"] = IndiceVigencia.desde_df(carga["catalogo_promociones_fechas"])
+    e["reglas"] = ReglasCompiladas.compilar(e["condiciones"], e["promos_multi"])
+    e["indice"] = IndiceSesiones.desde_df(e["base"], ["USER", "SESION"])
+
+    e["funnel"] = limpiar_funnel(carga["patrones_funnel_completo"], carga["sorteo"])
+    e["indice_funnel"], _ = agregar_sesiones(e["funnel"])
+    return e
+
+
+def detectar_vectorizado(e: dict):
+    """(df_resultados, promos_resultado) del motor vectorizado, como en H1Script.detectar_patrones."""
+    completitud = evaluar_promociones_combinadas_matricial(
+        df_eventos=e["base"], requisitos_multi=e["requisitos"], vigencia_promo=e["vigencia"]
+    )
+    return detectar_patrones_vectorizado(
+        df_eventos=e["base"],
+        condiciones_df=e["condiciones"],
+        promos_multi=e["promos_multi"],
+        requisitos_multi=e["requisitos"],
+        vigencia_promo=e["vigencia"],
+        completitud_sesiones=completitud,
+        como_csr=True,
+    )
+
+
+def detectar_fila(e: dict) -> pd.DataFrame:
+    return detectar_patrones_fila(
+        df_eventos=e["base"],
+        condiciones_df=e["reglas"],
+        promos_multi=e["promos_multi"],
+        requisitos_multi=e["requisitos"],
+        vigencia_promo=e["vigencia"],
+        reportar_progreso=False,
+        indice_sesiones=e["indice"],
+    )
+
+
+def detectar_paralelo(e: dict, workers=None) -> pd.DataFrame:
+    return detectar_patrones_paralelo(
+        df_eventos=e["base"],
+        condiciones_df=e["reglas"],
+        promos_multi=e["promos_multi"],
+        requisitos_multi=e["requisitos"],
+        vigencia_promo=e["vigencia"],
+        n_workers=workers,
+    )
+
+
+# ----------------------------
+# Etapas: preparar(entradas, opciones) -> (función sin argumentos, filas)
+# ----------------------------
+def _fecha_evento(e, _):
+    serie = e["carga"]["ga4_events"]["DATETIME"]
+    return (lambda: parsear_datetime_mx(serie)), len(serie)
+
+
+def _limpieza_item(e, _):
+    serie = e["carga"]["ga4_events"]["ITEM"]
+    return (lambda: limpiar_items(serie)), len(serie)
+
+
+def _merge_sorteo(e, _):
+    return (lambda: preparar_eventos_base(e["ga4"], e["sorteo"])), len(e["ga4"])
+
+
+def _merge_condiciones(e, _):
+    carga = e["carga"]
+
+    def correr():
+        base = unir_condiciones(
+            carga["condiciones_promocion"], carga["grupo_condicion_promocion"], carga["catalogo_promociones_fechas"]
+        )
+        return enriquecer_condiciones(base, carga["tipo_cantidad_promocion"])
+    return correr, len(carga["condiciones_promocion"])
+
+
+def _promos_combinadas(e, _):
+    carga = e["carga"]
+
+    def correr():
+        df_combinadas = normalizar_promos_combinadas(carga["promociones_combinadas"])
+        return RequisitosCombinados.desde_df(df_combinadas), IndiceVigencia.desde_df(carga["catalogo_promociones_fechas"])
+    return correr, len(carga["promociones_combinadas"])
+
+
+def _compilacion_reglas(e, _):
+    return (lambda: ReglasCompiladas.compilar(e["condiciones"], e["promos_multi"])), len(e["condiciones"])
+
+
+def _indice_sesiones(e, _):
+    return (lambda: IndiceSesiones.desde_df(e["base"], ["USER", "SESION"])), len(e["base"])
+
+
+def _deteccion_fila(e, _):
+    return (lambda: detectar_fila(e)), len(e["base"])
+
+
+def _deteccion_vectorizado(e, _):
+    return (lambda: detectar_vectorizado(e)), len(e["base"])
+
+
+def _deteccion_paralelo(e, opciones):
+    return (lambda: detectar_paralelo(e, opciones.get("workers"))), len(e["base"])
+
+
+def _preparacion_carga(e, _):
+    df_resultados, promos_resultado = detectar_vectorizado(e)
+    df_final = pd.concat([e["base"], df_resultados], axis=1)
+
+    def correr():
+        agregar_columnas_resumen(df_final, promos_resultado)
+        df = promos_resultado.materializar(df_final)
+        # load_table_from_dataframe serializa el DataFrame a Parquet con pyarrow
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), io.BytesIO())
+    return correr, len(df_final)
+
+
+def _limpieza_funnel(e, _):
+    carga = e["carga"]
+    return (lambda: limpiar_funnel(carga["patrones_funnel_completo"], carga["sorteo"])), len(e["funnel"])
+
+
+def _kpis_sesion(e, _):
+    return (lambda: agregar_sesiones(e["funnel"])), len(e["funnel"])
+
+
+def _flags(e, _):
+    df = e["funnel"]
+
+    def correr():
+        promos_flags = TablaPromos.desde_df(df, ["PROMOS_ADD_CART_INCOMPLETAS", "PROMOS_ADD_CART_COMPLETAS"])
+        flags_fila = flags_simples_combinadas(promos_flags, e["promos_multi"])
+        return flags_por_sesion(df, flags_fila, indice=e["indice_funnel"])
+    return correr, len(df)
+
+
+def _decodificacion_arrow(e, _):
+    # Lo que hace LecturaArrow.leer_query después de la descarga
+    tablas = {q: pa.Table.from_pandas(e["carga"][q], preserve_index=False) for q in DTYPES_QUERY}
+
+    def correr():
+        return {q: tabla_a_df(tabla, DTYPES_QUERY[q]) for q, tabla in tablas.items()}
+    return correr, sum(t.num_rows for t in tablas.values())
+
+
+# Latencia simulada de cada job en el cliente falso (segundos)
+LATENCIA_FALSA = 0.2
+
+
+def plan_extraccion(carga: dict):
+    """(ClienteFalso, [Consulta]) con la forma del plan de H1Script: 2 DDL + soporte + GA4 tras base_patrones."""
+    respuestas = {"base_patrones": None, "complemento_funnel": None}
+    consultas = [Consulta("base_patrones", "base_patrones", ddl=True),
+                 Consulta("complemento_funnel", "complemento_funnel", ddl=True)]
+    for nombre, df in carga.items():
+        if nombre == "patrones_funnel_completo":
+            continue
+        respuestas[nombre] = df
+        if nombre == "ga4_events":
+            consultas.append(Consulta(nombre, nombre, dtypes=DTYPES_QUERY[nombre], depende_de=["base_patrones"]))
+        else:
+            consultas.append(Consulta(nombre, nombre))
+    return ClienteFalso(respuestas, latencia=LATENCIA_FALSA), consultas
+
+
+def _extraccion_concurrente(e, _):
+    cliente, consultas = plan_extraccion(e["carga"])
+    return (lambda: ejecutar_consultas(cliente, consultas)), len(e["carga"]["ga4_events"])
+
+
+def _extraccion_secuencial(e, _):
+    cliente, consultas = plan_extraccion(e["carga"])
+
+    def correr():
+        return {c.nombre: ejecutar_consultas(cliente, [Consulta(c.nombre, c.sql, c.ddl, c.dtypes)])[c.nombre]
+                for c in consultas}
+    return correr, len(e["carga"]["ga4_events"])
+
+
+def _patrones_finales(e):
+    """df_ga4_events_final (sin listas) y TablaPromos, como quedan antes de guardar en H1Script."""
+    df_resultados, promos_resultado = detectar_vectorizado(e)
+    df_final = pd.concat([e["base"], df_resultados], axis=1)
+    agregar_columnas_resumen(df_final, promos_resultado)
+    return df_final, promos_resultado
+
+
+def _directorio_temporal() -> str:
+    directorio = tempfile.mkdtemp(prefix="h1_bench_salida_")
+    atexit.register(shutil.rmtree, directorio, True)
+    return directorio
+
+
+def _salida_parquet(e, _):
+    df_final, promos_resultado = _patrones_finales(e)
+    directorio = _directorio_temporal()
+
+    def correr():
+        limpiar_salida(directorio)
+        return escribir_parquet(df_final, directorio, promos=promos_resultado, columna_fecha="FECHA_EVENTO")
+    return correr, len(df_final)
+
+
+def _salida_csv(e, _):
+    df_final, promos_resultado = _patrones_finales(e)
+    archivo = f"{_directorio_temporal()}/patrones.csv"
+
+    def correr():
+        promos_resultado.materializar(df_final).to_csv(archivo, index=False)
+    return correr, len(df_final)
+
+
+# Latencia simulada de cada load job en el cliente falso (segundos)
+LATENCIA_FALSA_CARGA = 0.5
+
+
+def _cargador_funnel(e):
+    """(BQLoad sobre un ClienteFalso, esquema STRING de todas las columnas, análisis posterior a la carga)."""
+    # BQLoadClass arma los job configs con google-cloud-bigquery: solo se importa si se piden estas etapas
+    from google.cloud import bigquery
+    from BQLoadClass import BQLoad
+
+    loader = BQLoad(client=ClienteFalso(latencia_carga=LATENCIA_FALSA_CARGA))
+    schema = [bigquery.SchemaField(c, "STRING") for c in e["funnel"].columns]
+    correr_kpis = _kpis_sesion(e, None)[0]
+    correr_flags = _flags(e, None)[0]
+    return loader, schema, (lambda: (correr_kpis(), correr_flags()))
+
+
+def _carga_solapada(e, _):
+    loader, schema, analisis = _cargador_funnel(e)
+
+    def correr():
+        carga = loader.load_table_async(e["funnel"], "bench.h1.funnel", schema, write_disposition="WRITE_APPEND")
+        resultado = analisis()
+        carga.wait()
+        return resultado
+    return correr, len(e["funnel"])
+
+
+def _carga_secuencial(e, _):
+    loader, schema, analisis = _cargador_funnel(e)
+
+    def correr():
+        loader.load_table(e["funnel"], "bench.h1.funnel", schema, write_disposition="WRITE_APPEND")
+        return analisis()
+    return correr, len(e["funnel"])
+
+
+ETAPAS = {
+    "fecha_evento": _fecha_evento,
+    "limpieza_item": _limpieza_item,
+    "merge_sorteo": _merge_sorteo,
+    "merge_condiciones": _merge_condiciones,
+    "promos_combinadas": _promos_combinadas,
+    "compilacion_reglas": _compilacion_reglas,
+    "indice_sesiones": _indice_sesiones,
+    "deteccion_fila": _deteccion_fila,
+    "deteccion_vectorizado": _deteccion_vectorizado,
+    "deteccion_paralelo": _deteccion_paralelo,
+    "preparacion_carga": _preparacion_carga,
+    "limpieza_funnel": _limpieza_funnel,
+    "kpis_sesion": _kpis_sesion,
+    "flags": _flags,
+    "decodificacion_arrow": _decodificacion_arrow,
+    "extraccion_concurrente": _extraccion_concurrente,
+    "extraccion_secuencial": _extraccion_secuencial,
+    "salida_parquet": _salida_parquet,
+    "salida_csv": _salida_csv,
+    "carga_solapada": _carga_solapada,
+    "carga_secuencial": _carga_secuencial,
+}
+# La detección paralela depende de los núcleos de la máquina; la extracción secuencial y la
+# salida CSV son solo referencias de la concurrente y del Parquet; las cargas requieren
+# google-cloud-bigquery: corren si se piden
+ETAPAS_POR_DEFECTO = [nombre for nombre in ETAPAS
+                      if nombre not in ("deteccion_paralelo", "extraccion_secuencial", "salida_csv",
+                                        "carga_solapada", "carga_secuencial")]
+
+
+def correr_benchmarks(config: ConfigCarga = None, etapas=None, repeticiones: int = 3,
+                      memoria: bool = True, workers=None) -> dict:
+    """Genera la carga, mide las etapas pedidas y regresa los resultados (ver Medicion.resultados)."""
+    config = config or ConfigCarga()
+    etapas = list(etapas or ETAPAS_POR_DEFECTO)
+    desconocidas = [n for n in etapas if n not in ETAPAS]
+    if desconocidas:
+        raise ValueError(f"Etapas desconocidas: {desconocidas} (disponibles: {list(ETAPAS)})")
+
+    logger.info("Generando carga sintética: %s", config.a_dict())
+    entradas = preparar_entradas(generar_carga(config))
+    logger.info("Carga: %d intentos GA4, %d sesiones, %d condiciones, %d promos combinadas",
+                len(entradas["base"]), len(entradas["indice"]), len(entradas["condiciones"]),
+                len(entradas["requisitos"]))
+
+    medidas = {}
+    for nombre in etapas:
+        funcion, filas = ETAPAS[nombre](entradas, {"workers": workers})
+        medidas[nombre] = medir(funcion, filas, repeticiones=repeticiones, memoria=memoria)
+        logger.info("%s: %.3fs (%d filas)", nombre, medidas[nombre]["segundos"], filas)
+    return resultados(config.a_dict(), medidas)
@@ -0,0 +1,449 @@
+"""
+Generador sintético (con semilla) de las tablas que el pipeline lee de BigQuery.
+
+`generar_carga(config)` regresa {nombre de query: DataFrame} con las mismas columnas
+y dtypes que `job.to_dataframe()` de cada query en Data/queries (INTEGER -> Int64,
+STRING -> object, DATE/DATETIME/TIMESTAMP -> datetime64):
+
+- ga4_events, sorteo, condiciones_promocion, grupo_condicion_promocion,
+  tipo_cantidad_promocion, catalogo_promociones_fechas, promociones_combinadas;
+- patrones_funnel_completo (entrada de limpieza de funnel, KPIs y flags).
+
+Los ITEM de GA4 vienen "sucios" igual que en producción (número al inicio, prefijo LQ,
+número duplicado, "Gana Ya" sin número), así que la limpieza y el merge con el catálogo
+hacen el mismo trabajo que con datos reales. La popularidad de productos sigue una
+ley de Zipf (`sesgo_productos`) y los tipos de condición se eligen con `mezcla_tipos`.
+"""
+import numpy as np
+import pandas as pd
+
+
+FORMATO_DATETIME = "%d/%m/%Y %H:%M:%S"
+
+# Tipos de cantidad (clave_tipo_cantidad_condicion) como en tipo_cantidad_promocion
+TIPOS_CANTIDAD = {
+    1: "Exacta",
+    2: "Mínimo",
+    3: "Máximo",
+    4: "Rango",
+    5: "Acumulable",
+    6: "Por cada",
+    7: "Múltiplo",
+}
+MEZCLA_TIPOS = {1: 0.30, 2: 0.30, 3: 0.05, 4: 0.10, 5: 0.10, 6: 0.10, 7: 0.05}
+
+# desc_sorteo del catálogo -> cómo puede llegar el nombre en GA4 (antes de limpiar_items)
+_FAMILIAS = [
+    ("Sorteo Tradicional", None),
+    ("Sorteo Lo Quiero", "LQ {n}"),
+    ("Efectivo", "Sorteo Efectivo {n}"),
+    ("Sorteo Mi Sueño", None),
+    ("Sorteo Educativo", None),
+    ("Sorteo Aventurat", None),
+    ("Dinero Camino", None),
+]
+_PRECIOS = [50.0, 100.0, 150.0, 250.0, 450.0, 1000.0]
+
+_DISPOSITIVOS = ["mobile", "desktop", "tablet"]
+_REGIONES = [("Nuevo Leon", "Monterrey"), ("Jalisco", "Guadalajara"), ("Ciudad de Mexico", "Mexico City"),
+             ("Puebla", "Puebla"), ("Yucatan", "Merida")]
+_FUENTES = [("google", "organic"), ("(direct)", "(none)"), ("facebook", "cpc"), ("google", "cpc"),
+            ("newsletter", "email")]
+_CATEGORIAS_LOGIN = ["LOGIN ANTES DE ADD_TO_CART", "LOGIN ENTRE ADD_TO_CART Y CHECKOUT",
+                     "LOGIN DESPUÉS DE CHECKOUT", "SIN LOGIN EN SESIÓN"]
+
+COLUMNAS_GA4_EVENTS = [
+    "USER", "SESION", "DATETIME", "ITEM", "INTENTO",
+    "device_category", "geo_country", "geo_region", "geo_city", "traffic_source", "traffic_medium",
+    "STATUS", "CANTIDAD_ADD_TO_CART", "CANTIDAD_BEGIN_CHECKOUT", "CANTIDAD_PURCHASE", "TRANSACTION_ID", "item_id",
+]
+COLUMNAS_PROMOCIONES_COMBINADAS = [
+    "CLAVE_PROMOCION", "DESC_PROMOCION", "DESCL_PROMOCION", "CLAVE_EDICION_PRODUCTO", "DESC_SORTEO",
+    "TIPO_PRODUCTO", "NUMERO_SORTEO", "PRECIO_UNITARIO", "CANTIDAD_INICIAL", "DESC_TIPO_CANTIDAD_PROMOCION",
+    "DESC_TIPO_CRITERIO_CONDICION", "DESC_BENEFICIO_PROMOCION", "CANTIDAD", "DESC_CATEGORIA_PROMOCION",
+    "CANT_SORTEOS",
+]
+_ETAPAS_FUNNEL = ("ADD_CART", "CHECKOUT", "PURCHASE")
+_TIEMPOS_SESION = [
+    "login_time_mx", "logout_time_mx", "view_item_list_time_mx", "select_item_time_mx",
+    "add_to_cart_time_mx", "begin_checkout_time_mx", "purchase_time_mx", "sign_up_time_mx",
+]
+
+
+class ConfigCarga:
+    """
+    Tamaño y forma de la carga sintética.
+    - `sesiones`, `filas_por_sesion` (promedio; mínimo 1 fila), `productos`.
+    - `condiciones_simples`: filas de condicion_promocion de promos simples,
+      repartidas en promos de ~`condiciones_por_promo` condiciones.
+    - `promos_combinadas`, con `productos_por_combinada` productos cada una.
+    - `mezcla_tipos`: {clave_tipo_cantidad_condicion: peso} de las condiciones simples.
+    - `sesgo_productos`: exponente de Zipf de la popularidad de productos (0 = uniforme).
+    - `dias`: ventana de fechas de los eventos a partir de `fecha_inicio`.
+    """
+
+    def __init__(
+        self,
+        sesiones: int = 20_000,
+        filas_por_sesion: float = 3.0,
+        productos: int = 60,
+        condiciones_simples: int = 300,
+        condiciones_por_promo: float = 2.0,
+        promos_combinadas: int = 20,
+        productos_por_combinada: int = 3,
+        mezcla_tipos: dict = None,
+        sesgo_productos: float = 1.1,
+        dias: int = 90,
+        fecha_inicio: str = "2025-01-01",
+        semilla: int = 0,
+    ):
+        self.sesiones = int(sesiones)
+        self.filas_por_sesion = float(filas_por_sesion)
+        self.productos = int(productos)
+        self.condiciones_simples = int(condiciones_simples)
+        self.condiciones_por_promo = float(condiciones_por_promo)
+        self.promos_combinadas = int(promos_combinadas)
+        self.productos_por_combinada = int(productos_por_combinada)
+        self.mezcla_tipos = {int(k): float(v) for k, v in (mezcla_tipos or MEZCLA_TIPOS).items()}
+        self.sesgo_productos = float(sesgo_productos)
+        self.dias = int(dias)
+        self.fecha_inicio = str(fecha_inicio)
+        self.semilla = int(semilla)
+
+    def a_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def desde_dict(cls, valores: dict) -> "ConfigCarga":
+        return cls(**valores)
+
+    def con(self, **cambios) -> "ConfigCarga":
+        """Copia con algunos parámetros cambiados (barridos de tamaño)."""
+        return ConfigCarga(**{**self.a_dict(), **cambios})
+
+
+def _pesos_zipf(n: int, sesgo: float) -> np.ndarray:
+    pesos = 1.0 / np.arange(1, n + 1) ** sesgo
+    return pesos / pesos.sum()
+
+
+def _sorteo(rng, config: ConfigCarga) -> pd.DataFrame:
+    n = config.productos
+    familia = np.arange(n) % len(_FAMILIAS)
+    numero = 100 + np.arange(n) // len(_FAMILIAS) * 7 + familia
+    desc = np.array([_FAMILIAS[f][0] for f in familia], dtype=object)
+    # "Gana Ya 5": en GA4 llega como "Gana Ya" y preparar_eventos_base le agrega el 5
+    if n > len(_FAMILIAS):
+        desc[-1], numero[-1] = "Gana Ya", 5
+
+    inicio = pd.Timestamp(config.fecha_inicio, tz="UTC")
+    return pd.DataFrame({
+        "clave_edicion_producto": pd.array(1000 + np.arange(n), dtype="Int64"),
+        "desc_sorteo": desc,
+        "numero_sorteo": pd.array(numero, dtype="Int64"),
+        "tipo_producto": np.where(familia % 2 == 0, "SORTEO", "INSTANTANEO").astype(object),
+        "precio_unitario": rng.choice(_PRECIOS, size=n),
+        "fecha_celebracion": inicio + pd.to_timedelta(rng.integers(10, config.dias + 120, size=n), unit="D"),
+    })
+
+
+def _items_ga4(rng, df_sorteo: pd.DataFrame, productos: np.ndarray) -> np.ndarray:
+    """Nombre de ITEM como llega en GA4 para cada fila (variantes que limpia limpiar_items)."""
+    nombres = []
+    for desc, num in zip(df_sorteo["desc_sorteo"], df_sorteo["numero_sorteo"]):
+        familia = dict(_FAMILIAS).get(desc)
+        variantes = [f"{desc} {num}", f"{num} {desc}", f"{num}° {desc}", f"{desc} {num} {num}"]
+        if familia:
+            variantes.append(familia.format(n=num))
+        if desc == "Gana Ya":
+            variantes = ["Gana Ya"]
+        nombres.append(variantes)
+
+    variante = rng.integers(0, 1 << 30, size=len(productos))
+    items = np.empty(len(productos), dtype=object)
+    for i, (p, v) in enumerate(zip(productos.tolist(), variante.tolist())):
+        opciones = nombres[p]
+        items[i] = opciones[v % len(opciones)]
+    # ~2% de ITEM fuera del catálogo (quedan sin clave_edicion_producto tras el merge)
+    items[rng.random(len(productos)) < 0.02] = "Producto Descontinuado"
+    return items
+
+
+def _cantidades(rng, n: int):
+    """add_to_cart >= begin_checkout >= purchase, con masa en cantidades chicas (1..10)."""
+    add = np.minimum(rng.geometric(0.35, size=n), 12)
+    checkout = np.where(rng.random(n) < 0.6, add - rng.integers(0, 2, size=n), 0).clip(0)
+    purchase = np.where(rng.random(n) < 0.5, checkout, 0)
+    return add, checkout, purchase
+
+
+def _ga4_events(rng, config: ConfigCarga, df_sorteo: pd.DataFrame, pesos: np.ndarray):
+    """(DataFrame de ga4_events.sql, posición en df_sorteo del producto de cada fila)."""
+    n_ses = config.sesiones
+    filas_ses = 1 + rng.poisson(max(config.filas_por_sesion - 1.0, 0.0), size=n_ses)
+    n = int(filas_ses.sum())
+    ses = np.repeat(np.arange(n_ses), filas_ses)
+    intento = np.arange(n) - np.repeat(np.cumsum(filas_ses) - filas_ses, filas_ses) + 1
+
+    n_usuarios = max(1, int(n_ses * 0.6))
+    usuario_ses = rng.integers(0, n_usuarios, size=n_ses)
+    session_id = rng.choice(np.arange(1_600_000_000, 1_600_000_000 + 20 * n_ses), size=n_ses, replace=False)
+
+    inicio = pd.Timestamp(config.fecha_inicio)
+    inicio_ses = rng.integers(0, config.dias * 86_400, size=n_ses)
+    segundos = inicio_ses[ses] + (intento - 1) * rng.integers(20, 400, size=n)
+    fechas = inicio + pd.to_timedelta(segundos, unit="s")
+
+    productos = rng.choice(config.productos, size=n, p=pesos)
+    add, checkout, purchase = _cantidades(rng, n)
+    compra = purchase > 0
+
+    region = rng.integers(0, len(_REGIONES), size=n_ses)[ses]
+    fuente = rng.integers(0, len(_FUENTES), size=n_ses)[ses]
+    usuario = np.array([f"{u}.{u * 7919 % 100_000}" for u in usuario_ses], dtype=object)[ses]
+    usuario[rng.random(n) < 0.002] = None
+
+    transaccion = np.full(n, None, dtype=object)
+    transaccion[compra] = [f"T{session_id[s]}-{i}" for s, i in zip(ses[compra], intento[compra])]
+
+    df = pd.DataFrame({
+        "USER": usuario,
+        "SESION": pd.array(session_id[ses], dtype="Int64"),
+        "DATETIME": fechas.strftime(FORMATO_DATETIME).to_numpy(dtype=object),
+        "ITEM": _items_ga4(rng, df_sorteo, productos),
+        "INTENTO": pd.array(intento, dtype="Int64"),
+        "device_category": np.array(_DISPOSITIVOS, dtype=object)[rng.integers(0, 3, size=n_ses)[ses]],
+        "geo_country": np.full(n, "Mexico", dtype=object),
+        "geo_region": np.array([r for r, _ in _REGIONES], dtype=object)[region],
+        "geo_city": np.array([c for _, c in _REGIONES], dtype=object)[region],
+        "traffic_source": np.array([f for f, _ in _FUENTES], dtype=object)[fuente],
+        "traffic_medium": np.array([m for _, m in _FUENTES], dtype=object)[fuente],
+        "STATUS": np.where(compra, "PURCHASED", "NO_PURCHASE").astype(object),
+        "CANTIDAD_ADD_TO_CART": pd.array(add, dtype="Int64"),
+        "CANTIDAD_BEGIN_CHECKOUT": pd.array(checkout, dtype="Int64"),
+        "CANTIDAD_PURCHASE": pd.array(purchase, dtype="Int64"),
+        "TRANSACTION_ID": transaccion,
+        "item_id": np.full(n, None, dtype=object),
+    })[COLUMNAS_GA4_EVENTS]
+    return df, productos
+
+
+def _regla(rng, tipo: int):
+    """(cantidad_inicial, cantidad_final) de una condición del tipo dado."""
+    if tipo in (6, 7):
+        return int(rng.integers(2, 6)), None
+    inicial = int(rng.integers(1, 8))
+    if tipo == 4:
+        return inicial, inicial + int(rng.integers(1, 5))
+    return inicial, None
+
+
+def _promociones(rng, config: ConfigCarga, df_sorteo: pd.DataFrame, pesos: np.ndarray) -> dict:
+    """condicion_promocion, grupo_condiciones_promocion, vigencias y promociones_combinadas."""
+    tipos = np.array(sorted(config.mezcla_tipos), dtype="int64")
+    p_tipos = np.array([config.mezcla_tipos[t] for t in tipos], dtype="float64")
+    p_tipos = p_tipos / p_tipos.sum()
+    claves = df_sorteo["clave_edicion_producto"].to_numpy(dtype="int64")
+
+    n_simples = max(1, int(round(config.condiciones_simples / max(config.condiciones_por_promo, 1.0))))
+    promo_de_condicion = np.sort(rng.integers(0, n_simples, size=config.condiciones_simples))
+    producto_de_condicion = rng.choice(config.productos, size=config.condiciones_simples, p=pesos)
+    tipo_de_condicion = rng.choice(tipos, size=config.condiciones_simples, p=p_tipos)
+
+    condiciones = []
+    for promo, prod, tipo in zip(promo_de_condicion.tolist(), producto_de_condicion.tolist(),
+                                 tipo_de_condicion.tolist()):
+        inicial, final = _regla(rng, tipo)
+        condiciones.append((20_000 + promo, claves[prod], tipo, inicial, final))
+
+    combinadas = []
+    n_por_combinada = min(max(config.productos_por_combinada, 2), config.productos)
+    for j in range(config.promos_combinadas):
+        pid = 90_000 + j
+        productos = rng.choice(config.productos, size=n_por_combinada, replace=False, p=pesos)
+        for prod in productos.tolist():
+            cantidad = int(rng.integers(1, 4))
+            combinadas.append((pid, prod, cantidad))
+            condiciones.append((pid, claves[prod], 2, cantidad, None))
+
+    pids = sorted({c[0] for c in condiciones})
+    grupo = {pid: 50_000 + i for i, pid in enumerate(pids)}
+    df_condiciones = pd.DataFrame({
+        "clave_condicion_promocion": pd.array(np.arange(len(condiciones)) + 1, dtype="Int64"),
+        "clave_grupo_condiciones": pd.array([grupo[c[0]] for c in condiciones], dtype="Int64"),
+        "clave_edicion_producto": pd.array([c[1] for c in condiciones], dtype="Int64"),
+        "clave_tipo_cantidad_condicion": pd.array([c[2] for c in condiciones], dtype="Int64"),
+        "clave_tipo_criterio_condicion": pd.array(np.ones(len(condiciones), dtype="int64"), dtype="Int64"),
+        "cantidad_inicial": pd.array([c[3] for c in condiciones], dtype="Int64"),
+        "cantidad_final": pd.array([c[4] for c in condiciones], dtype="Int64"),
+    })
+    df_grupo = pd.DataFrame({
+        "clave_grupo_condiciones": pd.array(list(grupo.values()), dtype="Int64"),
+        "clave_promocion": pd.array(list(grupo.keys()), dtype="Int64"),
+    })
+
+    # Vigencias que cubren parte de la ventana de eventos; ~5% de promos sin compras (sin fechas)
+    inicio = pd.Timestamp(config.fecha_inicio)
+    con_fechas = [pid for pid in pids if rng.random() >= 0.05]
+    d_inicio = inicio + pd.to_timedelta(rng.integers(-30, config.dias, size=len(con_fechas)), unit="D")
+    duracion = pd.to_timedelta(rng.integers(7 * 86_400, 120 * 86_400, size=len(con_fechas)), unit="s")
+    df_fechas = pd.DataFrame({
+        "clave_promocion": pd.array(con_fechas, dtype="Int64"),
+        "d_inicio_promocion": d_inicio.normalize(),
+        "d_cierre_promocion": d_inicio + duracion,
+    })
+
+    df_combinadas = pd.DataFrame(combinadas, columns=["CLAVE_PROMOCION", "prod", "CANTIDAD_INICIAL"])
+    sorteo = df_sorteo.iloc[df_combinadas["prod"].to_numpy()].reset_index(drop=True)
+    df_combinadas = pd.DataFrame({
+        "CLAVE_PROMOCION": pd.array(df_combinadas["CLAVE_PROMOCION"], dtype="Int64"),
+        "DESC_PROMOCION": [f"Combo {pid}" for pid in df_combinadas["CLAVE_PROMOCION"]],
+        "DESCL_PROMOCION": [f"Promoción combinada {pid}" for pid in df_combinadas["CLAVE_PROMOCION"]],
+        "CLAVE_EDICION_PRODUCTO": sorteo["clave_edicion_producto"],
+        "DESC_SORTEO": sorteo["desc_sorteo"],
+        "TIPO_PRODUCTO": sorteo["tipo_producto"],
+        "NUMERO_SORTEO": sorteo["numero_sorteo"],
+        "PRECIO_UNITARIO": sorteo["precio_unitario"],
+        "CANTIDAD_INICIAL": pd.array(df_combinadas["CANTIDAD_INICIAL"], dtype="Int64"),
+        "DESC_TIPO_CANTIDAD_PROMOCION": TIPOS_CANTIDAD[2],
+        "DESC_TIPO_CRITERIO_CONDICION": "Producto",
+        "DESC_BENEFICIO_PROMOCION": "Boleto adicional",
+        "CANTIDAD": pd.array(np.ones(len(df_combinadas), dtype="int64"), dtype="Int64"),
+        "DESC_CATEGORIA_PROMOCION": "Combinada",
+        "CANT_SORTEOS": pd.array(np.full(len(df_combinadas), n_por_combinada), dtype="Int64"),
+    }, columns=COLUMNAS_PROMOCIONES_COMBINADAS)
+
+    return {
+        "condiciones_promocion": df_condiciones,
+        "grupo_condicion_promocion": df_grupo,
+        "catalogo_promociones_fechas": df_fechas,
+        "promociones_combinadas": df_combinadas,
+    }
+
+
+def _listas_promos(rng, promos_por_producto: list, productos: np.ndarray, probabilidad: float) -> list:
+    """Lista de promos por fila (subconjunto de las promos del producto), vacía o None (sin JOIN)."""
+    salida = []
+    sorteo = rng.random(len(productos))
+    for prod, r in zip(productos.tolist(), sorteo.tolist()):
+        promos = promos_por_producto[prod]
+        if r < 0.03:
+            salida.append(None)
+        elif r < probabilidad and promos:
+            salida.append(promos[: 1 + int(r * 100) % len(promos)])
+        else:
+            salida.append([])
+    return salida
+
+
+def _funnel_completo(rng, df_ga4: pd.DataFrame, productos: np.ndarray, df_sorteo: pd.DataFrame,
+                     df_promos: dict) -> pd.DataFrame:
+    """Una fila por intento GA4 con las columnas de patrones_funnel_completo.sql (procesamiento_patrones.sql)."""
+    n = len(df_ga4)
+    fechas = pd.to_datetime(df_ga4["DATETIME"], format=FORMATO_DATETIME)
+
+    condiciones = df_promos["condiciones_promocion"].merge(
+        df_promos["grupo_condicion_promocion"], on="clave_grupo_condiciones"
+    )
+    promos_de_clave = condiciones.groupby("clave_edicion_producto")["clave_promocion"].agg(
+        lambda s: sorted(set(int(p) for p in s))
+    )
+    promos_por_producto = [promos_de_clave.get(int(c), []) for c in df_sorteo["clave_edicion_producto"]]
+
+    ses_codigo = pd.factorize(df_ga4["SESION"])[0]
+    n_ses = ses_codigo.max() + 1 if n else 0
+    categoria = np.array(_CATEGORIAS_LOGIN, dtype=object)[rng.integers(0, len(_CATEGORIAS_LOGIN), size=n_ses)]
+    categoria_fila = categoria[ses_codigo]
+    categoria_fila[rng.random(n) < 0.1] = None
+
+    precio = df_sorteo["precio_unitario"].to_numpy()[productos].astype("float64")
+    precio[rng.random(n) < 0.3] = np.nan
+
+    inicio_ses = fechas.groupby(ses_codigo).transform("min")
+    fin_ses = fechas.groupby(ses_codigo).transform("max") + pd.Timedelta(minutes=5)
+    compra = df_ga4["STATUS"].eq("PURCHASED").to_numpy()
+
+    df = pd.DataFrame({
+        "user_pseudo_id": df_ga4["USER"],
+        "session_id": df_ga4["SESION"],
+        "intento": df_ga4["INTENTO"],
+        "ITEM": df_ga4["ITEM"],
+        "STATUS": df_ga4["STATUS"],
+        "attempt_dt_mx": fechas,
+        "attempt_date": fechas.dt.normalize(),
+        "datetime_str": df_ga4["DATETIME"],
+        "TRANSACTION_ID": df_ga4["TRANSACTION_ID"],
+        "device_category": df_ga4["device_category"],
+        "geo_country": df_ga4["geo_country"],
+        "geo_region": df_ga4["geo_region"],
+        "geo_city": df_ga4["geo_city"],
+        "traffic_source": df_ga4["traffic_source"],
+        "traffic_medium": df_ga4["traffic_medium"],
+        "dias_para_sorteo": rng.integers(0, 60, size=n).astype("float64"),
+        "traffic_density_score": rng.random(n),
+        "products_in_session_count": pd.Series(productos).groupby(ses_codigo).transform("nunique").astype(float),
+        "qty_add_to_cart": df_ga4["CANTIDAD_ADD_TO_CART"],
+        "qty_begin_checkout": df_ga4["CANTIDAD_BEGIN_CHECKOUT"],
+        "qty_purchase": df_ga4["CANTIDAD_PURCHASE"],
+        "precio_unitario_inferido": precio,
+        "MONTO_ADD_TO_CART": np.nan,
+        "MONTO_BEGIN_CHECKOUT": np.nan,
+        "MONTO_PURCHASE": np.nan,
+    })
+    for etapa, probabilidad in zip(_ETAPAS_FUNNEL, (0.45, 0.3, 0.15)):
+        completas = _listas_promos(rng, promos_por_producto, productos, probabilidad)
+        incompletas = _listas_promos(rng, promos_por_producto[::-1], productos, probabilidad)
+        df[f"PATRON_{'BEGIN_CHECKOUT' if etapa == 'CHECKOUT' else etapa}"] = np.where(
+            [bool(c) for c in completas], "SI", "NO"
+        ).astype(object)
+        df[f"PROMOS_{etapa}_COMPLETAS"] = completas
+        df[f"PROMOS_{etapa}_INCOMPLETAS"] = incompletas
+        df[f"PROMOS_{etapa}_TODAS"] = [
+            sorted(set(c or []) | set(i or [])) for c, i in zip(completas, incompletas)
+        ]
+
+    df["session_date"] = inicio_ses.dt.normalize()
+    df["session_start_mx"] = inicio_ses
+    df["session_end_mx"] = fin_ses
+    for col in _TIEMPOS_SESION:
+        ocurre = rng.random(n) < 0.6
+        df[col] = inicio_ses.where(ocurre) + pd.to_timedelta(rng.integers(0, 300, size=n), unit="s")
+    df["event_count"] = pd.array(rng.integers(3, 80, size=n), dtype="Int64")
+    df["has_purchase"] = pd.array(compra, dtype="boolean")
+    df["has_sign_up"] = pd.array(rng.random(n) < 0.05, dtype="boolean")
+    df["discount_seen_after_login"] = pd.array(rng.random(n) < 0.2, dtype="boolean")
+    df["categoria_login"] = categoria_fila
+    df["TIENE_PATRON_COMPLETO"] = np.where(
+        (df["PATRON_ADD_CART"] == "SI") | (df["PATRON_BEGIN_CHECKOUT"] == "SI") | (df["PATRON_PURCHASE"] == "SI"),
+        "SI", "NO",
+    ).astype(object)
+    df["TIENE_PATRON_INCOMPLETO"] = np.where(
+        df["PROMOS_ADD_CART_INCOMPLETAS"].map(bool), "SI", "NO"
+    ).astype(object)
+    df["ready_at_checkout"] = pd.array(rng.random(n) < 0.4, dtype="boolean")
+    df["ready_at_purchase"] = pd.array(rng.random(n) < 0.3, dtype="boolean")
+    df["login_bucket_bc"] = np.array(["ANTES", "DESPUES", "SIN LOGIN"], dtype=object)[rng.integers(0, 3, size=n)]
+    return df
+
+
+def generar_carga(config: ConfigCarga = None) -> dict:
+    """{query: DataFrame} reproducible para la misma `config` (incluida la semilla)."""
+    config = config or ConfigCarga()
+    rng = np.random.default_rng(config.semilla)
+    pesos = _pesos_zipf(config.productos, config.sesgo_productos)
+
+    df_sorteo = _sorteo(rng, config)
+    df_ga4, productos = _ga4_events(rng, config, df_sorteo, pesos)
+    promos = _promociones(rng, config, df_sorteo, pesos)
+    df_tipo_cantidad = pd.DataFrame({
+        "clave_tipo_cantidad_condicion": pd.array(list(TIPOS_CANTIDAD), dtype="Int64"),
+        "descripcion": list(TIPOS_CANTIDAD.values()),
+    })
+
+    return {
+        "ga4_events": df_ga4,
+        "sorteo": df_sorteo,
+        "tipo_cantidad_promocion": df_tipo_cantidad,
+        **promos,
+        "patrones_funnel_completo": _funnel_completo(rng, df_ga4, productos, df_sorteo, promos),
+    }
@@ -0,0 +1,150 @@
+"""
+Medición de etapas (tiempo, filas/segundo, memoria pico) y resultados en JSON.
+
+- Tiempo: `repeticiones` corridas con perf_counter; se reporta la mínima y la mediana.
+- Memoria pico: una corrida aparte con tracemalloc (NumPy y pandas reportan sus
+  buffers), para que el costo de tracemalloc no contamine los tiempos. Solo cubre
+  el proceso principal (no los workers de la detección paralela).
+- `comparar` contrasta una corrida contra una línea base guardada y marca como
+  regresión las etapas cuyo tiempo por fila o memoria pico crecen más que la tolerancia.
+"""
+import gc
+import json
+import os
+import platform
+import statistics
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+
+
+VERSION_RESULTADOS = 1
+TOLERANCIA_TIEMPO = 0.20
+TOLERANCIA_MEMORIA = 0.25
+
+
+def medir(funcion, filas: int, repeticiones: int = 3, memoria: bool = True) -> dict:
+    """Mide `funcion()` (sin argumentos) procesando `filas` filas."""
+    tiempos = []
+    for _ in range(max(1, repeticiones)):
+        gc.collect()
+        t0 = perf_counter()
+        funcion()
+        tiempos.append(perf_counter() - t0)
+
+    pico_mb = None
+    if memoria:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            funcion()
+            _, pico = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        pico_mb = pico / (1024 ** 2)
+
+    segundos = min(tiempos)
+    return {
+        "filas": int(filas),
+        "repeticiones": len(tiempos),
+        "segundos": segundos,
+        "segundos_mediana": statistics.median(tiempos),
+        "filas_por_segundo": filas / segundos if segundos > 0 else None,
+        "memoria_pico_mb": pico_mb,
+    }
+
+
+def entorno() -> dict:
+    return {
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "plataforma": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def resultados(config: dict, etapas: dict) -> dict:
+    return {
+        "version": VERSION_RESULTADOS,
+        "creado": datetime.now().isoformat(timespec="seconds"),
+        "config": config,
+        "entorno": entorno(),
+        "etapas": etapas,
+    }
+
+
+def guardar_resultados(path, datos: dict) -> None:
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(datos, indent=2, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def cargar_resultados(path) -> dict:
+    datos = json.loads(Path(path).read_text(encoding="utf-8"))
+    if datos.get("version") != VERSION_RESULTADOS:
+        raise ValueError(f"{path}: versión de resultados {datos.get('version')} (se esperaba {VERSION_RESULTADOS})")
+    return datos
+
+
+def _razon(actual, base):
+    if actual is None or base is None or base <= 0:
+        return None
+    return actual / base
+
+
+def comparar(actual: dict, base: dict, tolerancia_tiempo: float = TOLERANCIA_TIEMPO,
+             tolerancia_memoria: float = TOLERANCIA_MEMORIA) -> list:
+    """
+    Una fila por etapa presente en ambas corridas:
+    {etapa, razon_tiempo, razon_memoria, regresion, motivos}.
+    El tiempo se compara por fila (segundos / filas), así que dos corridas con distinto
+    tamaño se pueden contrastar, aunque lo más confiable es usar la misma config.
+    """
+    filas = []
+    for etapa, med in actual["etapas"].items():
+        med_base = base["etapas"].get(etapa)
+        if med_base is None:
+            continue
+        razon_tiempo = _razon(med["segundos"] / max(med["filas"], 1),
+                              med_base["segundos"] / max(med_base["filas"], 1))
+        razon_memoria = _razon(med.get("memoria_pico_mb"), med_base.get("memoria_pico_mb"))
+
+        motivos = []
+        if razon_tiempo is not None and razon_tiempo > 1 + tolerancia_tiempo:
+            motivos.append(f"tiempo x{razon_tiempo:.2f}")
+        if razon_memoria is not None and razon_memoria > 1 + tolerancia_memoria:
+            motivos.append(f"memoria x{razon_memoria:.2f}")
+        filas.append({
+            "etapa": etapa,
+            "razon_tiempo": razon_tiempo,
+            "razon_memoria": razon_memoria,
+            "regresion": bool(motivos),
+            "motivos": motivos,
+        })
+    return filas
+
+
+def tabla_resultados(datos: dict, comparacion: list = None) -> str:
+    """Tabla de texto de una corrida (y su comparación contra la línea base, si se da)."""
+    por_etapa = {c["etapa"]: c for c in comparacion or []}
+    lineas = [f"{'etapa':<24}{'filas':>10}{'seg':>10}{'filas/s':>12}{'pico MB':>10}{'vs base':>12}"]
+    for etapa, med in datos["etapas"].items():
+        fps = med["filas_por_segundo"]
+        pico = med["memoria_pico_mb"]
+        comp = por_etapa.get(etapa)
+        if comp is None or comp["razon_tiempo"] is None:
+            vs_base = ""
+        else:
+            vs_base = f"x{comp['razon_tiempo']:.2f}" + (" ⚠️" if comp["regresion"] else "")
+        lineas.append(
+            f"{etapa:<24}{med['filas']:>10}{med['segundos']:>10.3f}"
+            f"{(f'{fps:,.0f}' if fps else '-'):>12}{(f'{pico:.1f}' if pico is not None else '-'):>10}{vs_base:>12}"
+        )
+    return "\n".join(lineas)
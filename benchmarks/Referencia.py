@@ -0,0 +1,368 @@
+"""
+Referencia congelada para las comparaciones de equivalencia (benchmarks.Escalamiento).
+
+Copia textual de la detección original de H1Script (antes de los motores fila / vectorizado /
+paralelo, ReglasCompiladas, RequisitosCombinados e IndiceVigencia), con las mismas entradas
+crudas que usaba `main`: `df_condiciones_enriquecido` como DataFrame y `requisitos_multi` /
+`vigencia_promo` como dicts armados desde las tablas de catálogo. No se debe optimizar ni
+actualizar junto con el pipeline: es contra lo que se verifica que los motores no cambian el
+resultado.
+"""
+import pandas as pd
+
+
+def cumple_patron(cantidad, tipo_condicion, cant_inicial, cant_final=None):
+    """Verifica si una cantidad cumple con un tipo de condición"""
+    if pd.isna(cantidad) or cantidad == 0:
+        return False
+
+    if tipo_condicion == 1:  # Exactamente
+        return cantidad == cant_inicial
+    elif tipo_condicion == 2:  # Mínimo
+        return cantidad >= cant_inicial
+    elif tipo_condicion == 3:  # Máximo
+        return cantidad <= cant_inicial
+    elif tipo_condicion == 4:  # Entre
+        return cant_inicial <= cantidad <= (cant_final if cant_final else cant_inicial)
+    elif tipo_condicion == 5:  # Acumula
+        return cantidad >= cant_inicial
+    elif tipo_condicion == 6:  # Por cada
+        return cantidad >= cant_inicial and cantidad % cant_inicial == 0
+    elif tipo_condicion == 7:  # Múltiplo
+        return cantidad % cant_inicial == 0 if cant_inicial > 0 else False
+    else:
+        return False
+
+
+def evaluar_promociones_sesion(df_sesion, requisitos_multi, vigencia_promo):
+    """
+    Evalúa promociones multi-producto (combinadas) para TODA la sesión.
+    Regresa IDs de promos que están COMPLETAS por etapa.
+    - Requisito V1: para cada promo combinada, TODOS sus productos deben sumar
+      cantidad >= cantidad_requerida dentro de la sesión, por etapa.
+    - Vigencia: si la promo no está activa a la fecha del evento (sesión), se ignora.
+    """
+    promociones_completas = {'add_cart': [], 'checkout': [], 'purchase': []}
+
+    def _parse_dt_mx(x):
+        for fmt in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M:%S.%f"):
+            try:
+                return pd.to_datetime(x, format=fmt)
+            except Exception:
+                continue
+        return pd.NaT
+
+    try:
+        fecha_evento = _parse_dt_mx(df_sesion['DATETIME'].iloc[0])
+        if pd.isna(fecha_evento):
+            return promociones_completas
+    except Exception:
+        return promociones_completas
+
+    # Por cada promo combinada definida en requisitos_multi
+    for pid, reqs in requisitos_multi.items():
+        inicio, cierre = vigencia_promo.get(pid, (pd.NaT, pd.NaT))
+        if pd.isna(inicio) or pd.isna(cierre) or not (inicio <= fecha_evento <= cierre):
+            continue
+
+        ok_add = True
+        ok_chk = True
+        ok_pur = True
+
+        for req in reqs:
+            prod = req['clave_edicion_producto']
+            need = req['cantidad_requerida']
+
+            subset = df_sesion[df_sesion['clave_edicion_producto'] == prod]
+            s_add = subset['CANTIDAD_ADD_TO_CART'].sum() if 'CANTIDAD_ADD_TO_CART' in subset.columns else 0
+            s_chk = subset['CANTIDAD_BEGIN_CHECKOUT'].sum() if 'CANTIDAD_BEGIN_CHECKOUT' in subset.columns else 0
+            s_pur = subset['CANTIDAD_PURCHASE'].sum() if 'CANTIDAD_PURCHASE' in subset.columns else 0
+
+            ok_add = ok_add and (s_add >= need)
+            ok_chk = ok_chk and (s_chk >= need)
+            ok_pur = ok_pur and (s_pur >= need)
+
+            if not (ok_add or ok_chk or ok_pur):
+                break
+
+        if ok_add:
+            promociones_completas['add_cart'].append(int(pid))
+        if ok_chk:
+            promociones_completas['checkout'].append(int(pid))
+        if ok_pur:
+            promociones_completas['purchase'].append(int(pid))
+
+    return promociones_completas
+
+
+def es_incompleta_simple(cantidad, cant_inicial):
+    """
+    Heurístico de 'promo simple incompleta':
+    - La promo está activa (se valida afuera).
+    - NO cumple el patrón.
+    - La cantidad es exactamente N - 1 (near miss).
+    """
+    if pd.isna(cantidad) or pd.isna(cant_inicial):
+        return False
+    try:
+        return int(cantidad) == int(cant_inicial) - 1
+    except Exception:
+        return False
+
+
+def detectar_patrones_producto(row, condiciones_df, promociones_completas_sesion,
+                               promos_multi, requisitos_multi, vigencia_promo):
+    """
+    Detecta qué promociones cumple un producto individual (fila).
+    - Promos simples:
+        * COMPLETAS: igual que antes, vía condiciones_df + cumple_patron.
+        * INCOMPLETAS: nuevo criterio de 'near miss' -> cantidad == N - 1.
+    - Promos combinadas (V1): operador mínimo (≥) por producto requerido;
+      si la sesión cerró el combo -> COMPLETA; si no -> INCOMPLETA.
+    """
+    clave_producto = row.get('clave_edicion_producto', None)
+
+    resultado_vacio = {
+        'PATRON_ADD_CART': 'NO',
+        'PROMOS_ADD_CART_COMPLETAS': [],
+        'PROMOS_ADD_CART_INCOMPLETAS': [],
+        'PROMOS_ADD_CART_TODAS': [],
+        'DESC_ADD_CART_COMPLETAS': '',
+        'PATRON_BEGIN_CHECKOUT': 'NO',
+        'PROMOS_CHECKOUT_COMPLETAS': [],
+        'PROMOS_CHECKOUT_INCOMPLETAS': [],
+        'PROMOS_CHECKOUT_TODAS': [],
+        'DESC_CHECKOUT_COMPLETAS': '',
+        'PATRON_PURCHASE': 'NO',
+        'PROMOS_PURCHASE_COMPLETAS': [],
+        'PROMOS_PURCHASE_INCOMPLETAS': [],
+        'PROMOS_PURCHASE_TODAS': [],
+        'DESC_PURCHASE_COMPLETAS': ''
+    }
+    if pd.isna(clave_producto):
+        return resultado_vacio
+
+    try:
+        fecha_evento = pd.to_datetime(row['DATETIME'], format='%d/%m/%Y %H:%M:%S')
+    except Exception:
+        return resultado_vacio
+
+    resultados = {
+        'add_cart': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()},
+        'checkout': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()},
+        'purchase': {'completas': set(), 'incompletas': set(), 'todas': set(), 'desc_completas': set()}
+    }
+
+    # 6.A) PROMOS COMBINADAS
+    for pid, reqs in requisitos_multi.items():
+        if pid not in promos_multi:
+            continue
+
+        req_actual = next((r for r in reqs if r['clave_edicion_producto'] == clave_producto), None)
+        if not req_actual:
+            continue
+
+        inicio, cierre = vigencia_promo.get(pid, (pd.NaT, pd.NaT))
+        if pd.isna(inicio) or pd.isna(cierre) or not (inicio <= fecha_evento <= cierre):
+            continue
+
+        need = req_actual['cantidad_requerida']
+        c_add = row.get('CANTIDAD_ADD_TO_CART', 0) or 0
+        c_chk = row.get('CANTIDAD_BEGIN_CHECKOUT', 0) or 0
+        c_pur = row.get('CANTIDAD_PURCHASE', 0) or 0
+
+        if c_add >= need:
+            resultados['add_cart']['todas'].add(int(pid))
+            if int(pid) in promociones_completas_sesion['add_cart']:
+                resultados['add_cart']['completas'].add(int(pid))
+            else:
+                resultados['add_cart']['incompletas'].add(int(pid))
+
+        if c_chk >= need:
+            resultados['checkout']['todas'].add(int(pid))
+            if int(pid) in promociones_completas_sesion['checkout']:
+                resultados['checkout']['completas'].add(int(pid))
+            else:
+                resultados['checkout']['incompletas'].add(int(pid))
+
+        if c_pur >= need:
+            resultados['purchase']['todas'].add(int(pid))
+            if int(pid) in promociones_completas_sesion['purchase']:
+                resultados['purchase']['completas'].add(int(pid))
+            else:
+                resultados['purchase']['incompletas'].add(int(pid))
+
+    # 6.B) PROMOS SIMPLES
+    condiciones_producto = condiciones_df[condiciones_df['clave_edicion_producto'] == clave_producto]
+    for _, condicion in condiciones_producto.iterrows():
+        pid = condicion.get('clave_promocion', None)
+        if pd.isna(pid):
+            continue
+        pid = int(pid)
+
+        if pid in promos_multi:
+            continue
+
+        tipo = condicion['clave_tipo_cantidad_condicion']
+        cant_inicial = condicion['cantidad_inicial']
+        cant_final = condicion['cantidad_final']
+        interpretacion = condicion.get('interpretacion', '')
+        fecha_inicio = condicion.get('d_inicio_promocion', pd.NaT)
+        fecha_cierre = condicion.get('d_cierre_promocion', pd.NaT)
+
+        promo_activa = False
+        if pd.notna(fecha_inicio) and pd.notna(fecha_cierre) and (fecha_inicio <= fecha_evento <= fecha_cierre):
+            promo_activa = True
+
+        cant_add = row.get('CANTIDAD_ADD_TO_CART', 0) or 0
+        cant_chk = row.get('CANTIDAD_BEGIN_CHECKOUT', 0) or 0
+        cant_pur = row.get('CANTIDAD_PURCHASE', 0) or 0
+
+        # ADD_TO_CART
+        cumple_add = cumple_patron(cant_add, tipo, cant_inicial, cant_final)
+        if cumple_add:
+            resultados['add_cart']['todas'].add(pid)
+            if promo_activa:
+                resultados['add_cart']['completas'].add(pid)
+                if isinstance(interpretacion, str) and interpretacion:
+                    resultados['add_cart']['desc_completas'].add(interpretacion)
+        else:
+            if promo_activa and cant_add > 0 and es_incompleta_simple(cant_add, cant_inicial):
+                resultados['add_cart']['todas'].add(pid)
+                resultados['add_cart']['incompletas'].add(pid)
+
+        # BEGIN_CHECKOUT
+        cumple_chk = cumple_patron(cant_chk, tipo, cant_inicial, cant_final)
+        if cumple_chk:
+            resultados['checkout']['todas'].add(pid)
+            if promo_activa:
+                resultados['checkout']['completas'].add(pid)
+                if isinstance(interpretacion, str) and interpretacion:
+                    resultados['checkout']['desc_completas'].add(interpretacion)
+        else:
+            if promo_activa and cant_chk > 0 and es_incompleta_simple(cant_chk, cant_inicial):
+                resultados['checkout']['todas'].add(pid)
+                resultados['checkout']['incompletas'].add(pid)
+
+        # PURCHASE
+        cumple_pur = cumple_patron(cant_pur, tipo, cant_inicial, cant_final)
+        if cumple_pur:
+            resultados['purchase']['todas'].add(pid)
+            if promo_activa:
+                resultados['purchase']['completas'].add(pid)
+                if isinstance(interpretacion, str) and interpretacion:
+                    resultados['purchase']['desc_completas'].add(interpretacion)
+        else:
+            if promo_activa and cant_pur > 0 and es_incompleta_simple(cant_pur, cant_inicial):
+                resultados['purchase']['todas'].add(pid)
+                resultados['purchase']['incompletas'].add(pid)
+
+    return {
+        'PATRON_ADD_CART': 'SI' if resultados['add_cart']['completas'] else 'NO',
+        'PROMOS_ADD_CART_COMPLETAS': sorted(list(resultados['add_cart']['completas'])),
+        'PROMOS_ADD_CART_INCOMPLETAS': sorted(list(resultados['add_cart']['incompletas'])),
+        'PROMOS_ADD_CART_TODAS': sorted(list(resultados['add_cart']['todas'])),
+        'DESC_ADD_CART_COMPLETAS': ' | '.join(sorted(resultados['add_cart']['desc_completas'])),
+
+        'PATRON_BEGIN_CHECKOUT': 'SI' if resultados['checkout']['completas'] else 'NO',
+        'PROMOS_CHECKOUT_COMPLETAS': sorted(list(resultados['checkout']['completas'])),
+        'PROMOS_CHECKOUT_INCOMPLETAS': sorted(list(resultados['checkout']['incompletas'])),
+        'PROMOS_CHECKOUT_TODAS': sorted(list(resultados['checkout']['todas'])),
+        'DESC_CHECKOUT_COMPLETAS': ' | '.join(sorted(resultados['checkout']['desc_completas'])),
+
+        'PATRON_PURCHASE': 'SI' if resultados['purchase']['completas'] else 'NO',
+        'PROMOS_PURCHASE_COMPLETAS': sorted(list(resultados['purchase']['completas'])),
+        'PROMOS_PURCHASE_INCOMPLETAS': sorted(list(resultados['purchase']['incompletas'])),
+        'PROMOS_PURCHASE_TODAS': sorted(list(resultados['purchase']['todas'])),
+        'DESC_PURCHASE_COMPLETAS': ' | '.join(sorted(resultados['purchase']['desc_completas']))
+    }
+
+
+# ----------------------------
+# Entradas crudas, como las armaba main()
+# ----------------------------
+def promos_combinadas_referencia(df_promos_combinadas: pd.DataFrame):
+    """(promos_multi, requisitos_multi) desde promociones_combinadas."""
+    df_combinadas = df_promos_combinadas.copy()
+
+    rename_map = {
+        'CLAVE_PROMOCION': 'clave_promocion',
+        'CLAVE_EDICION_PRODUCTO': 'clave_edicion_producto',
+        'CANTIDAD_INICIAL': 'cantidad_inicial',
+    }
+    df_combinadas = df_combinadas.rename(columns={c: rename_map.get(c, c) for c in df_combinadas.columns})
+
+    for c in ['clave_promocion', 'clave_edicion_producto', 'cantidad_inicial']:
+        if c in df_combinadas.columns:
+            df_combinadas[c] = pd.to_numeric(df_combinadas[c], errors='coerce')
+
+    df_combinadas = df_combinadas.drop_duplicates(
+        subset=['clave_promocion', 'clave_edicion_producto'],
+        keep='last'
+    ).reset_index(drop=True)
+
+    promos_multi = set(df_combinadas['clave_promocion'].dropna().astype(int).unique())
+
+    requisitos_multi = {}
+    for pid, grp in df_combinadas.groupby('clave_promocion'):
+        if pd.isna(pid):
+            continue
+        reqs = []
+        for _, r in grp.iterrows():
+            if pd.isna(r['clave_edicion_producto']) or pd.isna(r['cantidad_inicial']):
+                continue
+            reqs.append({
+                'clave_edicion_producto': int(r['clave_edicion_producto']),
+                'cantidad_requerida': int(r['cantidad_inicial'])
+            })
+        if reqs:
+            requisitos_multi[int(pid)] = reqs
+    return promos_multi, requisitos_multi
+
+
+def vigencia_referencia(df_fechas_promocion: pd.DataFrame) -> dict:
+    """{pid: (inicio, cierre)} desde catalogo_promociones_fechas."""
+    df_fechas_promocion = df_fechas_promocion.copy()
+    df_fechas_promocion['d_inicio_promocion'] = pd.to_datetime(
+        df_fechas_promocion['d_inicio_promocion'], errors='coerce'
+    )
+    df_fechas_promocion['d_cierre_promocion'] = pd.to_datetime(
+        df_fechas_promocion['d_cierre_promocion'], errors='coerce'
+    )
+
+    vigencia_promo = {}
+    for _, r in df_fechas_promocion[['clave_promocion', 'd_inicio_promocion', 'd_cierre_promocion']].drop_duplicates().iterrows():
+        pid = r['clave_promocion']
+        if pd.isna(pid):
+            continue
+        vigencia_promo[int(pid)] = (r['d_inicio_promocion'], r['d_cierre_promocion'])
+    return vigencia_promo
+
+
+def detectar_patrones_referencia(df_ga4_events_base, df_condiciones_enriquecido, promos_multi,
+                                 requisitos_multi, vigencia_promo) -> pd.DataFrame:
+    """Ciclo original: groupby por sesión + iterrows; DataFrame de resultados indexado como la base."""
+    sesiones = df_ga4_events_base.groupby(['USER', 'SESION'])
+
+    resultados_list = []
+    for (user, sesion), df_sesion in sesiones:
+        promociones_completas_sesion = evaluar_promociones_sesion(
+            df_sesion=df_sesion,
+            requisitos_multi=requisitos_multi,
+            vigencia_promo=vigencia_promo
+        )
+
+        for idx_row, row in df_sesion.iterrows():
+            resultado = detectar_patrones_producto(
+                row=row,
+                condiciones_df=df_condiciones_enriquecido,
+                promociones_completas_sesion=promociones_completas_sesion,
+                promos_multi=promos_multi,
+                requisitos_multi=requisitos_multi,
+                vigencia_promo=vigencia_promo
+            )
+            resultado['index'] = idx_row
+            resultados_list.append(resultado)
+
+    df_resultados = pd.DataFrame(resultados_list)
+    return df_resultados.set_index('index').sort_index()
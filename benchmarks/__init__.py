@@ -0,0 +1,14 @@
+"""
+Benchmarks del pipeline H1 sin BigQuery: carga sintética con semilla y medición por etapa.
+
+    python -m benchmarks --sesiones 20000 --salida benchmarks/resultados/actual.json \
+        --baseline benchmarks/resultados/base.json
+
+Ver `GeneradorSintetico` (tablas con las columnas de Data/queries), `Etapas`
+(qué se mide en cada etapa) y `Medicion` (JSON y comparación contra la línea base).
+Las curvas de escalamiento por motor de detección están en `Escalamiento`
+(`python -m benchmarks.Escalamiento`).
+"""
+from benchmarks.GeneradorSintetico import ConfigCarga, generar_carga
+from benchmarks.Etapas import ETAPAS, ETAPAS_POR_DEFECTO, correr_benchmarks, preparar_entradas
+from benchmarks.Medicion import cargar_resultados, comparar, guardar_resultados, tabla_resultados
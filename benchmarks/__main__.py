@@ -0,0 +1,112 @@
+"""
+CLI de benchmarks (desde la raíz del repo):
+
+    python -m benchmarks [--sesiones N] [--etapas a,b] [--salida resultados.json]
+                         [--baseline base.json] [--guardar-baseline]
+
+Con --baseline compara contra la corrida guardada y termina con código 1 si alguna
+etapa empeora más que la tolerancia (tiempo por fila o memoria pico).
+"""
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+from benchmarks.Etapas import ETAPAS, ETAPAS_POR_DEFECTO, correr_benchmarks
+from benchmarks.GeneradorSintetico import ConfigCarga
+from benchmarks.Medicion import (
+    TOLERANCIA_MEMORIA,
+    TOLERANCIA_TIEMPO,
+    cargar_resultados,
+    comparar,
+    guardar_resultados,
+    tabla_resultados,
+)
+
+
+RESULTADOS_DIR = Path(__file__).resolve().parent / "resultados"
+
+logger = logging.getLogger("h1_patrones_promociones")
+
+
+def _argumentos(argv=None):
+    defecto = ConfigCarga()
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="Benchmarks por etapa del pipeline H1")
+    parser.add_argument("--sesiones", type=int, default=defecto.sesiones)
+    parser.add_argument("--filas-por-sesion", type=float, default=defecto.filas_por_sesion)
+    parser.add_argument("--productos", type=int, default=defecto.productos)
+    parser.add_argument("--condiciones-simples", type=int, default=defecto.condiciones_simples)
+    parser.add_argument("--promos-combinadas", type=int, default=defecto.promos_combinadas)
+    parser.add_argument("--productos-por-combinada", type=int, default=defecto.productos_por_combinada)
+    parser.add_argument("--mezcla-tipos", default=None,
+                        help="pesos por clave_tipo_cantidad_condicion, p. ej. 1:0.5,2:0.3,6:0.2")
+    parser.add_argument("--sesgo-productos", type=float, default=defecto.sesgo_productos,
+                        help="exponente de Zipf de la popularidad de productos (0 = uniforme)")
+    parser.add_argument("--semilla", type=int, default=defecto.semilla)
+    parser.add_argument("--etapas", default=None,
+                        help=f"lista separada por comas (por defecto todas menos deteccion_paralelo): {','.join(ETAPAS)}")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--sin-memoria", action="store_true", help="no medir memoria pico (tracemalloc)")
+    parser.add_argument("--workers", type=int, default=None, help="workers de deteccion_paralelo")
+    parser.add_argument("--salida", type=Path, default=RESULTADOS_DIR / "ultimo.json")
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON de una corrida previa para comparar")
+    parser.add_argument("--guardar-baseline", action="store_true",
+                        help="escribir también los resultados en --baseline (la reemplaza)")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA_TIEMPO,
+                        help="aumento máximo de tiempo por fila antes de marcar regresión (0.2 = 20%%)")
+    parser.add_argument("--tolerancia-memoria", type=float, default=TOLERANCIA_MEMORIA)
+    return parser.parse_args(argv)
+
+
+def _mezcla(texto):
+    if not texto:
+        return None
+    return {int(t): float(p) for t, p in (par.split(":") for par in texto.split(","))}
+
+
+def main(argv=None) -> int:
+    args = _argumentos(argv)
+    config = ConfigCarga(
+        sesiones=args.sesiones,
+        filas_por_sesion=args.filas_por_sesion,
+        productos=args.productos,
+        condiciones_simples=args.condiciones_simples,
+        promos_combinadas=args.promos_combinadas,
+        productos_por_combinada=args.productos_por_combinada,
+        mezcla_tipos=_mezcla(args.mezcla_tipos),
+        sesgo_productos=args.sesgo_productos,
+        semilla=args.semilla,
+    )
+    etapas = args.etapas.split(",") if args.etapas else ETAPAS_POR_DEFECTO
+
+    datos = correr_benchmarks(config, etapas=etapas, repeticiones=args.repeticiones,
+                              memoria=not args.sin_memoria, workers=args.workers)
+    guardar_resultados(args.salida, datos)
+    logger.info("Resultados guardados: %s", args.salida)
+
+    comparacion = None
+    if args.baseline is not None and args.baseline.exists() and not args.guardar_baseline:
+        base = cargar_resultados(args.baseline)
+        if base["config"] != datos["config"]:
+            logger.warning("La línea base se corrió con otra config; el tiempo se compara por fila")
+        comparacion = comparar(datos, base, args.tolerancia, args.tolerancia_memoria)
+
+    print(tabla_resultados(datos, comparacion))
+
+    if args.guardar_baseline and args.baseline is not None:
+        guardar_resultados(args.baseline, datos)
+        logger.info("Línea base actualizada: %s", args.baseline)
+
+    regresiones = [c for c in comparacion or [] if c["regresion"]]
+    for c in regresiones:
+        logger.warning("Regresión en %s: %s", c["etapa"], ", ".join(c["motivos"]))
+    return 1 if regresiones else 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
+    sys.exit(main())